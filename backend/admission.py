@@ -0,0 +1,229 @@
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional
+
+from metrics import Counter, Gauge, Histogram, registry
+from tracing import record_span
+
+ROUTE_CLASSES = ("read", "write", "upstream")
+# Token buckets kept for this many recent clients, least recent dropped
+MAX_TRACKED_CLIENTS = 100000
+
+admission_rejections = registry.register(Counter(
+    "admission_rejections_total", "Requests refused before running, by route class and reason",
+    ("route_class", "reason")
+))
+admission_queue_wait = registry.register(Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for a concurrency slot", ("route_class",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+# Route class -> ConcurrencyLimit of the running middleware
+route_limits = {}
+registry.register(Gauge(
+    "admission_in_flight", "Requests running per route class", ("route_class",),
+    function=lambda: {(name,): limit.active for name, limit in route_limits.items()}
+))
+registry.register(Gauge(
+    "admission_queued", "Requests waiting for a concurrency slot per route class", ("route_class",),
+    function=lambda: {(name,): limit.queued for name, limit in route_limits.items()}
+))
+
+
+class TokenBucket:
+    """Per-client token buckets: `rate` requests/s sustained, `burst` at once."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> (tokens, last refill)
+        self._buckets = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """0 when the request may go ahead, else seconds until it could."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        self._buckets.move_to_end(client)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit:
+    """
+    At most `limit` requests running at once; the rest queue in arrival
+    order and give up after `max_wait` seconds, so a request is either
+    started within `max_wait` or shed.
+    """
+
+    def __init__(self, limit: int, max_wait: float):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if self.max_wait <= 0:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Handed a slot just as the wait ran out: keep it
+                return True
+            waiter.cancel()
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def client_key(scope, trusted_proxies: frozenset = frozenset()) -> str:
+    """
+    The client address. Not the session token: it isn't verified until
+    the route runs, and a fresh made-up token per request would get a
+    fresh bucket (and evict real clients' buckets). When the peer is one
+    of `trusted_proxies`, the client is the last X-Forwarded-For hop that
+    isn't a trusted proxy; other peers can't pick their own bucket.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if address not in trusted_proxies:
+        return address
+    forwarded = [
+        hop.strip()
+        for name, value in scope.get("headers", ())
+        if name == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+        if hop.strip()
+    ]
+    for hop in reversed(forwarded):
+        if hop not in trusted_proxies:
+            return hop
+    return forwarded[0] if forwarded else address
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI admission control in front of the routes:
+
+    - per-client token buckets (by IP, see client_key): 429 when empty
+    - a concurrency limit per route class (`read`: GET/HEAD, `write`: other
+      methods, `upstream`: routes calling third-party APIs): requests queue
+      for a slot and get a 503 if none frees up within `max_queue_ms`
+
+    Both answer with Retry-After. `exempt` paths (metrics, streams) skip
+    it all; websockets are never limited.
+    """
+
+    def __init__(
+        self,
+        app,
+        rate: float = 0.0,
+        burst: float = 40.0,
+        limits: Optional[Dict[str, int]] = None,
+        max_queue_ms: float = 250.0,
+        upstream_paths: Iterable[str] = (),
+        exempt_paths: Iterable[str] = (),
+        trusted_proxies: Iterable[str] = ()
+    ):
+        self.app = app
+        # rate 0 turns rate limiting off
+        self.buckets = TokenBucket(rate, burst) if rate > 0 else None
+        limits = limits or {}
+        self.limits = {
+            route_class: ConcurrencyLimit(limits.get(route_class, 100), max_queue_ms / 1000)
+            for route_class in ROUTE_CLASSES
+        }
+        self.upstream_paths = tuple(upstream_paths)
+        self.exempt_paths = tuple(exempt_paths)
+        self.trusted_proxies = frozenset(trusted_proxies)
+        # Starlette may build the middleware stack more than once; the
+        # gauges follow the latest
+        route_limits.clear()
+        route_limits.update(self.limits)
+
+    def route_class(self, scope) -> str:
+        if scope["path"].startswith(self.upstream_paths):
+            return "upstream"
+        return "read" if scope["method"] in ("GET", "HEAD") else "write"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths) or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.route_class(scope)
+        if self.buckets is not None:
+            wait = self.buckets.take(client_key(scope, self.trusted_proxies))
+            if wait > 0:
+                admission_rejections.inc(route_class, "rate_limited")
+                await self.reject(send, 429, "Too many requests", wait)
+                return
+
+        limit = self.limits[route_class]
+        started = time.perf_counter()
+        if not await limit.acquire():
+            admission_rejections.inc(route_class, "overloaded")
+            await self.reject(send, 503, "Server busy, retry shortly", limit.max_wait)
+            return
+        waited = time.perf_counter() - started
+        admission_queue_wait.observe(waited, route_class)
+        if waited > 0.001:
+            record_span("queue", waited)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    async def reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,132 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ALERT_KARATS = (24, 22, 18)
+ALERT_DIRECTIONS = ("above", "below")
+
+
+class _ThresholdBook:
+    """Sorted (threshold, alert_id) pairs for one karat and direction."""
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.alert_ids: List[str] = []
+
+    def add(self, threshold: float, alert_id: str):
+        i = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.alert_ids.insert(i, alert_id)
+
+    def remove(self, threshold: float, alert_id: str):
+        lo = bisect_left(self.thresholds, threshold)
+        hi = bisect_right(self.thresholds, threshold)
+        for i in range(lo, hi):
+            if self.alert_ids[i] == alert_id:
+                del self.thresholds[i]
+                del self.alert_ids[i]
+                return
+
+    def pop_range(self, lo: int, hi: int) -> List[str]:
+        fired = self.alert_ids[lo:hi]
+        del self.thresholds[lo:hi]
+        del self.alert_ids[lo:hi]
+        return fired
+
+
+class AlertIndex:
+    """
+    Price alerts indexed by karat and direction. Each book keeps its
+    thresholds sorted, so a tick only touches the alerts crossed between
+    the previous and the current price: O(log n + k) per karat.
+    Alerts are one-shot and leave the index when they fire.
+    """
+
+    def __init__(self):
+        self.alerts: Dict[str, dict] = {}
+        self._books = {
+            (karat, direction): _ThresholdBook()
+            for karat in ALERT_KARATS
+            for direction in ALERT_DIRECTIONS
+        }
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def add(self, alert: dict):
+        if alert["alert_id"] in self.alerts:
+            return
+        self.alerts[alert["alert_id"]] = alert
+        book = self._books[(alert["karat"], alert["direction"])]
+        book.add(alert["threshold"], alert["alert_id"])
+
+    def remove(self, alert_id: str) -> Optional[dict]:
+        alert = self.alerts.pop(alert_id, None)
+        if alert:
+            book = self._books[(alert["karat"], alert["direction"])]
+            book.remove(alert["threshold"], alert_id)
+        return alert
+
+    def crossed(self, karat: int, previous: float, current: float) -> List[dict]:
+        """Pop the alerts of `karat` crossed by a move from previous to current."""
+        if current > previous:
+            # "above X" fires when previous < X <= current
+            book = self._books[(karat, "above")]
+            lo = bisect_right(book.thresholds, previous)
+            hi = bisect_right(book.thresholds, current)
+        elif current < previous:
+            # "below X" fires when current <= X < previous
+            book = self._books[(karat, "below")]
+            lo = bisect_left(book.thresholds, current)
+            hi = bisect_left(book.thresholds, previous)
+        else:
+            return []
+
+        return [self.alerts.pop(alert_id) for alert_id in book.pop_range(lo, hi)]
+
+
+async def log_delivery(alert: dict, price: float):
+    """Local stub transport: logs instead of sending a push notification."""
+    print(
+        f"Price alert {alert['alert_id']} for {alert['user_id']}: "
+        f"{alert['karat']}k {alert['direction']} {alert['threshold']} QAR (now {price})"
+    )
+
+
+class AlertNotifier:
+    """
+    Delivers fired alerts from a background task so tick evaluation never
+    waits on the transport. `deliver` is the async transport (push, SMS...).
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[dict, float], Awaitable[None]] = log_delivery,
+        queue_size: int = 10000
+    ):
+        self.deliver = deliver
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self, alert: dict, price: float):
+        try:
+            self.queue.put_nowait((alert, price))
+        except asyncio.QueueFull:
+            print(f"Alert notifier queue full, dropping {alert['alert_id']}")
+
+    async def _run(self):
+        while True:
+            alert, price = await self.queue.get()
+            try:
+                await self.deliver(alert, price)
+            except Exception as e:
+                print(f"Alert delivery error: {str(e)}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Login (session exchange) benchmark against a local mongod.
+Times N first logins and N repeat logins through login() against the
+previous serial find/insert path, counts the Mongo round trips each
+takes, then races R concurrent first logins of one email to check that
+exactly one user and one portfolio come out.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_auth.py --logins 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from login import login
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def serial_login(db, user_data: dict, now: datetime):
+    # exchange_session before the upsert path, for comparison
+    existing_user = await db.users.find_one({"email": user_data["email"]}, {"_id": 0})
+    if not existing_user:
+        user_id = f"user_{uuid.uuid4().hex[:12]}"
+        existing_user = {
+            "user_id": user_id,
+            "email": user_data["email"],
+            "name": user_data["name"],
+            "picture": user_data.get("picture"),
+            "gold_balance": 0.0,
+            "created_at": now
+        }
+        await db.users.insert_one(existing_user)
+        await db.portfolio.insert_one({
+            "user_id": user_id,
+            "gold_holdings": 0.0,
+            "total_invested": 0.0,
+            "current_value": 0.0,
+            "updated_at": now
+        })
+    await db.user_sessions.insert_one({
+        "user_id": existing_user["user_id"],
+        "session_token": user_data["session_token"],
+        "expires_at": now + timedelta(days=7),
+        "created_at": now
+    })
+
+
+def identity(i: int) -> dict:
+    return {
+        "email": f"bench_{i}@auth.local",
+        "name": f"Bench {i}",
+        "picture": None,
+        "session_token": f"token_{uuid.uuid4().hex}"
+    }
+
+
+async def reset(db, unique: bool):
+    for name in ("users", "portfolio", "user_sessions"):
+        await db[name].drop()
+    await db.users.create_index("email", unique=unique)
+    await db.portfolio.create_index("user_id", unique=unique)
+    await db.user_sessions.create_index("session_token")
+
+
+async def run(db, counter, path, count: int, concurrency: int) -> tuple:
+    now = datetime.now(timezone.utc)
+    counter.count = 0
+    started = time.perf_counter()
+
+    async def worker(offset):
+        for i in range(offset, count, concurrency):
+            await path(identity(i), now)
+
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return time.perf_counter() - started, counter.count / count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--racers", type=int, default=200)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"),
+        maxPoolSize=args.concurrency,
+        event_listeners=[counter]
+    )
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+
+    paths = {
+        "serial": lambda user_data, now: serial_login(db, user_data, now),
+        "upsert": lambda user_data, now: login(db.users, db.portfolio, db.user_sessions, user_data, now)
+    }
+    for name, path in paths.items():
+        # The serial path ran without the unique indexes
+        await reset(db, unique=name == "upsert")
+        for phase in ("first", "repeat"):
+            elapsed, round_trips = await run(db, counter, path, args.logins, args.concurrency)
+            print(
+                f"{name:>6} {phase:>6}: {args.logins} logins in {elapsed:.2f}s "
+                f"({args.logins / elapsed:,.0f}/s, {round_trips:.1f} commands per login)"
+            )
+
+    now = datetime.now(timezone.utc)
+    results = {}
+    for name, path in paths.items():
+        await reset(db, unique=name == "upsert")
+        racer = identity(0)
+        await asyncio.gather(
+            *(path({**racer, "session_token": f"token_{i}"}, now) for i in range(args.racers)),
+            return_exceptions=True
+        )
+        users = await db.users.count_documents({"email": racer["email"]})
+        portfolios = await db.portfolio.count_documents({})
+        results[name] = (users, portfolios)
+        print(f"{name:>6} race: {args.racers} concurrent first logins, {users} users, {portfolios} portfolios")
+
+    await client.drop_database(db.name)
+    if results["upsert"] != (1, 1):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
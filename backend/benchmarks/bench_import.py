@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Bulk product import throughput against a local mongod. Streams N generated
+NDJSON (or CSV) rows through import_products, then imports the same rows
+again to time the update path.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_import.py --products 100000
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from product_import import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_products
+from server import JewelryItem
+
+CATEGORIES = ["necklace", "ring", "bracelet", "earrings"]
+FIELDS = [
+    "item_id", "name", "name_ar", "description", "description_ar",
+    "price", "weight_grams", "karat", "category", "rating"
+]
+
+
+def sample_rows(count: int, rng: random.Random):
+    for i in range(count):
+        category = rng.choice(CATEGORIES)
+        yield {
+            "item_id": f"bench_{i}",
+            "name": f"Gold {category.title()} {i}",
+            "name_ar": f"{category} {i}",
+            "description": f"Beautiful gold {category}",
+            "description_ar": f"{category} ذهبي",
+            "price": round(rng.uniform(500, 20000), 2),
+            "weight_grams": round(rng.uniform(1, 60), 2),
+            "karat": rng.choice([18, 21, 22, 24]),
+            "category": category,
+            "rating": round(rng.uniform(3.5, 5), 1)
+        }
+
+
+async def stream(count: int, fmt: str, batch: int = 500):
+    """The upload, produced incrementally like a request body would arrive."""
+    rows = sample_rows(count, random.Random(42))
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.DictWriter(out, FIELDS)
+        writer.writeheader()
+        yield out.getvalue().encode()
+    while True:
+        chunk = [row for _, row in zip(range(batch), rows)]
+        if not chunk:
+            return
+        if fmt == "csv":
+            out = io.StringIO()
+            csv.DictWriter(out, FIELDS).writerows(chunk)
+            yield out.getvalue().encode()
+        else:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk).encode()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+    await db.jewelry.drop()
+    await db.jewelry.create_index("item_id", unique=True)
+
+    for label in ("insert", "update"):
+        started = time.perf_counter()
+        report = await import_products(
+            db.jewelry,
+            stream(args.products, args.format),
+            JewelryItem,
+            args.format,
+            scope={"store_id": "store_bench"},
+            defaults={"store_name": "Bench Jewelry"},
+            chunk_size=args.chunk_size
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"{label}: {report.rows} {args.format} rows in {elapsed:.2f}s "
+            f"({report.rows / elapsed:,.0f}/s, inserted {report.inserted}, "
+            f"updated {report.updated}, failed {report.failed})"
+        )
+
+    await client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
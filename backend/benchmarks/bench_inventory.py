@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Stock reservation contention benchmark against a local mongod.
+C concurrent buyers race for one item holding S units, first with a single
+counter, then with the counter split over shards. Exits non-zero if any
+run sells more than S units or leaves stock behind.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_inventory.py --stock 5000 --buyers 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from inventory import OutOfStockError, reserve_items, set_item_stock
+
+ITEM_ID = "bench_hot_item"
+
+
+async def run(db, stock, buyers, shards):
+    await db.jewelry.delete_many({"item_id": ITEM_ID})
+    await db.jewelry.insert_one({"item_id": ITEM_ID, "in_stock": True})
+    await set_item_stock(db.jewelry, db.stock_shards, ITEM_ID, stock, shards)
+
+    sold = 0
+    refused = 0
+
+    async def buyer():
+        nonlocal sold, refused
+        while True:
+            try:
+                await reserve_items(db.jewelry, db.stock_shards, [{"item_id": ITEM_ID, "quantity": 1}])
+                sold += 1
+            except OutOfStockError:
+                refused += 1
+                return
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(buyers)))
+    elapsed = time.perf_counter() - started
+
+    item = await db.jewelry.find_one({"item_id": ITEM_ID})
+    left = item["stock"]
+    async for shard in db.stock_shards.find({"item_id": ITEM_ID}):
+        left += shard["stock"]
+
+    label = f"{shards} shards" if shards > 1 else "single counter"
+    print(f"{label:<15} sold {sold}/{stock} in {elapsed:.2f}s ({sold / elapsed:,.0f} reservations/s), left {left}")
+    return sold == stock and left == 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"),
+        maxPoolSize=args.buyers
+    )
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+    await db.stock_shards.create_index([("item_id", 1), ("shard", 1)], unique=True)
+
+    ok = await run(db, args.stock, args.buyers, 0)
+    ok = await run(db, args.stock, args.buyers, args.shards) and ok
+
+    await client.drop_database(db.name)
+    if not ok:
+        print("oversold or lost stock")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
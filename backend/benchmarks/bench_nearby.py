@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Nearby-store query latency at thousands of stores.
+Times the in-memory GeoGridIndex, and with --mongo the $geoNear query on
+a 2dsphere index in a scratch database on a local mongod.
+
+    cd backend && python benchmarks/bench_nearby.py --stores 5000 [--mongo]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import GeoGridIndex, geo_point
+
+# Roughly Qatar
+LAT_RANGE = (24.5, 26.2)
+LNG_RANGE = (50.7, 51.7)
+
+
+def sample_stores(count):
+    rng = random.Random(7)
+    return [
+        {"store_id": f"store_bench_{i}", "geo": geo_point(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE))}
+        for i in range(count)
+    ]
+
+
+def sample_queries(count):
+    rng = random.Random(11)
+    return [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(count)]
+
+
+async def bench_mongo(stores, queries, radius, limit):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+    await db.stores.drop()
+    await db.stores.insert_many([dict(store) for store in stores])
+    await db.stores.create_index([("geo", "2dsphere")])
+
+    started = time.perf_counter()
+    for lat, lng in queries:
+        await db.stores.aggregate([
+            {"$geoNear": {"near": geo_point(lat, lng), "distanceField": "distance_m",
+                          "maxDistance": radius, "spherical": True}},
+            {"$limit": limit},
+            {"$project": {"_id": 0}}
+        ]).to_list(limit)
+    elapsed = time.perf_counter() - started
+
+    await client.drop_database(db.name)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stores", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--radius", type=float, default=10000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--mongo", action="store_true", help="also time $geoNear on a local mongod")
+    args = parser.parse_args()
+
+    stores = sample_stores(args.stores)
+    queries = sample_queries(args.queries)
+
+    started = time.perf_counter()
+    index = GeoGridIndex(stores)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for lat, lng in queries:
+        index.nearby(lat, lng, args.radius, limit=args.limit)
+    elapsed = time.perf_counter() - started
+    print(f"grid index: built in {build * 1000:.1f} ms, {elapsed / args.queries * 1000:.3f} ms/query")
+
+    if args.mongo:
+        elapsed = asyncio.run(bench_mongo(stores, queries, args.radius, args.limit))
+        print(f"$geoNear:   {elapsed / args.queries * 1000:.3f} ms/query (including round trip)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Recurring purchase (DCA) execution benchmark against a local mongod.
+Seeds N due plans into a scratch database, then times execute_due_plans
+against the per-plan insert/update path create_order would take.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_recurring.py --plans 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from recurring import execute_due_plans, new_plan
+
+PRICE_24K = 236.6
+
+
+async def seed(db, count):
+    await db.recurring_plans.drop()
+    await db.orders.drop()
+    await db.portfolio.drop()
+    await db.recurring_plans.create_index([("status", 1), ("next_run_at", 1)])
+    await db.recurring_plans.create_index("plan_id", unique=True)
+    await db.portfolio.create_index("user_id", unique=True)
+
+    due = datetime.now(timezone.utc) - timedelta(minutes=1)
+    plans = [new_plan(f"user_bench_{i}", 500.0, "weekly", due) for i in range(count)]
+    for start in range(0, count, 5000):
+        await db.recurring_plans.insert_many(plans[start:start + 5000], ordered=False)
+    return plans
+
+
+async def per_plan(db, plans):
+    # What calling create_order once per plan costs: three round trips each
+    now = datetime.now(timezone.utc)
+    for plan in plans:
+        grams = round(plan["amount"] / PRICE_24K, 4)
+        await db.orders.insert_one({"user_id": plan["user_id"], "total_amount": plan["amount"], "created_at": now})
+        await db.portfolio.update_one(
+            {"user_id": plan["user_id"]},
+            {"$inc": {"gold_holdings": grams, "total_invested": plan["amount"]}},
+            upsert=True
+        )
+        await db.recurring_plans.update_one(
+            {"plan_id": plan["plan_id"]},
+            {"$set": {"last_run_at": now}}
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--plans", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--baseline", type=int, default=2000, help="plans timed on the per-plan path")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+
+    plans = await seed(db, args.baseline)
+    started = time.perf_counter()
+    await per_plan(db, plans)
+    baseline = time.perf_counter() - started
+    print(f"per-plan writes: {args.baseline} plans in {baseline:.2f}s ({args.baseline / baseline:,.0f} plans/s)")
+
+    await seed(db, args.plans)
+    started = time.perf_counter()
+    executed = await execute_due_plans(
+        db.recurring_plans, db.orders, db.portfolio, PRICE_24K,
+        datetime.now(timezone.utc), chunk_size=args.chunk_size
+    )
+    elapsed = time.perf_counter() - started
+    print(f"execute_due_plans: {executed} plans in {elapsed:.2f}s ({executed / elapsed:,.0f} plans/s)")
+
+    await client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
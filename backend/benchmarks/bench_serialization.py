@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmark for the list endpoints.
+Compares FastAPI's default jsonable_encoder path with FastJSONResponse and
+the precompiled TypeAdapters, reporting milliseconds per 1000 items.
+
+    cd backend && python benchmarks/bench_serialization.py --rounds 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+import server
+from responses import dumps
+
+
+def sample_documents(count):
+    # Varied values so the wire-format benchmark doesn't compress unrealistically well
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    return {
+        "gold_prices": (server.GOLD_PRICES_ADAPTER, [
+            {
+                "timestamp": now - timedelta(minutes=i),
+                "price_24k": round(rng.uniform(230, 600), 2),
+                "price_22k": round(rng.uniform(210, 550), 2),
+                "price_18k": round(rng.uniform(170, 450), 2),
+                "currency": "QAR",
+                "source": "FreeGoldAPI"
+            }
+            for i in range(count)
+        ]),
+        "orders": (server.ORDERS_ADAPTER, [
+            {
+                "order_id": f"order_{i:012d}",
+                "user_id": "user_bench",
+                "items": [{
+                    "item_id": "gold_bar_10g",
+                    "item_type": "gold_bar",
+                    "name": "Gold Bar 10g",
+                    "quantity": 10.0,
+                    "price_per_unit": round(rng.uniform(230, 600), 2),
+                    "total": round(rng.uniform(2300, 6000), 2)
+                }],
+                "total_amount": round(rng.uniform(2300, 6000), 2),
+                "status": rng.choice(["pending", "processing", "shipped", "delivered"]),
+                "created_at": now - timedelta(seconds=rng.randint(0, 10 ** 7)),
+                "tracking_info": None
+            }
+            for i in range(count)
+        ]),
+        "jewelry": (server.JEWELRY_ADAPTER, [
+            {
+                "item_id": f"store_1_ring_{i}",
+                "store_id": "store_1",
+                "store_name": "لازوردي للمجوهرات",
+                "name": f"Gold Ring {i}",
+                "name_ar": f"خاتم لازوردي للمجوهرات - {i}",
+                "description": "Beautiful 22K gold ring",
+                "description_ar": "خاتم ذهبي أنيق عيار 22",
+                "price": float(rng.randrange(800, 4200, 50)),
+                "weight_grams": float(rng.randint(5, 30)),
+                "karat": rng.choice([18, 21, 22, 24]),
+                "category": "ring",
+                "image_url": "https://images.unsplash.com/photo-1605100804763-247f67b3557e?w=400",
+                "in_stock": True,
+                "rating": round(rng.uniform(3.5, 5.0), 1)
+            }
+            for i in range(count)
+        ]),
+        "stores": (server.STORES_ADAPTER, [
+            {
+                "store_id": f"store_{i}",
+                "name": "Gold Souk",
+                "name_ar": "سوق الذهب",
+                "description": "Traditional gold market",
+                "description_ar": "سوق الذهب التقليدي",
+                "rating": 4.5,
+                "total_products": 68,
+                "location": "Souq Waqif, Doha",
+                "phone": "+974 4444 8888",
+                "is_verified": True
+            }
+            for i in range(count)
+        ])
+    }
+
+
+def per_thousand(fn, count, rounds):
+    seconds = timeit.timeit(fn, number=rounds) / rounds
+    return seconds * 1000 * (1000 / count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'payload':<12} {'jsonable_encoder':>17} {'FastJSONResponse':>17} {'TypeAdapter':>12}  (ms / 1000 items)")
+    for name, (adapter, docs) in sample_documents(args.items).items():
+        default = per_thousand(
+            lambda: json.dumps(jsonable_encoder(docs), ensure_ascii=False).encode("utf-8"),
+            args.items, args.rounds
+        )
+        fast = per_thousand(lambda: dumps(docs), args.items, args.rounds)
+        typed = per_thousand(
+            lambda: adapter.dump_json(adapter.validate_python(docs)),
+            args.items, args.rounds
+        )
+        print(f"{name:<12} {default:>17.2f} {fast:>17.2f} {typed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
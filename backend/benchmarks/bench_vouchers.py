@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Voucher issuance and redemption throughput against a local mongod.
+Issues N vouchers through issue_vouchers, redeems them with C concurrent
+redeemers, then races R redeemers on a single code to check that exactly
+one wins.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_vouchers.py --vouchers 50000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from vouchers import issue_vouchers, new_voucher, redeem_voucher
+
+PRICE_24K = 236.6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vouchers", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--racers", type=int, default=500)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"),
+        maxPoolSize=args.concurrency
+    )
+    db = client[os.getenv("BENCH_DB_NAME", "gold_vault_bench")]
+    await db.vouchers.drop()
+    await db.vouchers.create_index("code", unique=True, sparse=True)
+
+    now = datetime.now(timezone.utc)
+    vouchers = [new_voucher("user_bench", 100.0, None, None, now, batch_id="batch_bench") for _ in range(args.vouchers)]
+    started = time.perf_counter()
+    await issue_vouchers(db.vouchers, vouchers)
+    elapsed = time.perf_counter() - started
+    print(f"issue: {args.vouchers} vouchers in {elapsed:.2f}s ({args.vouchers / elapsed:,.0f}/s)")
+
+    codes = [voucher["code"] for voucher in vouchers]
+    redeemed = 0
+
+    async def redeemer(worker):
+        nonlocal redeemed
+        for code in codes[worker::args.concurrency]:
+            if await redeem_voucher(db.vouchers, code, f"user_{worker}", PRICE_24K, now):
+                redeemed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(redeemer(worker) for worker in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"redeem: {redeemed} vouchers in {elapsed:.2f}s ({redeemed / elapsed:,.0f}/s, concurrency {args.concurrency})")
+
+    contested = new_voucher("user_bench", 100.0, None, None, now)
+    await issue_vouchers(db.vouchers, [contested])
+    results = await asyncio.gather(*(
+        redeem_voucher(db.vouchers, contested["code"], f"user_{i}", PRICE_24K, now)
+        for i in range(args.racers)
+    ))
+    winners = sum(1 for result in results if result)
+    print(f"race: {args.racers} concurrent redeemers on one code, {winners} succeeded")
+
+    await client.drop_database(db.name)
+    if winners != 1:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark for the heavy list payloads.
+Reports encode time and bytes for JSON, MessagePack and compressed JSON,
+as produced by NegotiationMiddleware.
+
+    cd backend && python benchmarks/bench_wire_formats.py --items 1000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_serialization import sample_documents
+
+import negotiation
+from responses import dumps
+
+
+def encoders(level):
+    formats = {"json": lambda body: body}
+    if negotiation.msgpack is not None:
+        formats["msgpack"] = lambda body: negotiation.msgpack.packb(
+            negotiation.json_loads(body), use_bin_type=True
+        )
+        formats["msgpack+gzip"] = lambda body: negotiation.compress(
+            formats["msgpack"](body), "gzip", level
+        )
+    formats["json+gzip"] = lambda body: negotiation.compress(body, "gzip", level)
+    if negotiation.brotli is not None:
+        formats["json+br"] = lambda body: negotiation.compress(body, "br", level)
+    return formats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--level", type=int, default=5, help="compression level")
+    args = parser.parse_args()
+
+    payloads = sample_documents(args.items)
+    print(f"{'payload':<12} {'format':<14} {'bytes':>10} {'ratio':>7} {'encode ms':>10}")
+    for name in ("gold_prices", "jewelry", "orders"):
+        _, docs = payloads[name]
+        body = dumps(docs)
+        json_ms = timeit.timeit(lambda: dumps(docs), number=args.rounds) / args.rounds * 1000
+        for fmt, encode in encoders(args.level).items():
+            encoded = encode(body)
+            # Every format starts from the rendered JSON body
+            ms = json_ms
+            if fmt != "json":
+                ms += timeit.timeit(lambda: encode(body), number=args.rounds) / args.rounds * 1000
+            print(f"{name:<12} {fmt:<14} {len(encoded):>10} {len(encoded) / len(body):>7.2f} {ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
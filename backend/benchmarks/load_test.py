@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Hermetic load test for the backend. Boots server.py under uvicorn against a
+local mongod (or an in-memory stand-in) with benchmarks/stub_upstreams.py in
+place of the gold price, FX and auth hosts, drives a weighted mix of
+realistic traffic at a fixed concurrency and reports throughput and
+p50/p95/p99 latency per endpoint. Results are saved as JSON; pass an older
+file to --compare to see the change between commits.
+
+    cd backend && python benchmarks/load_test.py --mongo mongodb://localhost:27017 --concurrency 50 --duration 30
+    cd backend && python benchmarks/load_test.py --mongo memory --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+from stub_upstreams import stub_env
+
+LOADTEST_DB_NAME = "gold_vault_loadtest"
+SEED_STORES = ["store_1", "store_2", "store_3", "store_4"]
+
+
+# Traffic mix: scenario -> (weight, request builder). Builders return the
+# label results are grouped under and the request to send
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def portfolio(rng, token):
+    return "GET /api/portfolio", ("GET", "/api/portfolio", {"headers": _auth(token)})
+
+
+def orders_list(rng, token):
+    return "GET /api/orders", ("GET", "/api/orders", {"headers": _auth(token)})
+
+
+def order_create(rng, token):
+    grams = rng.choice([0.5, 1, 2, 5])
+    order = {
+        "items": [{
+            "item_id": "gold_24k",
+            "item_type": "gold_bar",
+            "name": "24K Gold",
+            "quantity": grams,
+            "price_per_unit": 236.6,
+            "total": round(grams * 236.6, 2)
+        }],
+        "total_amount": round(grams * 236.6, 2)
+    }
+    return "POST /api/orders", ("POST", "/api/orders", {"headers": _auth(token), "json": order})
+
+
+def jewelry(rng, token):
+    return "GET /api/jewelry", ("GET", "/api/jewelry", {})
+
+
+def stores(rng, token):
+    return "GET /api/stores", ("GET", "/api/stores", {})
+
+
+def store_products(rng, token):
+    store_id = rng.choice(SEED_STORES)
+    return "GET /api/stores/{id}/products", ("GET", f"/api/stores/{store_id}/products", {})
+
+
+def home(rng, token):
+    return "GET /api/home", ("GET", "/api/home", {"headers": _auth(token)})
+
+
+def price_current(rng, token):
+    return "GET /api/gold/prices/current", ("GET", "/api/gold/prices/current", {})
+
+
+def price_matrix(rng, token):
+    return "GET /api/gold/prices/matrix", ("GET", "/api/gold/prices/matrix", {"params": {"currency": "QAR"}})
+
+
+TRAFFIC_MIX = {
+    "portfolio": (15, portfolio),
+    "orders_list": (10, orders_list),
+    "order_create": (8, order_create),
+    "jewelry": (12, jewelry),
+    "stores": (10, stores),
+    "store_products": (10, store_products),
+    "home": (10, home),
+    "price_current": (20, price_current),
+    "price_matrix": (5, price_matrix)
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 1),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0
+    }
+
+
+def serve_memory(port: int):
+    """Run server.py on in-memory collections (needs mongomock-motor)."""
+    from mongomock_motor import AsyncMongoMockClient
+    from motor.motor_asyncio import AsyncIOMotorCollection
+    import uvicorn
+
+    import server
+
+    mock_db = AsyncMongoMockClient()[LOADTEST_DB_NAME]
+
+    def swap(value):
+        if isinstance(value, AsyncIOMotorCollection):
+            return mock_db[value.name]
+        return value
+
+    for name, value in list(vars(server).items()):
+        if isinstance(value, AsyncIOMotorCollection):
+            setattr(server, name, swap(value))
+        elif isinstance(value, dict) and any(isinstance(v, AsyncIOMotorCollection) for v in value.values()):
+            value.update({key: swap(v) for key, v in value.items()})
+    server.db = mock_db
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_processes(args, stub_port: int, server_port: int):
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "stub_upstreams.py"),
+         "--port", str(stub_port), "--latency-ms", str(args.upstream_latency_ms)],
+        cwd=BACKEND_DIR
+    )
+    env = {
+        **os.environ,
+        **stub_env(f"http://127.0.0.1:{stub_port}"),
+        "DB_NAME": LOADTEST_DB_NAME,
+        "PRICE_POLL_INTERVAL": str(args.price_poll_interval),
+        # Every anonymous request comes from 127.0.0.1; measure the
+        # backend, not the rate limiter
+        "RATE_LIMIT_RPS": "0"
+    }
+    if args.mongo == "memory":
+        command = [sys.executable, os.path.abspath(__file__), "--serve-memory", str(server_port)]
+    else:
+        env["MONGO_URL"] = args.mongo
+        command = [
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", "127.0.0.1", "--port", str(server_port),
+            "--workers", str(args.workers), "--log-level", "warning"
+        ]
+    backend = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    return stub, backend
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Backend did not become ready")
+
+
+async def setup(client: httpx.AsyncClient, users: int) -> list:
+    # Sign users in through the auth stub, like the app would
+    tokens = []
+    for i in range(users):
+        response = await client.post("/api/auth/session", json={"session_id": f"load_{i}"})
+        response.raise_for_status()
+        tokens.append(response.json()["session_token"])
+    # Seed the catalog so the measured requests read, not seed
+    await client.get("/api/stores")
+    for store_id in SEED_STORES:
+        await client.get(f"/api/stores/{store_id}/products")
+    await client.get("/api/jewelry")
+    return tokens
+
+
+async def drive(client: httpx.AsyncClient, tokens: list, args) -> tuple:
+    names = list(TRAFFIC_MIX)
+    weights = [TRAFFIC_MIX[name][0] for name in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    measure_from = time.monotonic() + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(args.seed + worker_id)
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            scenario = rng.choices(names, weights)[0]
+            label, (method, path, kwargs) = TRAFFIC_MIX[scenario][1](rng, rng.choice(tokens))
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if now < measure_from:
+                continue
+            latencies[label].append(elapsed)
+            if not ok:
+                errors[label] += 1
+
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    return latencies, errors
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['meta']['commit']} ({baseline_path}):")
+    print(f"{'endpoint':<34}{'rps':>18}{'p50 ms':>20}{'p99 ms':>20}")
+    rows = list(current["endpoints"].items()) + [("total", current["total"])]
+    for label, stats in rows:
+        before = baseline["endpoints"].get(label) if label != "total" else baseline["total"]
+        if not before:
+            continue
+        cells = []
+        for key in ("rps", "p50_ms", "p99_ms"):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:>8} -> {stats[key]:<8}{change:+.0f}%")
+        print(f"{label:<34}" + "".join(f"{cell:>20}" for cell in cells))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongo", default="memory", help="mongod URL, or 'memory' for an in-memory stand-in")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before that")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (mongod only)")
+    parser.add_argument("--upstream-latency-ms", type=float, default=20.0)
+    parser.add_argument("--price-poll-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    stub_port, server_port = free_port(), free_port()
+    stub, backend = start_processes(args, stub_port, server_port)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{server_port}",
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency),
+            timeout=30.0
+        ) as client:
+            await wait_ready(client)
+            tokens = await setup(client, args.users)
+            latencies, errors = await drive(client, tokens, args)
+    finally:
+        backend.terminate()
+        stub.terminate()
+        backend.wait()
+        stub.wait()
+        if args.mongo != "memory":
+            from pymongo import MongoClient
+            MongoClient(args.mongo).drop_database(LOADTEST_DB_NAME)
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mongo": "memory" if args.mongo == "memory" else "mongod",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "users": args.users,
+            "workers": args.workers,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "python": platform.python_version(),
+            "machine": platform.machine()
+        },
+        "endpoints": {
+            label: summarize(values, errors[label], args.duration)
+            for label, values in sorted(latencies.items())
+        },
+        "total": summarize(
+            [value for values in latencies.values() for value in values],
+            sum(errors.values()),
+            args.duration
+        )
+    }
+
+    print(f"{'endpoint':<34}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, stats in list(results["endpoints"].items()) + [("total", results["total"])]:
+        print(
+            f"{label:<34}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>9}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+        )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve-memory":
+        serve_memory(int(sys.argv[2]))
+    else:
+        asyncio.run(main())
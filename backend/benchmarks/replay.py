@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Replay captured traffic against a running backend and compare latency.
+Reads the NDJSON written by CaptureMiddleware (CAPTURE_FILE, rotated
+backups included), re-issues the requests open-loop with the recorded
+inter-arrival gaps (or N times faster with --speed) and reports p50/p95/p99
+per route. Results are saved as JSON; pass an earlier file to --compare to
+see the change between two runs.
+
+    cd backend && python benchmarks/replay.py captures/traffic.ndjson --target http://127.0.0.1:8001 --speed 4
+    cd backend && python benchmarks/replay.py captures/traffic.ndjson --compare benchmarks/results/replay_abc1234.json
+
+Captures hold no bodies, so only GET/HEAD requests are replayed unless
+--include-writes is given. Each captured identity is signed in once
+through /api/auth/session as "replay_<identity>", which works when the
+backend's AUTH_SESSION_URL points at benchmarks/stub_upstreams.py;
+otherwise its requests go out anonymous. Replay against a backend that
+isn't capturing itself, or the next capture holds the replay too.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import RESULTS_DIR, git_commit, summarize
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def capture_files(path: str) -> list:
+    # Rotated backups are path.1 (newest) .. path.N; order doesn't matter
+    # as records are sorted by arrival afterwards
+    backups = [name for name in glob.glob(f"{glob.escape(path)}.*") if name.rsplit(".", 1)[1].isdigit()]
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def load_capture(paths: list, include_writes: bool) -> list:
+    records = []
+    for path in paths:
+        for name in capture_files(path):
+            with open(name) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash or a copy mid-write
+                        continue
+                    if include_writes or record["method"] in READ_METHODS:
+                        records.append(record)
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def label(record: dict) -> str:
+    return f"{record['method']} {record.get('route') or record['path']}"
+
+
+async def sign_in(client: httpx.AsyncClient, identities: set) -> dict:
+    tokens = {}
+    for identity in sorted(identities):
+        try:
+            response = await client.post("/api/auth/session", json={"session_id": f"replay_{identity}"})
+            response.raise_for_status()
+            tokens[identity] = response.json()["session_token"]
+        except httpx.HTTPError as e:
+            print(f"Sign-in for {identity} failed ({str(e)}), replaying its requests anonymously")
+    return tokens
+
+
+async def replay(client: httpx.AsyncClient, records: list, tokens: dict, args) -> tuple:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    # How far behind schedule requests went out: the client, not the
+    # server, was the bottleneck if this grows
+    lag = []
+    in_flight = asyncio.Semaphore(args.max_in_flight)
+
+    async def send(record: dict):
+        token = tokens.get(record.get("identity"))
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        url = record["path"] + (f"?{record['query']}" if record["query"] else "")
+        started = time.perf_counter()
+        try:
+            response = await client.request(record["method"], url, headers=headers)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        finally:
+            in_flight.release()
+        latencies[label(record)].append(time.perf_counter() - started)
+        if not ok:
+            errors[label(record)] += 1
+
+    tasks = []
+    first = records[0]["t"]
+    start = time.monotonic()
+    for record in records:
+        if args.speed > 0:
+            due = start + (record["t"] - first) / args.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await in_flight.acquire()
+        if args.speed > 0:
+            lag.append(max(0.0, time.monotonic() - due))
+        tasks.append(asyncio.create_task(send(record)))
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.monotonic() - start, lag
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['meta']['commit']} ({baseline_path}):")
+    print(f"{'endpoint':<40}{'p50 ms':>22}{'p95 ms':>22}{'p99 ms':>22}")
+    rows = list(current["endpoints"].items()) + [("total", current["total"])]
+    for name, stats in rows:
+        before = baseline["endpoints"].get(name) if name != "total" else baseline["total"]
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:>8} -> {stats[key]:<8}{change:+.0f}%")
+        print(f"{name:<40}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("capture", nargs="+", help="capture file(s); rotated .1, .2, ... backups are read too")
+    parser.add_argument("--target", default="http://127.0.0.1:8001", help="backend base URL")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay N times faster; 0 sends as fast as --max-in-flight allows")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--include-writes", action="store_true", help="replay other methods too (without bodies)")
+    parser.add_argument("--no-sign-in", action="store_true", help="replay every request anonymously")
+    parser.add_argument("--output", help="results file (default benchmarks/results/replay_<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture, args.include_writes)[:args.limit]
+    if not records:
+        raise SystemExit("No requests to replay")
+    identities = {record["identity"] for record in records if record.get("identity")}
+    span = records[-1]["t"] - records[0]["t"]
+    print(
+        f"Replaying {len(records)} requests from {len(identities)} identities over {span:.1f}s captured"
+        + (f" at {args.speed:g}x" if args.speed > 0 else ", unpaced")
+    )
+
+    async with httpx.AsyncClient(
+        base_url=args.target,
+        limits=httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight),
+        timeout=30.0
+    ) as client:
+        tokens = {} if args.no_sign_in else await sign_in(client, identities)
+        latencies, errors, elapsed, lag = await replay(client, records, tokens, args)
+
+    # What the same requests took when they were captured
+    captured = defaultdict(list)
+    for record in records:
+        captured[label(record)].append(record["duration_ms"] / 1000)
+
+    commit = git_commit()
+    lag.sort()
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.target,
+            "capture": args.capture,
+            "speed": args.speed,
+            "requests": len(records),
+            "identities": len(identities),
+            "elapsed": round(elapsed, 2),
+            "max_lag_ms": round(lag[-1] * 1000, 2) if lag else 0.0,
+            "python": platform.python_version(),
+            "machine": platform.machine()
+        },
+        "endpoints": {
+            name: summarize(values, errors[name], elapsed)
+            for name, values in sorted(latencies.items())
+        },
+        "total": summarize(
+            [value for values in latencies.values() for value in values],
+            sum(errors.values()),
+            elapsed
+        ),
+        "captured": {
+            name: summarize(values, 0, max(span, 0.001))
+            for name, values in sorted(captured.items())
+        }
+    }
+
+    print(f"{'endpoint':<40}{'requests':>10}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'captured p99':>14}")
+    for name, stats in list(results["endpoints"].items()) + [("total", results["total"])]:
+        recorded = results["captured"].get(name)
+        print(
+            f"{name:<40}{stats['requests']:>10}{stats['errors']:>8}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+            f"{recorded['p99_ms'] if recorded else '':>14}"
+        )
+    if results["meta"]["max_lag_ms"] > 100:
+        print(f"\nRequests went out up to {results['meta']['max_lag_ms']} ms late; raise --max-in-flight or lower --speed")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for a Redis server: just the RESP2 commands the cache
+backend uses (PING, AUTH, SELECT, GET, SET with EX/PX/NX, DEL), so the
+redis cache backend can be run and load-tested without installing Redis.
+
+    cd backend && python benchmarks/resp_server.py --port 6390
+
+Point the backend at it with:
+
+    CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6390/0
+"""
+
+import argparse
+import asyncio
+import time
+
+
+class RespStore:
+    def __init__(self):
+        # key -> (value, expires at or None)
+        self.data = {}
+
+    def get(self, key: bytes):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: list):
+        command = args[0].upper()
+        if command in (b"PING", b"AUTH", b"SELECT"):
+            return "+PONG" if command == b"PING" else "+OK"
+        if command == b"GET":
+            return self.get(args[1])
+        if command == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self.get(key) is not None:
+                    removed += 1
+                self.data.pop(key, None)
+            return removed
+        if command == b"SET":
+            key, value = args[1], args[2]
+            expires_at = None
+            only_new = False
+            options = [arg.upper() for arg in args[3:]]
+            for index, option in enumerate(options):
+                if option == b"NX":
+                    only_new = True
+                elif option in (b"EX", b"PX"):
+                    amount = float(args[3 + index + 1])
+                    expires_at = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+            if only_new and self.get(key) is not None:
+                return None
+            self.data[key] = (value, expires_at)
+            return "+OK"
+        return f"-ERR unknown command '{command.decode()}'"
+
+
+def encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return (reply + "\r\n").encode()
+    return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (redis-cli, telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6390):
+    store = RespStore()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                args = await read_command(reader)
+                if not args:
+                    break
+                writer.write(encode(store.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def main(port: int):
+    server = await serve(port=port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory RESP server for local cache testing")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(main(args.port))
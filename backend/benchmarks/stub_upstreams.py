@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the third-party hosts the backend calls: FreeGoldAPI,
+open.er-api.com and the Emergent auth session exchange. Responses have the
+upstream shapes and an optional fixed latency, so load tests don't depend
+on (or hammer) the real services.
+
+    cd backend && python benchmarks/stub_upstreams.py --port 9100 --latency-ms 20
+
+Point the backend at it with:
+
+    GOLD_PRICE_URL=http://127.0.0.1:9100/data/latest.json
+    FX_RATES_URL=http://127.0.0.1:9100/v6/latest/USD
+    AUTH_SESSION_URL=http://127.0.0.1:9100/auth/v1/env/oauth/session-data
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import date
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+FX_RATES = {
+    "USD": 1.0, "QAR": 3.64, "SAR": 3.75, "AED": 3.6725, "KWD": 0.307, "BHD": 0.376,
+    "OMR": 0.3845, "EGP": 48.5, "EUR": 0.92, "GBP": 0.79, "INR": 83.5
+}
+
+
+def stub_app(latency_ms: float = 0.0, seed: int = 42) -> Starlette:
+    rng = random.Random(seed)
+    delay = latency_ms / 1000
+
+    async def gold_latest(request: Request):
+        await asyncio.sleep(delay)
+        # A gently drifting spot price, so ticks actually change
+        price = round(2000 + rng.uniform(-15, 15), 2)
+        return JSONResponse([{"date": date.today().isoformat(), "price": price}])
+
+    async def fx_latest(request: Request):
+        await asyncio.sleep(delay)
+        return JSONResponse({"result": "success", "base_code": "USD", "rates": FX_RATES})
+
+    async def session_data(request: Request):
+        await asyncio.sleep(delay)
+        # Deterministic user per session id: load_N -> loadtest user N
+        session_id = request.headers.get("X-Session-ID")
+        if not session_id:
+            return JSONResponse({"detail": "missing session"}, status_code=401)
+        return JSONResponse({
+            "id": session_id,
+            "email": f"{session_id}@loadtest.local",
+            "name": f"Load Test {session_id}",
+            "picture": None,
+            "session_token": f"token_{session_id}"
+        })
+
+    return Starlette(routes=[
+        Route("/data/latest.json", gold_latest),
+        Route("/v6/latest/USD", fx_latest),
+        Route("/auth/v1/env/oauth/session-data", session_data)
+    ])
+
+
+def stub_env(base_url: str) -> dict:
+    """Environment pointing the backend's upstream URLs at the stub."""
+    return {
+        "GOLD_PRICE_URL": f"{base_url}/data/latest.json",
+        "FX_RATES_URL": f"{base_url}/v6/latest/USD",
+        "AUTH_SESSION_URL": f"{base_url}/auth/v1/env/oauth/session-data"
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub upstream servers for local load tests")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(stub_app(args.latency_ms), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Optional, Set
+
+
+class Subscription:
+    """One subscriber's bounded queue. A None item means: disconnect."""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Next message, None once dropped; raises TimeoutError after `timeout`."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drop(self):
+        self.dropped = True
+        # Make room for the sentinel; pending messages are discarded anyway
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class BroadcastHub:
+    """
+    In-process fan-out of pre-encoded messages to many subscribers.
+    Publishing never blocks: each subscriber has a bounded queue and a
+    subscriber whose queue is full is dropped instead of slowing the others.
+    """
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self.latest: Optional[bytes] = None
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: Set[Subscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        if self.latest is not None:
+            subscription.queue.put_nowait(self.latest)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, message: bytes):
+        self.latest = message
+        self.published += 1
+        slow = []
+        for subscription in self._subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                slow.append(subscription)
+        for subscription in slow:
+            self._subscribers.discard(subscription)
+            subscription.drop()
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "dropped": self.dropped
+        }
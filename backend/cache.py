@@ -0,0 +1,497 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional, Union
+from urllib.parse import urlparse
+
+from deadlines import remaining
+from metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the shm backend is Linux-only anyway
+    fcntl = None
+
+try:
+    import msgpack
+except ImportError:  # only the local backend works without it
+    msgpack = None
+
+CACHE_BACKENDS = ("local", "shm", "redis")
+DEFAULT_SHM_DIR = "/dev/shm/gold_vault_cache"
+DEFAULT_REDIS_URL = "redis://127.0.0.1:6379/0"
+LOCAL_MAX_ENTRIES = 10000
+# How long a worker refreshing a key may hold its lock before others
+# stop waiting for it
+REFRESH_LOCK_TTL = 15.0
+REFRESH_POLL_INTERVAL = 0.05
+# The shm backend sweeps expired snapshot files every this many writes
+SHM_PRUNE_EVERY = 1000
+
+# Snapshot file header: expiry (epoch seconds), payload length
+_SHM_HEADER = struct.Struct("<dI")
+# MessagePack extension type carrying datetimes (naive or aware) as ISO 8601
+_DATETIME_EXT = 1
+
+
+def _encode_default(obj):
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_DATETIME_EXT, obj.isoformat().encode())
+    raise TypeError(f"Can't cache {type(obj).__name__} values")
+
+
+def _decode_ext(code: int, data: bytes):
+    if code == _DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def encode_value(value) -> bytes:
+    """
+    MessagePack for values shared between processes: plain data and
+    datetimes only (tuples come back as lists). Unlike pickle, decoding
+    what another process or host wrote can't run code.
+    """
+    return msgpack.packb(value, default=_encode_default, use_bin_type=True)
+
+
+def decode_value(payload) -> Any:
+    return msgpack.unpackb(payload, ext_hook=_decode_ext, raw=False, strict_map_key=False)
+
+
+def _private_directory(directory: str):
+    # Snapshots are trusted on read, so the directory must be ours alone
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"Cache directory {directory} is not a directory owned by this user")
+    if info.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+
+
+class LocalCache:
+    """In-process LRU with per-key expiry. Each worker has its own copy."""
+
+    def __init__(self, max_entries: int = LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (expires at, value)
+        self._entries = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        # Nothing to coordinate with; Cache already refreshes each key
+        # once per process
+        return True
+
+    async def release(self, key: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SharedMemoryCache:
+    """
+    One snapshot file per key in a tmpfs directory (/dev/shm), shared by
+    every worker on the host. Writers replace the file atomically; readers
+    mmap it and decode it again only when it changed, so a hit is one
+    stat() and a dict lookup. Refresh locks are flock()s, released by the
+    kernel if the holder dies.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SHM_DIR):
+        if fcntl is None:
+            raise RuntimeError("The shm cache backend needs fcntl (Linux)")
+        if msgpack is None:
+            raise RuntimeError("The shm cache backend needs msgpack")
+        self.directory = directory
+        _private_directory(directory)
+        # key -> ((inode, mtime), expires at, value) of the last decoded snapshot
+        self._decoded = {}
+        self._locks = {}
+        self._writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    async def get(self, key: str):
+        path = self._path(key)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            self._decoded.pop(key, None)
+            return None
+        version = (info.st_ino, info.st_mtime_ns)
+
+        entry = self._decoded.get(key)
+        if entry is None or entry[0] != version:
+            try:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+                    expires_at, length = _SHM_HEADER.unpack_from(snapshot)
+                    value = decode_value(snapshot[_SHM_HEADER.size:_SHM_HEADER.size + length])
+            except (FileNotFoundError, ValueError, struct.error):
+                # Replaced or removed between stat() and open()
+                return None
+            entry = self._decoded[key] = (version, expires_at, value)
+
+        if entry[1] <= time.time():
+            return None
+        return entry[2]
+
+    async def set(self, key: str, value, ttl: float):
+        payload = encode_value(value)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_SHM_HEADER.pack(time.time() + ttl, len(payload)))
+            f.write(payload)
+        os.replace(temp_path, path)
+
+        self._writes += 1
+        if self._writes % SHM_PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """Remove expired snapshots (keys nobody asked for again)."""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name.endswith((".lock", ".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "rb") as f:
+                    expires_at, _ = _SHM_HEADER.unpack(f.read(_SHM_HEADER.size))
+                if expires_at <= now:
+                    os.unlink(path)
+                    removed += 1
+            except (FileNotFoundError, struct.error):
+                continue
+        return removed
+
+    async def delete(self, key: str):
+        self._decoded.pop(key, None)
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        lock_path = self._path(key) + ".lock"
+        while True:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # The holder unlinks the lock file on release; if we locked a
+            # file that was unlinked meanwhile, lock the current one instead
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(fd).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+        self._locks[key] = (lock_path, fd)
+        return True
+
+    async def release(self, key: str):
+        lock = self._locks.pop(key, None)
+        if lock is not None:
+            lock_path, fd = lock
+            # Unlink while still holding the lock, so lock files don't
+            # pile up for keys that are never refreshed again
+            try:
+                os.unlink(lock_path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    async def close(self):
+        for key in list(self._locks):
+            await self.release(key)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache:
+    """
+    Values MessagePack-encoded under namespaced keys on a Redis-protocol server
+    (Redis, Valkey, KeyDB, or benchmarks/resp_server.py locally). Speaks
+    just enough RESP2 over one connection for GET/SET/DEL; refresh locks
+    are SET NX PX with a random token.
+    """
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, prefix: str = "gold_vault:", timeout: float = 2.0):
+        if msgpack is None:
+            raise RuntimeError("The redis cache backend needs msgpack")
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        # One request in flight at a time on the single connection
+        self._io_lock = asyncio.Lock()
+        self._lock_tokens = {}
+        # key -> (raw bytes, value): unchanged values decode to the same object
+        self._decoded = OrderedDict()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", str(self.db))
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    async def _roundtrip(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def execute(self, *args):
+        async with self._io_lock:
+            try:
+                if self._writer is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._roundtrip(*args), self.timeout)
+            except RedisError:
+                raise
+            except BaseException:
+                # Timed out, cancelled or dropped: a reply may still be on
+                # its way, start over on a fresh connection
+                self._disconnect()
+                raise
+
+    async def get(self, key: str):
+        raw = await self.execute("GET", self.prefix + key)
+        if raw is None:
+            self._decoded.pop(key, None)
+            return None
+        entry = self._decoded.get(key)
+        if entry is not None and entry[0] == raw:
+            self._decoded.move_to_end(key)
+            return entry[1]
+        value = decode_value(raw)
+        self._decoded[key] = (raw, value)
+        while len(self._decoded) > LOCAL_MAX_ENTRIES:
+            self._decoded.popitem(last=False)
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        payload = encode_value(value)
+        await self.execute("SET", self.prefix + key, payload, "PX", max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        self._decoded.pop(key, None)
+        await self.execute("DEL", self.prefix + key)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        token = uuid.uuid4().hex
+        reply = await self.execute("SET", f"{self.prefix}lock:{key}", token, "NX", "PX", int(ttl * 1000))
+        if reply != "OK":
+            return False
+        self._lock_tokens[key] = token
+        return True
+
+    async def release(self, key: str):
+        token = self._lock_tokens.pop(key, None)
+        if token is None:
+            return
+        # Only drop the lock if it is still ours (it may have expired and
+        # been taken by another worker)
+        lock_key = f"{self.prefix}lock:{key}"
+        if await self.execute("GET", lock_key) == token.encode():
+            await self.execute("DEL", lock_key)
+
+    async def close(self):
+        self._disconnect()
+
+
+def create_cache_backend(kind: str, url: Optional[str] = None):
+    """`local`, `shm` (url: directory) or `redis` (url: redis://host:port/db)."""
+    if kind == "local":
+        return LocalCache()
+    if kind == "shm":
+        return SharedMemoryCache(url or DEFAULT_SHM_DIR)
+    if kind == "redis":
+        return RedisCache(url or DEFAULT_REDIS_URL)
+    raise ValueError(f"Unknown cache backend {kind!r}, expected one of {', '.join(CACHE_BACKENDS)}")
+
+
+class Cache:
+    """
+    A named cache on a shared backend. get_or_refresh() calls the loader
+    at most once per key at a time across all workers using the backend:
+    within a process concurrent misses share one refresh, across processes
+    the backend lock elects one refresher and the others wait for its
+    result. Backend errors degrade to calling the loader directly.
+    """
+
+    def __init__(self, backend, name: str, lock_ttl: float = REFRESH_LOCK_TTL):
+        self.backend = backend
+        self.name = name
+        self.lock_ttl = lock_ttl
+        self._inflight = {}
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def get(self, key: str):
+        try:
+            return await self.backend.get(self._key(key))
+        except Exception as e:
+            print(f"Cache {self.name} get error: {str(e)}")
+            return None
+
+    async def set(self, key: str, value, ttl: float):
+        try:
+            await self.backend.set(self._key(key), value, ttl)
+        except Exception as e:
+            print(f"Cache {self.name} set error: {str(e)}")
+
+    async def delete(self, key: str):
+        try:
+            await self.backend.delete(self._key(key))
+        except Exception as e:
+            print(f"Cache {self.name} delete error: {str(e)}")
+
+    async def get_or_refresh(
+        self,
+        key: str,
+        ttl: Union[float, Callable[[Any], float]],
+        loader: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Cached value for `key`, or the loader's result stored for `ttl`
+        seconds (or `ttl(value)`). Results `cacheable` rejects, and None,
+        are returned but not stored.
+        """
+        value = await self.get(key)
+        if value is not None:
+            record_cache(self.name, True)
+            return value
+        record_cache(self.name, False)
+
+        refresh = self._inflight.get(key)
+        if refresh is None:
+            refresh = asyncio.ensure_future(self._refresh(key, ttl, loader, cacheable))
+            self._inflight[key] = refresh
+            refresh.add_done_callback(lambda task: self._refresh_done(key, task))
+        # A cancelled caller must not cancel the refresh others wait on.
+        # Within a request budget, give up waiting when it runs out
+        # (TimeoutError) and let the caller degrade.
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(refresh)
+        return await asyncio.wait_for(asyncio.shield(refresh), max(left, 0))
+
+    def _refresh_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Callers may all have stopped waiting; the error is theirs to
+        # report, not the event loop's
+        if not task.cancelled():
+            task.exception()
+
+    async def _refresh(self, key, ttl, loader, cacheable):
+        lock_key = self._key(key)
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            try:
+                acquired = await self.backend.acquire(lock_key, self.lock_ttl)
+            except Exception as e:
+                print(f"Cache {self.name} lock error: {str(e)}")
+                return await loader()
+
+            if acquired:
+                try:
+                    # Another worker may have finished between our miss and the lock
+                    value = await self.get(key)
+                    if value is not None:
+                        return value
+                    value = await loader()
+                    if value is not None and (cacheable is None or cacheable(value)):
+                        seconds = ttl(value) if callable(ttl) else ttl
+                        if seconds > 0:
+                            await self.set(key, value, seconds)
+                    return value
+                finally:
+                    try:
+                        await self.backend.release(lock_key)
+                    except Exception as e:
+                        print(f"Cache {self.name} unlock error: {str(e)}")
+
+            # Another worker is refreshing: wait for its result instead of
+            # calling the upstream as well
+            await asyncio.sleep(REFRESH_POLL_INTERVAL)
+            value = await self.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() >= deadline:
+                return await loader()
@@ -0,0 +1,148 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl, urlencode
+
+# Query parameters whose values never reach the capture file
+SENSITIVE_PARAMS = frozenset({"token", "session_id", "session_token", "code", "key", "password", "secret"})
+CAPTURE_QUEUE_SIZE = 10000
+
+
+# Capture file path -> queue its writer thread drains
+_writers = {}
+
+
+def _writer(path: str, max_bytes: int, backups: int) -> queue.Queue:
+    """
+    One writer per file even if the middleware is built more than once:
+    logging's rotating file handler does the writing and rotation, fed
+    from a bounded queue by its listener thread.
+    """
+    path = os.path.abspath(path)
+    if path not in _writers:
+        records = queue.Queue(CAPTURE_QUEUE_SIZE)
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        listener = QueueListener(records, file_handler)
+        listener.start()
+        _writers[path] = records
+
+        def close():
+            # Flush what is still queued
+            listener.stop()
+            file_handler.close()
+
+        atexit.register(close)
+    return _writers[path]
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def session_token(scope) -> Optional[str]:
+    """The session cookie or bearer token, like get_current_user reads it."""
+    cookie = _header(scope, b"cookie")
+    if cookie:
+        for part in cookie.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "session_token" and value:
+                return value
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[7:]
+    return None
+
+
+def sanitize_query(query_string: bytes) -> str:
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode([
+        (name, "REDACTED" if name.lower() in SENSITIVE_PARAMS else value)
+        for name, value in params
+    ])
+
+
+class CaptureMiddleware:
+    """
+    Opt-in pure ASGI middleware writing one NDJSON line per HTTP request:
+    arrival time, method, path, route template, sanitized query, status,
+    duration and a salted hash of the session token, so a replay can
+    keep per-user request streams apart without knowing who they were.
+    Bodies, headers and cookies are not recorded. Lines are written from
+    a background thread to a size-rotated file; when the writer falls
+    behind, records are dropped rather than slowing requests down.
+    """
+
+    def __init__(
+        self,
+        app,
+        path: str,
+        salt: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        backups: int = 5,
+        sample_rate: float = 1.0,
+        exclude_paths: Iterable[str] = ()
+    ):
+        self.app = app
+        self.salt = salt.encode()
+        self.sample_rate = sample_rate
+        self.exclude_paths = tuple(exclude_paths)
+        self.dropped = 0
+        self._queue = _writer(path, max_bytes, backups)
+
+    def identity(self, scope) -> Optional[str]:
+        token = session_token(scope)
+        if token is None:
+            return None
+        return hashlib.sha256(self.salt + token.encode()).hexdigest()[:16]
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.exclude_paths)
+            or (self.sample_rate < 1 and random.random() >= self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.record({
+                "t": round(arrived, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "query": sanitize_query(scope["query_string"]),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "identity": self.identity(scope)
+            })
+
+    def record(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":"))
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            self.dropped += 1
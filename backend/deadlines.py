@@ -0,0 +1,95 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import httpx
+import pymongo
+
+BUDGET_HEADER = b"x-request-budget-ms"
+# Header overrides are clamped to this
+MAX_BUDGET_MS = 30000.0
+
+# Monotonic time the current request must be done waiting by
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget (may be <= 0), None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Bound the I/O waits in a block: Mongo operations get the rest of the
+    budget as maxTimeMS (and socket timeouts) through pymongo.timeout(),
+    upstream HTTP calls through TimedTransport. Nested budgets only shrink.
+    """
+    until = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        until = min(until, current)
+    token = _deadline.set(until)
+    try:
+        with pymongo.timeout(max(until - time.monotonic(), 0.001)):
+            yield
+    finally:
+        _deadline.reset(token)
+
+
+def is_timeout(error: Exception) -> bool:
+    """True for errors raised because a budget ran out."""
+    # pymongo errors carry .timeout; asyncio.TimeoutError is TimeoutError
+    return getattr(error, "timeout", False) is True or isinstance(error, (TimeoutError, httpx.TimeoutException))
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware giving each HTTP request a time budget: the
+    longest matching `budgets_ms` path prefix (None: no budget, for
+    streams and bulk transfers), else `default_ms`. Clients may ask for
+    a different one with X-Request-Budget-Ms.
+    """
+
+    def __init__(self, app, default_ms: float = 5000.0, budgets_ms: Optional[Dict[str, Optional[float]]] = None):
+        self.app = app
+        self.default_ms = default_ms
+        # Longest prefix first
+        self.budgets_ms = sorted((budgets_ms or {}).items(), key=lambda item: -len(item[0]))
+
+    def budget_ms(self, scope) -> Optional[float]:
+        budget = self.default_ms
+        for prefix, value in self.budgets_ms:
+            if scope["path"].startswith(prefix):
+                budget = value
+                break
+        if budget is None:
+            return None
+        for name, value in scope["headers"]:
+            if name == BUDGET_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0:
+                    budget = min(requested, MAX_BUDGET_MS)
+                break
+        return budget
+
+    async def __call__(self, scope, receive, send):
+        budget = self.budget_ms(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        with deadline(budget / 1000):
+            await self.app(scope, receive, send)
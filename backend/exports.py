@@ -0,0 +1,100 @@
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from responses import encode
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_BATCH_SIZE = 1000
+# Rows are buffered up to this size before being sent, instead of one
+# write per document
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def parse_date_range(start: Optional[str], end: Optional[str], field: str) -> dict:
+    """Mongo filter for `field` in [start, end), both optional ISO 8601 dates."""
+    bounds = {}
+    for name, value, operator in (("start", start, "$gte"), ("end", end, "$lt")):
+        if not value:
+            continue
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid '{name}' date: {value}")
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        bounds[operator] = moment
+    return {field: bounds} if bounds else {}
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _ndjson_chunks(cursor):
+    buffer = bytearray()
+    async for doc in cursor:
+        buffer += encode(doc)
+        buffer += b"\n"
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _csv_chunks(cursor, columns: List[str], rows: Callable[[dict], Iterable[dict]]):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, columns, extrasaction="ignore")
+    writer.writeheader()
+    async for doc in cursor:
+        for row in rows(doc):
+            writer.writerow({column: _csv_value(row.get(column)) for column in columns})
+        if out.tell() >= EXPORT_CHUNK_BYTES:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+def export_response(
+    cursor,
+    fmt: str,
+    filename: str,
+    columns: List[str],
+    rows: Optional[Callable[[dict], Iterable[dict]]] = None
+) -> StreamingResponse:
+    """
+    Stream a Motor cursor as NDJSON (one document per line) or CSV with
+    `columns`. `rows` flattens a document into one or more CSV rows. Only
+    one cursor batch and one output chunk are held in memory at a time.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    cursor = cursor.batch_size(EXPORT_BATCH_SIZE)
+
+    async def body():
+        try:
+            if fmt == "csv":
+                async for chunk in _csv_chunks(cursor, columns, rows or (lambda doc: [doc])):
+                    yield chunk
+            else:
+                async for chunk in _ndjson_chunks(cursor):
+                    yield chunk
+        finally:
+            # Client went away mid-download: free the server-side cursor
+            await cursor.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,68 @@
+import math
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def geo_point(lat: float, lng: float) -> dict:
+    """GeoJSON point as stored on store documents (note: lng first)."""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GeoGridIndex:
+    """
+    Fixed-size lat/lng grid over a snapshot of documents with a `geo` point.
+    A radius query only visits the cells overlapping the radius' bounding
+    box, then ranks the candidates by great-circle distance.
+    """
+
+    def __init__(self, docs: List[dict], cell_degrees: float = 0.05):
+        self.cell_degrees = cell_degrees
+        self.size = 0
+        self._cells = defaultdict(list)
+        for doc in docs:
+            coordinates = (doc.get("geo") or {}).get("coordinates")
+            if not coordinates:
+                continue
+            lng, lat = coordinates
+            self._cells[self._cell(lat, lng)].append((lat, lng, doc))
+            self.size += 1
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _candidates(self, lat: float, lng: float, radius_m: float):
+        dlat = radius_m / METERS_PER_DEGREE
+        dlng = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lng_lo = self._cell(lat - dlat, lng - dlng)
+        lat_hi, lng_hi = self._cell(lat + dlat, lng + dlng)
+
+        # A radius spanning more cells than there are points: just scan
+        if (lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1) > self.size:
+            for points in self._cells.values():
+                yield from points
+            return
+
+        for cell_lat in range(lat_lo, lat_hi + 1):
+            for cell_lng in range(lng_lo, lng_hi + 1):
+                yield from self._cells.get((cell_lat, cell_lng), ())
+
+    def nearby(self, lat: float, lng: float, radius_m: float, limit: Optional[int] = None) -> List[Tuple[float, dict]]:
+        """(distance in meters, doc) pairs within `radius_m`, nearest first."""
+        matches = []
+        for point_lat, point_lng, doc in self._candidates(lat, lng, radius_m):
+            distance = haversine_m(lat, lng, point_lat, point_lng)
+            if distance <= radius_m:
+                matches.append((distance, doc))
+        matches.sort(key=lambda match: match[0])
+        return matches[:limit] if limit is not None else matches
@@ -0,0 +1,135 @@
+import random
+from typing import List
+
+from pymongo import ReturnDocument
+
+
+class OutOfStockError(Exception):
+    def __init__(self, item_id: str):
+        super().__init__(f"Item {item_id} is out of stock")
+        self.item_id = item_id
+
+
+def _decrement(quantity: int) -> list:
+    # Pipeline update: decrement and keep in_stock in step, in one write
+    remaining = {"$subtract": ["$stock", quantity]}
+    return [{"$set": {"stock": remaining, "in_stock": {"$gt": [remaining, 0]}}}]
+
+
+async def _reserve_sharded(stock_shards, item_id: str, quantity: int, shard_count: int) -> List[dict]:
+    order = list(range(shard_count))
+    random.shuffle(order)
+
+    # Fast path: one shard covers the whole quantity
+    for shard in order:
+        result = await stock_shards.update_one(
+            {"item_id": item_id, "shard": shard, "stock": {"$gte": quantity}},
+            {"$inc": {"stock": -quantity}}
+        )
+        if result.modified_count:
+            return [{"item_id": item_id, "quantity": quantity, "shard": shard}]
+
+    # Slow path: gather from several shards, put everything back on a shortfall
+    taken = []
+    remaining = quantity
+    for shard in order:
+        before = await stock_shards.find_one_and_update(
+            {"item_id": item_id, "shard": shard, "stock": {"$gt": 0}},
+            [{"$set": {"stock": {"$max": [0, {"$subtract": ["$stock", remaining]}]}}}],
+            projection={"_id": 0, "stock": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before:
+            take = min(before["stock"], remaining)
+            taken.append({"item_id": item_id, "quantity": take, "shard": shard})
+            remaining -= take
+            if remaining == 0:
+                return taken
+
+    await release_allocations(None, stock_shards, taken)
+    raise OutOfStockError(item_id)
+
+
+async def reserve_items(jewelry, stock_shards, items: List[dict]) -> List[dict]:
+    """
+    Take stock for every {"item_id", "quantity"} in `items`, all or nothing.
+    Tracked items are decremented with a conditional update that can't go
+    below zero, so concurrent buyers never oversell. Items without a
+    `stock` field are not tracked and always succeed. Returns the
+    allocations to hand back to release_allocations.
+    """
+    allocations = []
+    try:
+        for item in items:
+            item_id = item["item_id"]
+            quantity = item["quantity"]
+            if quantity != int(quantity) or quantity < 1:
+                raise ValueError(f"Quantity for {item_id} must be a positive whole number")
+            quantity = int(quantity)
+
+            result = await jewelry.update_one(
+                {"item_id": item_id, "stock": {"$gte": quantity}},
+                _decrement(quantity)
+            )
+            if result.modified_count:
+                allocations.append({"item_id": item_id, "quantity": quantity, "shard": None})
+                continue
+
+            doc = await jewelry.find_one(
+                {"item_id": item_id},
+                {"_id": 0, "stock": 1, "stock_shards": 1}
+            )
+            if doc is None or doc.get("stock") is None:
+                continue
+            if doc.get("stock_shards"):
+                try:
+                    allocations.extend(
+                        await _reserve_sharded(stock_shards, item_id, quantity, doc["stock_shards"])
+                    )
+                except OutOfStockError:
+                    await jewelry.update_one({"item_id": item_id}, {"$set": {"in_stock": False}})
+                    raise
+                continue
+            raise OutOfStockError(item_id)
+    except Exception:
+        await release_allocations(jewelry, stock_shards, allocations)
+        raise
+
+    return allocations
+
+
+async def release_allocations(jewelry, stock_shards, allocations: List[dict]):
+    """Give reserved stock back (abandoned carts, failed orders)."""
+    for allocation in allocations:
+        if allocation["shard"] is None:
+            await jewelry.update_one(
+                {"item_id": allocation["item_id"]},
+                {"$inc": {"stock": allocation["quantity"]}, "$set": {"in_stock": True}}
+            )
+        else:
+            await stock_shards.update_one(
+                {"item_id": allocation["item_id"], "shard": allocation["shard"]},
+                {"$inc": {"stock": allocation["quantity"]}}
+            )
+            if jewelry is not None:
+                await jewelry.update_one({"item_id": allocation["item_id"]}, {"$set": {"in_stock": True}})
+
+
+async def set_item_stock(jewelry, stock_shards, item_id: str, stock: int, shards: int = 0):
+    """
+    Set an item's stock. With `shards` > 1 the count is split over that many
+    shard documents, so concurrent buyers of a hot item update different
+    documents instead of queueing on one.
+    """
+    await stock_shards.delete_many({"item_id": item_id})
+    if shards > 1:
+        base, extra = divmod(stock, shards)
+        await stock_shards.insert_many([
+            {"item_id": item_id, "shard": shard, "stock": base + (1 if shard < extra else 0)}
+            for shard in range(shards)
+        ])
+        update = {"stock": 0, "stock_shards": shards, "in_stock": stock > 0}
+    else:
+        update = {"stock": stock, "stock_shards": 0, "in_stock": stock > 0}
+
+    return await jewelry.update_one({"item_id": item_id}, {"$set": update})
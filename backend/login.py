@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+SESSION_LIFETIME = timedelta(days=7)
+
+
+def new_portfolio_fields(now: datetime) -> dict:
+    return {
+        "gold_holdings": 0.0,
+        "total_invested": 0.0,
+        "current_value": 0.0,
+        "updated_at": now
+    }
+
+
+async def upsert_user(users, user_data: dict, now: datetime) -> Tuple[dict, bool]:
+    """
+    The user with this email, created from `user_data` if there is none,
+    in one round trip. Returns (user, created). Needs the unique email
+    index: of two concurrent first logins one inserts, the other gets the
+    duplicate key error (when the server doesn't retry it itself) and
+    reads the winner's user on a second try.
+    """
+    user_id = f"user_{uuid.uuid4().hex[:12]}"
+    update = {"$setOnInsert": {
+        "user_id": user_id,
+        "email": user_data["email"],
+        "name": user_data["name"],
+        "picture": user_data.get("picture"),
+        "gold_balance": 0.0,
+        "created_at": now
+    }}
+    for attempt in range(2):
+        try:
+            user = await users.find_one_and_update(
+                {"email": user_data["email"]},
+                update,
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            if attempt:
+                raise
+    return user, user["user_id"] == user_id
+
+
+async def login(users, portfolio, sessions, user_data: dict, now: datetime) -> Tuple[dict, dict]:
+    """
+    Find or create the user for an authenticated identity and open a
+    session: the user upsert, then the session insert overlapped with the
+    new user's portfolio upsert. Two round trips, race-free for concurrent
+    first logins. Returns (user, session).
+    """
+    user, created = await upsert_user(users, user_data, now)
+
+    session = {
+        "user_id": user["user_id"],
+        "session_token": user_data["session_token"],
+        "expires_at": now + SESSION_LIFETIME,
+        "created_at": now
+    }
+    writes = [sessions.insert_one(session)]
+    if created:
+        writes.append(portfolio.update_one(
+            {"user_id": user["user_id"]},
+            {"$setOnInsert": new_portfolio_fields(now)},
+            upsert=True
+        ))
+    await asyncio.gather(*writes)
+
+    session.pop("_id", None)
+    return user, session
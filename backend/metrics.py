@@ -0,0 +1,307 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import httpx
+from pymongo import monitoring
+
+from deadlines import remaining
+from tracing import record_span
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upstream timeout outside a request budget (background refreshes)
+UPSTREAM_TIMEOUT = 10.0
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        # Updated from Motor's executor threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> list:
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value set directly, or computed at scrape time by `function`."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), function: Optional[Callable] = None):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+        self._function = function
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+    def render(self) -> list:
+        lines = self.header()
+        # The function returns {label values tuple: value}
+        values = self._function() if self._function else dict(self._values)
+        for label_values, value in values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = self.header()
+        with self._lock:
+            items = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.label_names, label_values, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+))
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+))
+mongo_command_duration = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command")
+))
+mongo_command_failures = registry.register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed", ("collection", "command")
+))
+upstream_request_duration = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Outgoing HTTP call latency by host", ("host",)
+))
+upstream_requests = registry.register(Counter(
+    "upstream_requests_total", "Outgoing HTTP calls by host and status", ("host", "status")
+))
+upstream_errors = registry.register(Counter(
+    "upstream_errors_total", "Outgoing HTTP calls that failed (transport error or 5xx)", ("host", "kind")
+))
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit, miss)", ("cache", "result")
+))
+
+
+def _cache_hit_ratios() -> dict:
+    caches = {labels[0] for labels in list(cache_requests._values)}
+    ratios = {}
+    for cache in caches:
+        hits = cache_requests.value(cache, "hit")
+        total = hits + cache_requests.value(cache, "miss")
+        if total:
+            ratios[(cache,)] = round(hits / total, 4)
+    return ratios
+
+
+registry.register(Gauge(
+    "cache_hit_ratio", "Hits over lookups since start, per cache", ("cache",), function=_cache_hit_ratios
+))
+event_loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer due now",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+event_loop_lag_last = registry.register(Gauge(
+    "event_loop_lag_last_seconds", "Most recent event loop lag sample"
+))
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Requests are labelled
+    with the matched route template (/api/orders/{order_id}), never the
+    raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], template)
+            http_requests.inc(scope["method"], template, str(status))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Command monitoring for the Motor client. pymongo reports durations
+    itself; the started event is only kept to know the collection.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        if not isinstance(collection, str):
+            collection = "-"  # aggregate: 1, ping, ...
+        self._pending[(event.request_id, event.connection_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.request_id, event.connection_id), "-")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        record_span(f"mongo {event.command_name} {collection}", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.request_id, event.connection_id), "-")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_command_failures.inc(collection, event.command_name)
+        record_span(f"mongo {event.command_name} {collection} (failed)", event.duration_micros / 1e6)
+
+
+class TimedTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        # Within a request budget, no wait may outlast what is left of it
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                upstream_errors.inc(host, "deadline")
+                raise httpx.TimeoutException("Request deadline exceeded", request=request)
+            timeouts = request.extensions.get("timeout", {})
+            request.extensions["timeout"] = {
+                name: left if value is None else min(value, left)
+                for name, value in timeouts.items()
+            } or {"connect": left, "read": left, "write": left, "pool": left}
+        started = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            elapsed = time.perf_counter() - started
+            upstream_request_duration.observe(elapsed, host)
+            upstream_errors.inc(host, "transport")
+            record_span(f"http {host} (failed)", elapsed)
+            raise
+        # Time to response headers; bodies are small JSON documents
+        elapsed = time.perf_counter() - started
+        upstream_request_duration.observe(elapsed, host)
+        record_span(f"http {host}", elapsed)
+        upstream_requests.inc(host, str(response.status_code))
+        if response.status_code >= 500:
+            upstream_errors.inc(host, "status")
+        return response
+
+
+def upstream_client(**kwargs) -> httpx.AsyncClient:
+    """
+    httpx client whose calls are timed per upstream host and bounded by
+    the current request budget (UPSTREAM_TIMEOUT outside one).
+    """
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUT)
+    return httpx.AsyncClient(transport=TimedTransport(), **kwargs)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        event_loop_lag.observe(lag)
+        event_loop_lag_last.set(lag)
@@ -0,0 +1,129 @@
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are disabled without it
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # falls back to gzip
+    brotli = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _tokens(header_value: str):
+    # Yields the accepted tokens of an Accept / Accept-Encoding header,
+    # skipping the ones explicitly refused with q=0
+    for part in header_value.split(","):
+        token, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        token = token.strip().lower()
+        if token and quality > 0:
+            yield token
+
+
+def accepts_msgpack(accept: str) -> bool:
+    return msgpack is not None and any(t in MSGPACK_MEDIA_TYPES for t in _tokens(accept))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    tokens = set(_tokens(accept_encoding))
+    if brotli is not None and "br" in tokens:
+        return "br"
+    if "gzip" in tokens:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=min(level, 9))
+
+
+class NegotiationMiddleware:
+    """
+    Response layer over the JSON routes:
+    - `Accept: application/msgpack` transcodes the JSON body to MessagePack
+    - bodies of at least `minimum_size` bytes are brotli/gzip compressed
+      according to `Accept-Encoding`
+    Streaming responses and non-JSON bodies pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compress_level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        wants_msgpack = accepts_msgpack(headers.get("accept", ""))
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if not wants_msgpack and not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_negotiated(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            response_headers = MutableHeaders(raw=start_message["headers"])
+            is_json = response_headers.get("content-type", "").startswith("application/json")
+            if (
+                not is_json
+                or not message.get("body")
+                or message.get("more_body", False)
+                or "content-encoding" in response_headers
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if wants_msgpack:
+                body = msgpack.packb(json_loads(body), use_bin_type=True)
+                response_headers["content-type"] = "application/msgpack"
+            if encoding and len(body) >= self.minimum_size:
+                body = compress(body, encoding, self.compress_level)
+                response_headers["content-encoding"] = encoding
+
+            response_headers["content-length"] = str(len(body))
+            response_headers.add_vary_header("Accept")
+            response_headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_negotiated)
@@ -0,0 +1,168 @@
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import httpx
+
+from metrics import upstream_client
+
+DEFAULT_FX_RATES_URL = "https://open.er-api.com/v6/latest/USD"
+FX_TTL_SECONDS = 3600
+
+MATRIX_KARATS = (24, 22, 21, 18, 14)
+# Grams per unit
+MATRIX_UNITS = {
+    "gram": 1.0,
+    "ounce": 31.1034768,
+    "tola": 11.6638038
+}
+# USD-based rates used until the first successful fetch (GCC pegs are
+# fixed; the rest are approximate)
+DEFAULT_FX_RATES = {
+    "USD": 1.0,
+    "QAR": 3.64,
+    "SAR": 3.75,
+    "AED": 3.6725,
+    "KWD": 0.307,
+    "BHD": 0.376,
+    "OMR": 0.3845,
+    "EGP": 48.5,
+    "EUR": 0.92,
+    "GBP": 0.79,
+    "INR": 83.5
+}
+MATRIX_CURRENCIES = tuple(DEFAULT_FX_RATES)
+# Three-decimal currencies are priced to the fils
+CURRENCY_DECIMALS = {"KWD": 3, "BHD": 3, "OMR": 3}
+
+
+class FxTable:
+    """
+    USD-based exchange rates, refreshed at most once per `ttl` seconds.
+    With a shared `cache` (a cache.Cache) the rates are fetched once per
+    `ttl` across every worker on the backend, whatever the worker count;
+    each worker then holds its copy until the shared snapshot expires.
+    """
+
+    def __init__(self, url: str = DEFAULT_FX_RATES_URL, ttl: float = FX_TTL_SECONDS, cache=None):
+        self.url = url
+        self.ttl = ttl
+        self.cache = cache
+        self.rates = dict(DEFAULT_FX_RATES)
+        self.source = "default"
+        self.fetched_at = None
+
+    def rate(self, currency: str) -> float:
+        return self.rates[currency]
+
+    def stale(self) -> bool:
+        return self.fetched_at is None or time.monotonic() - self.fetched_at >= self.ttl
+
+    async def fetch(self, http_client: httpx.AsyncClient) -> dict:
+        """A snapshot of the upstream rates: rates, source and fetch time (epoch)."""
+        response = await http_client.get(self.url)
+        if response.status_code != 200:
+            raise Exception(f"Exchange Rate API returned status {response.status_code}")
+        rates = response.json().get("rates", {})
+        return {
+            "rates": {currency: float(rates[currency]) for currency in MATRIX_CURRENCIES if currency in rates},
+            "source": "OpenExchangeRates",
+            "fetched_at": time.time()
+        }
+
+    def apply(self, snapshot: dict):
+        # Keep the previous rate for any currency missing from the payload
+        self.rates.update(snapshot["rates"])
+        self.source = snapshot["source"]
+        # Stale locally when the snapshot is, not ttl after this worker got it
+        age = max(0.0, time.time() - snapshot["fetched_at"])
+        self.fetched_at = time.monotonic() - age
+
+    async def _fetch_upstream(self) -> dict:
+        async with upstream_client() as http_client:
+            return await self.fetch(http_client)
+
+    async def refresh_if_stale(self):
+        if not self.stale():
+            return
+        try:
+            if self.cache is None:
+                snapshot = await self._fetch_upstream()
+            else:
+                snapshot = await self.cache.get_or_refresh(
+                    "rates",
+                    lambda value: self.ttl - (time.time() - value["fetched_at"]),
+                    self._fetch_upstream
+                )
+            self.apply(snapshot)
+        except Exception as e:
+            # Keep serving the last known rates, retry on the next tick
+            self.fetched_at = time.monotonic() - self.ttl + 60
+            print(f"FX rates fetch error: {str(e)}")
+
+
+def build_matrix(price_24k_qar: float, rates: dict, timestamp: datetime, fx_source: str) -> dict:
+    """
+    Every currency x unit x karat price for one tick, derived from the 24k
+    QAR gram price through cross rates so the QAR cells match the tick.
+    """
+    gram_usd = price_24k_qar / rates["QAR"]
+    prices = {}
+    for currency in MATRIX_CURRENCIES:
+        decimals = CURRENCY_DECIMALS.get(currency, 2)
+        gram = gram_usd * rates[currency]
+        prices[currency] = {
+            unit: {
+                str(karat): round(gram * grams * karat / 24, decimals)
+                for karat in MATRIX_KARATS
+            }
+            for unit, grams in MATRIX_UNITS.items()
+        }
+    return {
+        "timestamp": timestamp,
+        "fx_source": fx_source,
+        "rates": {currency: rates[currency] for currency in MATRIX_CURRENCIES},
+        "prices": prices
+    }
+
+
+def _selection(value: Optional[str], allowed: Iterable, name: str, normalize) -> Optional[List]:
+    if not value:
+        return None
+    selected = []
+    for part in value.split(","):
+        try:
+            part = normalize(part.strip())
+        except ValueError:
+            raise ValueError(f"Unknown {name}: {part}")
+        if part not in allowed:
+            raise ValueError(f"Unknown {name}: {part}")
+        selected.append(part)
+    return selected
+
+
+def filter_matrix(matrix: dict, currency: Optional[str], unit: Optional[str], karat: Optional[str]) -> dict:
+    """
+    Slice of the matrix for comma-separated `currency`, `unit` and `karat`
+    filters (None keeps everything). Raises ValueError on unknown values.
+    """
+    currencies = _selection(currency, MATRIX_CURRENCIES, "currency", str.upper)
+    units = _selection(unit, MATRIX_UNITS, "unit", str.lower)
+    karats = _selection(karat, MATRIX_KARATS, "karat", int)
+    if currencies is None and units is None and karats is None:
+        return matrix
+
+    prices = {}
+    for currency_code in currencies or MATRIX_CURRENCIES:
+        prices[currency_code] = {
+            unit_name: (
+                {str(k): cells[str(k)] for k in karats} if karats else cells
+            )
+            for unit_name, cells in matrix["prices"][currency_code].items()
+            if units is None or unit_name in units
+        }
+    return {
+        **matrix,
+        "rates": {currency_code: matrix["rates"][currency_code] for currency_code in prices},
+        "prices": prices
+    }
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Bulk product import for store onboarding. Rows stream in as NDJSON or CSV,
+are validated a batch at a time and upserted on (store, item_id) with unordered
+bulk_write chunks, so memory stays bounded by the chunk size whatever the
+size of the upload.
+
+    cd backend && python product_import.py store_1 products.ndjson
+    cd backend && python product_import.py store_1 products.csv --format csv
+"""
+
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+async def _lines(chunks: AsyncIterator[bytes]):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]):
+    row = 0
+    async for line in _lines(chunks):
+        row += 1
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(value, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, value, None
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes]):
+    header = None
+    record = []
+    row = 0
+    async for line in _lines(chunks):
+        # A quoted field may span lines; wait for the closing quote
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue
+        record = []
+
+        values = next(csv.reader(io.StringIO(text)), [])
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if not any(values):
+            continue
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells are missing values, let the model's defaults apply
+        yield row, {name: value for name, value in zip(header, values) if value != ""}, None
+
+    if record:
+        yield row + 1, None, "Unterminated quoted field"
+
+
+def _validate(adapter: TypeAdapter, docs: List[dict]):
+    """
+    Validate a batch in one call. Returns the models and {index: message}
+    for the rows that failed; only a batch with failures is validated twice.
+    """
+    try:
+        return adapter.validate_python(docs), {}
+    except ValidationError as e:
+        failures = {}
+        for error in e.errors():
+            index, *field = error["loc"]
+            location = ".".join(str(part) for part in field) or "row"
+            failures.setdefault(index, f"{location}: {error['msg']}")
+    valid = [doc for index, doc in enumerate(docs) if index not in failures]
+    return adapter.validate_python(valid), failures
+
+
+def _upsert(item: BaseModel, scope: dict) -> UpdateOne:
+    # Columns left out of the file keep their stored value on re-import
+    # (stock counts in particular); defaults only apply to new items
+    provided = item.model_dump(exclude_unset=True)
+    defaults = {
+        field: value for field, value in item.model_dump().items()
+        if field not in provided
+    }
+    update = {"$set": provided}
+    if defaults:
+        update["$setOnInsert"] = defaults
+    # Matching on the scope too: an item_id another store already has
+    # doesn't match, and its upsert fails on the unique item_id index
+    # instead of moving the item over
+    return UpdateOne({**scope, "item_id": item.item_id}, update, upsert=True)
+
+
+async def _write(collection, rows: List[int], operations: List[UpdateOne], report: ImportReport):
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details["writeErrors"]:
+            if error["code"] == 11000:
+                message = "item_id: already used by another store"
+            else:
+                message = error["errmsg"]
+            report.error(rows[error["index"]], message)
+    report.inserted += details["nUpserted"]
+    report.updated += details["nMatched"]
+
+
+async def import_products(
+    collection,
+    chunks: AsyncIterator[bytes],
+    model: Type[BaseModel],
+    fmt: str = "ndjson",
+    scope: Optional[dict] = None,
+    defaults: Optional[dict] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> ImportReport:
+    """
+    Stream rows from `chunks` into `collection`. Rows must agree with
+    `scope` (the store being onboarded) where they set those fields;
+    `scope` and `defaults` fill in whatever a row leaves out. At most one
+    chunk is being written while the next one is parsed and validated.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    adapter = TypeAdapter(List[model])
+    scope = scope or {}
+    defaults = {**(defaults or {}), **scope}
+    report = ImportReport()
+    pending_write = None
+    batch = {}
+
+    async def flush():
+        nonlocal pending_write, batch
+        rows = list(batch.keys())
+        items, failures = _validate(adapter, list(batch.values()))
+        batch = {}
+        for index, message in failures.items():
+            report.error(rows[index], message)
+        rows = [row for index, row in enumerate(rows) if index not in failures]
+
+        if pending_write:
+            await pending_write
+            pending_write = None
+        if items:
+            pending_write = asyncio.create_task(
+                _write(collection, rows, [_upsert(item, scope) for item in items], report)
+            )
+
+    parse = _csv_rows if fmt == "csv" else _ndjson_rows
+    item_rows = {}
+    async for row, doc, error in parse(chunks):
+        report.rows += 1
+        if error:
+            report.error(row, error)
+            continue
+
+        mismatch = next((field for field, value in scope.items() if doc.get(field, value) != value), None)
+        if mismatch:
+            report.error(row, f"{mismatch}: must be {scope[mismatch]!r}")
+            continue
+        doc = {**defaults, **doc}
+
+        # Unordered upserts of one item_id within a chunk would race;
+        # the later row wins, as it would in a sequential import. Rows
+        # without an item_id aren't duplicates, validation rejects them
+        item_id = doc.get("item_id")
+        if item_id is not None:
+            previous = item_rows.get(item_id)
+            if previous in batch:
+                del batch[previous]
+                report.error(previous, f"item_id: superseded by row {row}")
+            item_rows[item_id] = row
+        batch[row] = doc
+
+        if len(batch) >= chunk_size:
+            item_rows = {}
+            await flush()
+
+    if batch:
+        await flush()
+    if pending_write:
+        await pending_write
+    return report
+
+
+async def _file_chunks(path: str, size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def main():
+    import argparse
+    import time
+
+    from server import JewelryItem, jewelry_collection, stores_collection
+    from store_aggregates import rebuild_store_aggregates
+
+    parser = argparse.ArgumentParser(description="Import products for a store from NDJSON or CSV")
+    parser.add_argument("store_id")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    store = await stores_collection.find_one({"store_id": args.store_id}, {"_id": 0})
+    if not store:
+        raise SystemExit(f"Store {args.store_id} not found")
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+
+    started = time.perf_counter()
+    report = await import_products(
+        jewelry_collection,
+        _file_chunks(args.path),
+        JewelryItem,
+        fmt,
+        scope={"store_id": args.store_id},
+        defaults={"store_name": store.get("name_ar") or store["name"]},
+        chunk_size=args.chunk_size
+    )
+    await rebuild_store_aggregates(stores_collection, jewelry_collection, [args.store_id])
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    print(f"{report.rows} rows in {elapsed:.2f}s ({report.rows / elapsed:,.0f}/s)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+from typing import Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+# Catalog text fields per language; the other language's fields are dropped
+LANGUAGE_FIELDS = {
+    "en": ("name", "description"),
+    "ar": ("name_ar", "description_ar"),
+}
+
+
+def build_projection(
+    model: Type[BaseModel],
+    fields: Optional[str] = None,
+    lang: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Translate `fields=a,b,c` / `lang=en|ar` query parameters into a Mongo
+    projection over `model`'s fields. Returns None when the full document
+    was requested, so callers can keep their regular response path.
+    """
+    if not fields and not lang:
+        return None
+
+    if lang is not None and lang not in LANGUAGE_FIELDS:
+        raise HTTPException(status_code=400, detail="lang must be one of: en, ar")
+
+    excluded = set()
+    if lang:
+        for other, names in LANGUAGE_FIELDS.items():
+            if other != lang:
+                excluded.update(names)
+
+    if not fields:
+        projection = {"_id": 0}
+        projection.update({name: 0 for name in sorted(excluded)})
+        return projection
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in requested if name not in excluded})
+    if len(projection) == 1:
+        raise HTTPException(
+            status_code=400,
+            detail="None of the requested fields are served for this language"
+        )
+    return projection
+
+
+def apply_projection(docs: list, projection: Optional[dict]) -> list:
+    """Apply a projection from build_projection to in-memory documents."""
+    if projection is None:
+        return docs
+
+    included = [name for name, flag in projection.items() if flag and name != "_id"]
+    if included:
+        return [{name: doc[name] for name in included if name in doc} for doc in docs]
+
+    excluded = {name for name, flag in projection.items() if not flag}
+    return [{k: v for k, v in doc.items() if k not in excluded} for doc in docs]
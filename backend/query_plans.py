@@ -0,0 +1,266 @@
+import copy
+import json
+import threading
+import time
+from typing import List
+
+from pymongo import monitoring
+
+from metrics import Gauge, registry
+
+MAX_SHAPES = 1000
+EXPLAINS_PER_ROUND = 20
+# A shape is re-explained after this long, as data and indexes change
+EXPLAIN_TTL_SECONDS = 3600
+# Flag plans reading many more documents than they return
+EXAMINED_RATIO_THRESHOLD = 10
+EXAMINED_MIN_DOCS = 100
+
+# Command -> the parts of it that make up the query shape and are needed
+# to explain it again later
+_QUERY_FIELDS = {
+    "find": ("filter", "sort", "projection", "limit", "skip", "hint"),
+    "aggregate": ("pipeline", "hint"),
+    "count": ("query", "hint"),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort", "update", "fields"),
+    "update": ("updates",),
+    "delete": ("deletes",)
+}
+
+
+def _shape(value):
+    # Keys and operators stay, values become "?"
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        shapes = [_shape(item) for item in value if isinstance(item, (dict, list))]
+        return shapes or "?"
+    return "?"
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def shape_key(command_name: str, command: dict) -> str:
+    """
+    `find orders filter={"user_id":"?"} sort={"created_at":-1}`: what the
+    query looks like regardless of the values it was called with.
+    """
+    parts = [command_name, str(command.get(command_name))]
+    if command_name == "find":
+        parts.append(f"filter={_dumps(_shape(command.get('filter', {})))}")
+        if command.get("sort"):
+            parts.append(f"sort={_dumps(command['sort'])}")
+        if command.get("projection"):
+            parts.append(f"projection={_dumps(sorted(command['projection']))}")
+    elif command_name == "aggregate":
+        stages = []
+        for stage in command.get("pipeline", []):
+            name, spec = next(iter(stage.items()))
+            # Only the stages that decide the plan; the rest by name
+            stages.append({name: _shape(spec) if name == "$match" else (spec if name == "$sort" else "...")})
+        parts.append(f"pipeline={_dumps(stages)}")
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        parts.append(f"filter={_dumps(_shape(statements[0].get('q', {})))}")
+    else:
+        parts.append(f"filter={_dumps(_shape(command.get('query', {})))}")
+        if command.get("sort"):
+            parts.append(f"sort={_dumps(command['sort'])}")
+    return " ".join(parts)
+
+
+def _find(document, key: str):
+    # First value stored under `key` anywhere in an explain document
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _stages(plan) -> List[str]:
+    names = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            names.append(plan["stage"])
+        for value in plan.values():
+            names.extend(_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            names.extend(_stages(value))
+    return names
+
+
+def analyze_explain(explain: dict) -> dict:
+    """Winning plan stages, docs examined/returned and the problems found."""
+    winning = _find(explain, "winningPlan") or {}
+    stats = _find(explain, "executionStats") or {}
+    stages = _stages(winning)
+    examined = stats.get("totalDocsExamined", 0)
+    returned = stats.get("nReturned", 0)
+
+    flags = []
+    if "COLLSCAN" in stages:
+        flags.append("collscan")
+    # A SORT stage means the index doesn't provide the order; so does a
+    # $sort the aggregation couldn't push into the query
+    pipeline_sort = any("$sort" in stage for stage in explain.get("stages", []) if isinstance(stage, dict))
+    if "SORT" in stages or pipeline_sort:
+        flags.append("in_memory_sort")
+    ratio = examined / max(returned, 1)
+    if examined >= EXAMINED_MIN_DOCS and ratio > EXAMINED_RATIO_THRESHOLD:
+        flags.append("examined_ratio")
+
+    return {
+        "stages": stages,
+        "docs_examined": examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "returned": returned,
+        "examined_ratio": round(ratio, 1),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "flags": flags
+    }
+
+
+class QueryShapes(monitoring.CommandListener):
+    """
+    Command listener recording every query shape the app issues, with one
+    concrete example of each to explain later. Recording is a dict lookup
+    per command; the explains run in the background a few at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.shapes = {}
+
+    def started(self, event):
+        fields = _QUERY_FIELDS.get(event.command_name)
+        if fields is None:
+            return
+        command = event.command
+        key = shape_key(event.command_name, command)
+        with self._lock:
+            entry = self.shapes.get(key)
+            if entry is not None:
+                entry["count"] += 1
+                return
+            if len(self.shapes) >= MAX_SHAPES:
+                return
+            example = {event.command_name: command[event.command_name]}
+            for field in fields:
+                if field in command:
+                    example[field] = copy.deepcopy(command[field])
+            if event.command_name in ("update", "delete"):
+                # One statement is enough to explain the shape
+                example[fields[0]] = example.get(fields[0], [])[:1]
+            if event.command_name == "aggregate":
+                example["cursor"] = {}
+            self.shapes[key] = {
+                "shape": key,
+                "collection": str(command[event.command_name]),
+                "command": event.command_name,
+                "database": event.database_name,
+                "count": 1,
+                "example": example,
+                "plan": None,
+                "explained_at": None
+            }
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def due(self, limit: int) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entries = [
+                entry for entry in self.shapes.values()
+                if entry["explained_at"] is None or now - entry["explained_at"] >= EXPLAIN_TTL_SECONDS
+            ]
+        # Never explained first, then the busiest
+        entries.sort(key=lambda entry: (entry["explained_at"] is not None, -entry["count"]))
+        return entries[:limit]
+
+    async def sample(self, client, limit: int = EXPLAINS_PER_ROUND) -> int:
+        """Explain up to `limit` due shapes; returns how many were explained."""
+        explained = 0
+        for entry in self.due(limit):
+            example = entry["example"]
+            pipeline = example.get("pipeline", [])
+            if any("$out" in stage or "$merge" in stage for stage in pipeline):
+                entry["explained_at"] = time.monotonic()
+                continue
+            try:
+                explain = await client[entry["database"]].command(
+                    {"explain": example, "verbosity": "executionStats"}
+                )
+            except Exception as e:
+                print(f"Explain error for {entry['shape']}: {str(e)}")
+                entry["explained_at"] = time.monotonic()
+                continue
+
+            previous = (entry["plan"] or {}).get("flags", [])
+            entry["plan"] = analyze_explain(explain)
+            entry["explained_at"] = time.monotonic()
+            explained += 1
+            if entry["plan"]["flags"] and entry["plan"]["flags"] != previous:
+                print(
+                    f"Query plan warning: {entry['shape']} -> {', '.join(entry['plan']['flags'])} "
+                    f"(examined {entry['plan']['docs_examined']}, returned {entry['plan']['returned']}, "
+                    f"stages {'/'.join(entry['plan']['stages'])})"
+                )
+        return explained
+
+    def report(self, flagged_only: bool = False) -> List[dict]:
+        with self._lock:
+            entries = list(self.shapes.values())
+        rows = []
+        for entry in entries:
+            plan = entry["plan"]
+            if flagged_only and not (plan and plan["flags"]):
+                continue
+            rows.append({
+                "shape": entry["shape"],
+                "collection": entry["collection"],
+                "command": entry["command"],
+                "count": entry["count"],
+                "plan": plan
+            })
+        rows.sort(key=lambda row: (not (row["plan"] and row["plan"]["flags"]), -row["count"]))
+        return rows
+
+    def flagged(self) -> dict:
+        # For the metrics gauge: one series per flagged shape and flag kind
+        values = {}
+        for row in self.report(flagged_only=True):
+            for flag in row["plan"]["flags"]:
+                values[(row["collection"], row["command"], row["shape"], flag)] = 1
+        return values
+
+
+query_shapes = QueryShapes()
+
+registry.register(Gauge(
+    "mongo_query_plan_flagged",
+    "Query shapes whose sampled plan has a COLLSCAN, in-memory sort or high examined/returned ratio",
+    ("collection", "command", "shape", "flag"),
+    function=query_shapes.flagged
+))
+registry.register(Gauge(
+    "mongo_query_shapes",
+    "Distinct query shapes seen since start",
+    function=lambda: {(): len(query_shapes.shapes)}
+))
@@ -0,0 +1,154 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Supported plan intervals, in days
+PLAN_INTERVALS = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 30,
+}
+
+EXECUTION_CHUNK_SIZE = 1000
+
+
+def next_run_after(next_run_at: datetime, interval: str, now: datetime) -> datetime:
+    """Advance a plan past `now`; runs missed while down are skipped, not replayed."""
+    step = timedelta(days=PLAN_INTERVALS[interval])
+    missed = max(0, (now - next_run_at) // step)
+    return next_run_at + step * (missed + 1)
+
+
+def _plan_writes(plan: dict, price_24k: float, now: datetime, run_id: str):
+    amount = plan["amount"]
+    grams = round(amount / price_24k, 4)
+    next_run_at = plan["next_run_at"]
+    if next_run_at.tzinfo is None:
+        next_run_at = next_run_at.replace(tzinfo=timezone.utc)
+    # Deterministic per run: with the unique order_id index a run executed
+    # twice can't create a second order
+    run_key = next_run_at.strftime("%Y%m%d%H%M%S")
+    order = {
+        "order_id": f"order_{plan['plan_id']}_{run_key}",
+        "user_id": plan["user_id"],
+        "plan_id": plan["plan_id"],
+        "items": [{
+            "item_id": "gold_24k",
+            "item_type": "gold_bar",
+            "name": "24K Gold (recurring)",
+            "quantity": grams,
+            "price_per_unit": price_24k,
+            "total": amount
+        }],
+        "total_amount": amount,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now,
+        "tracking_info": None
+    }
+    portfolio_update = UpdateOne(
+        {"user_id": plan["user_id"]},
+        {
+            "$inc": {"gold_holdings": grams, "total_invested": amount},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"current_value": 0.0}
+        },
+        upsert=True
+    )
+    plan_update = UpdateOne(
+        # Still active: a plan cancelled since it was read doesn't buy
+        {"plan_id": plan["plan_id"], "status": "active", "next_run_at": plan["next_run_at"]},
+        {
+            "$set": {
+                "next_run_at": next_run_after(next_run_at, plan["interval"], now),
+                "last_run_at": now,
+                "last_run_id": run_id
+            },
+            "$inc": {"runs": 1}
+        }
+    )
+    return InsertOne(order), portfolio_update, plan_update
+
+
+async def _execute_chunk(plans: List[dict], price_24k, now, orders, portfolio, recurring_plans, run_id: str) -> int:
+    writes = {plan["plan_id"]: _plan_writes(plan, price_24k, now, run_id) for plan in plans}
+
+    # Advance the plans first: if a later write fails, that run is skipped
+    # instead of being bought a second time at the next tick
+    await recurring_plans.bulk_write([plan_op for _, _, plan_op in writes.values()], ordered=False)
+    # Only plans whose compare-and-set on next_run_at matched are ours to
+    # execute; another run (a worker that outlived its lease) may have
+    # advanced the others already
+    claimed = recurring_plans.find(
+        {"plan_id": {"$in": list(writes)}, "last_run_id": run_id},
+        {"_id": 0, "plan_id": 1}
+    )
+    claimed = [writes[plan["plan_id"]] async for plan in claimed]
+    if not claimed:
+        return 0
+
+    try:
+        await orders.bulk_write([order_op for order_op, _, _ in claimed], ordered=False)
+    except BulkWriteError as e:
+        # Duplicate order ids come from a retried run, whose holdings were
+        # credited then; anything else is real
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        duplicates = {error["index"] for error in e.details["writeErrors"]}
+        claimed = [ops for index, ops in enumerate(claimed) if index not in duplicates]
+    if claimed:
+        await portfolio.bulk_write([portfolio_op for _, portfolio_op, _ in claimed], ordered=False)
+    return len(claimed)
+
+
+async def execute_due_plans(
+    recurring_plans,
+    orders,
+    portfolio,
+    price_24k: float,
+    now: datetime,
+    chunk_size: int = EXECUTION_CHUNK_SIZE
+) -> int:
+    """
+    Execute every active plan due at `now` against one price snapshot.
+    Due plans are read through the (status, next_run_at) index and written
+    back with chunked unordered bulk_writes: one round trip per collection
+    per chunk, plus a read of the plans this run claimed, instead of one
+    create_order per plan. Safe to run concurrently with itself: a plan
+    run is executed by whichever run advances its next_run_at.
+    Returns the number of plans executed.
+    """
+    run_id = uuid.uuid4().hex
+    executed = 0
+    chunk = []
+    cursor = recurring_plans.find(
+        {"status": "active", "next_run_at": {"$lte": now}},
+        {"_id": 0, "plan_id": 1, "user_id": 1, "amount": 1, "interval": 1, "next_run_at": 1}
+    ).batch_size(chunk_size)
+
+    async for plan in cursor:
+        chunk.append(plan)
+        if len(chunk) >= chunk_size:
+            executed += await _execute_chunk(chunk, price_24k, now, orders, portfolio, recurring_plans, run_id)
+            chunk = []
+
+    if chunk:
+        executed += await _execute_chunk(chunk, price_24k, now, orders, portfolio, recurring_plans, run_id)
+    return executed
+
+
+def new_plan(user_id: str, amount: float, interval: str, start_at: datetime) -> dict:
+    return {
+        "plan_id": f"plan_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "amount": amount,
+        "interval": interval,
+        "status": "active",
+        "next_run_at": start_at,
+        "last_run_at": None,
+        "runs": 0,
+        "created_at": start_at
+    }
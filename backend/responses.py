@@ -0,0 +1,53 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from tracing import span
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, pydantic-core is always there
+    orjson = None
+
+
+def _default(obj: Any):
+    # Types orjson can't encode natively (models, ObjectIds, Decimals...)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return str(obj)
+
+
+def encode(content: Any) -> bytes:
+    """Encode raw Mongo documents / lists of them straight to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return to_json(content, fallback=_default)
+
+
+def dumps(content: Any) -> bytes:
+    """encode() timed as the request's serialize span; per-row callers use encode()."""
+    with span("serialize"):
+        return encode(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse that skips FastAPI's jsonable_encoder. Return it directly
+    from handlers serving Mongo documents read with an `{"_id": 0}`
+    projection; returning plain data would still go through the encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(adapter: TypeAdapter, data: Any) -> Response:
+    """
+    Validate `data` against a precompiled TypeAdapter and serialize it in
+    pydantic-core, pinning the payload to the model's fields.
+    """
+    with span("serialize"):
+        content = adapter.dump_json(adapter.validate_python(data))
+    return Response(content=content, media_type="application/json")
@@ -1,27 +1,205 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import httpx
+import asyncio
 import os
+import threading
 import uuid
 
+from admission import AdmissionMiddleware
+from alerts import ALERT_DIRECTIONS, ALERT_KARATS, AlertIndex, AlertNotifier
+from broadcast import BroadcastHub
+from cache import Cache, create_cache_backend
+from capture import CaptureMiddleware
+from deadlines import DeadlineMiddleware, is_timeout
+from geo import GeoGridIndex, geo_point
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, MongoCommandListener, monitor_event_loop_lag, record_cache, registry, upstream_client
+from inventory import OutOfStockError, release_allocations, reserve_items, set_item_stock
+from login import login, new_portfolio_fields
+from negotiation import NegotiationMiddleware
+from pricing import DEFAULT_FX_RATES_URL, FxTable, build_matrix, filter_matrix
+from projections import apply_projection, build_projection
+from query_plans import query_shapes
+from recurring import PLAN_INTERVALS, execute_due_plans, new_plan
+from responses import FastJSONResponse, dumps, model_response
+from store_aggregates import apply_product_inserts, rebuild_store_aggregates
+from sync import SYNC_OVERLAP, TOMBSTONE_RETENTION, backfill_updated_at, changes_since, from_version, to_version, tombstone
+from tracing import TracingMiddleware, sample_stacks, slow_traces, traced
+from vouchers import MAX_VOUCHER_AMOUNT, issue_vouchers, new_voucher, redeem_voucher, valid_amount
+
 load_dotenv()
 
 # Load environment variables
 GOLDAPI_KEY = os.getenv("GOLDAPI_KEY", "goldapi-demo-key")
+# Upstreams, overridable to point at local stubs (benchmarks/load_test.py)
+GOLD_PRICE_URL = os.getenv("GOLD_PRICE_URL", "https://freegoldapi.com/data/latest.json")
+AUTH_SESSION_URL = os.getenv(
+    "AUTH_SESSION_URL",
+    "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+)
+FX_RATES_URL = os.getenv("FX_RATES_URL", DEFAULT_FX_RATES_URL)
+ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in os.getenv("ADMIN_EMAILS", "").split(",")
+    if email.strip()
+}
+
+# Price, session and catalog caches share one backend: "local" (per
+# worker), "shm" (all workers on the host, CACHE_URL = directory) or
+# "redis" (CACHE_URL = redis://host:port/db). With a shared backend one
+# worker refreshes a key and the others read its result.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+cache_backend = create_cache_backend(CACHE_BACKEND, os.getenv("CACHE_URL"))
 
 # Cache for gold prices (QAR endpoint)
-gold_qar_cache = {
+GOLD_QAR_TTL = 60
+# How long the last good answer is kept to serve when a refresh fails
+GOLD_QAR_STALE_TTL = 86400
+gold_qar_cache = Cache(cache_backend, "gold_qar")
+# Latest stored price, reused while under a minute old
+GOLD_PRICE_MAX_AGE = 60
+gold_price_cache = Cache(cache_backend, "gold_price")
+
+# Session token -> session and user documents. Only on a shared backend:
+# a logout has to revoke the token on every worker at once, and a
+# per-worker cache would keep accepting it until the entry expired
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "30")) if CACHE_BACKEND != "local" else 0
+session_cache = Cache(cache_backend, "session")
+
+# Per-section cache for the home bundle (TTL in seconds)
+HOME_SECTION_TTL = {
+    "stores": 300,
+    "featured_products": 120
+}
+home_cache = {
+    section: Cache(cache_backend, f"home_{section}")
+    for section in HOME_SECTION_TTL
+}
+FEATURED_PRODUCTS_LIMIT = 10
+
+# Live price stream: one upstream poller fanned out to all subscribers
+PRICE_POLL_INTERVAL = float(os.getenv("PRICE_POLL_INTERVAL", "30"))
+PRICE_STREAM_QUEUE_SIZE = int(os.getenv("PRICE_STREAM_QUEUE_SIZE", "16"))
+PRICE_STREAM_KEEPALIVE = 15
+price_hub = BroadcastHub(queue_size=PRICE_STREAM_QUEUE_SIZE)
+
+# Currency x unit x karat prices, rebuilt on every tick from the cached FX
+# table; the rates themselves are fetched once per TTL across workers
+fx_table = FxTable(FX_RATES_URL, cache=Cache(cache_backend, "fx_rates"))
+price_matrix_cache = {
     "data": None,
     "timestamp": None
 }
 
-app = FastAPI()
+# Startup: a pod only reports ready once Mongo answers, indexes exist and
+# the price snapshot and catalog caches are warm
+MONGO_STARTUP_TIMEOUT = float(os.getenv("MONGO_STARTUP_TIMEOUT", "30"))
+MONGO_WARM_CONNECTIONS = int(os.getenv("MONGO_WARM_CONNECTIONS", "10"))
+READY_PING_TIMEOUT = 2.0
+readiness = {"ready": False, "since": None, "error": None}
+startup_task = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts serving once prepare() is done, or after MONGO_STARTUP_TIMEOUT
+    with prepare() still retrying in the background (/api/ready stays 503
+    until it finishes). Shutdown stops the background work in reverse.
+    """
+    global startup_task
+    await start_event_loop_monitor()
+    startup_task = asyncio.create_task(prepare())
+    try:
+        await asyncio.wait_for(asyncio.shield(startup_task), MONGO_STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Startup not finished after {MONGO_STARTUP_TIMEOUT}s, serving while it continues")
+    
+    yield
+    
+    readiness["ready"] = False
+    readiness["since"] = None
+    startup_task.cancel()
+    await stop_query_plan_sampler()
+    await stop_price_poller()
+    await stop_store_aggregates()
+    await stop_reservation_sweeper()
+    await stop_alert_notifier()
+    await stop_event_loop_monitor()
+    await close_cache_backend()
+    client.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Admission control: per client IP token buckets (off unless RATE_LIMIT_RPS
+# is set) and per route class concurrency limits; requests that can't start
+# within MAX_QUEUE_MS are shed. Innermost, so rejections get CORS headers.
+# Behind an ingress every request comes from its address: list it in
+# TRUSTED_PROXIES so clients are told apart by X-Forwarded-For.
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+CONCURRENCY_LIMITS = {
+    "read": int(os.getenv("MAX_CONCURRENT_READS", "200")),
+    "write": int(os.getenv("MAX_CONCURRENT_WRITES", "50")),
+    "upstream": int(os.getenv("MAX_CONCURRENT_UPSTREAM", "20"))
+}
+MAX_QUEUE_MS = float(os.getenv("MAX_QUEUE_MS", "250"))
+TRUSTED_PROXIES = {
+    address.strip()
+    for address in os.getenv("TRUSTED_PROXIES", "").split(",")
+    if address.strip()
+}
+app.add_middleware(
+    AdmissionMiddleware,
+    rate=RATE_LIMIT_RPS,
+    burst=RATE_LIMIT_BURST,
+    limits=CONCURRENCY_LIMITS,
+    max_queue_ms=MAX_QUEUE_MS,
+    # Routes that may wait on a third-party API
+    upstream_paths=("/api/auth/session", "/api/gold/qar", "/api/gold/prices/current"),
+    # Scrapes, probes, long-lived streams and the profiler must not hold or
+    # need a slot: a shed readiness probe would pull a busy worker out of rotation
+    exempt_paths=("/api/metrics", "/api/health", "/api/ready", "/api/gold/stream", "/api/admin/profile"),
+    trusted_proxies=TRUSTED_PROXIES
+)
+
+# Time budget per request, counted from arrival (queueing included): Mongo
+# operations get what is left as maxTimeMS, upstream calls as their
+# timeouts. Clients may ask for another with X-Request-Budget-Ms.
+REQUEST_BUDGET_MS = float(os.getenv("REQUEST_BUDGET_MS", "5000"))
+ROUTE_BUDGETS_MS = {
+    # Price reads degrade to the last snapshot rather than wait
+    "/api/gold/": 2000,
+    "/api/home": 2000,
+    "/api/auth/session": 10000,
+    "/api/admin/": 30000,
+    # Streams and bulk transfers take as long as they need
+    "/api/gold/stream": None,
+    "/api/gold/prices/export": None,
+    "/api/orders/export": None,
+    "/api/admin/profile": None,
+    "/api/admin/stores/": None
+}
+app.add_middleware(DeadlineMiddleware, default_ms=REQUEST_BUDGET_MS, budgets_ms=ROUTE_BUDGETS_MS)
+
+async def io_error_handler(request: Request, exc: Exception):
+    # Mongo and upstream errors no handler caught; running out of budget
+    # is a 504, anything else a plain 500
+    if is_timeout(exc):
+        return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+    print(f"Unhandled {type(exc).__name__}: {str(exc)}")
+    return JSONResponse(status_code=500, content={"detail": "Internal server error"})
+
+for error_type in (PyMongoError, httpx.HTTPError, TimeoutError):
+    app.add_exception_handler(error_type, io_error_handler)
 
 # CORS middleware
 app.add_middleware(
@@ -32,10 +210,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# MessagePack / brotli / gzip for JSON responses, negotiated per request
+app.add_middleware(NegotiationMiddleware, minimum_size=1024)
+
+# Per-request spans, slow requests logged with their breakdown
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+app.add_middleware(
+    TracingMiddleware,
+    slow_ms=SLOW_REQUEST_MS,
+    # Streams and exports are long by design, not slow
+    exclude_paths=("/api/gold/stream",),
+    exclude_suffixes=("/export",)
+)
+
+# Outermost, so request timings include compression
+app.add_middleware(MetricsMiddleware)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Opt-in traffic capture for benchmarks/replay.py: one sanitized NDJSON
+# line per request, rotated by size. Set CAPTURE_SALT so identity hashes
+# agree across workers and restarts.
+CAPTURE_FILE = os.getenv("CAPTURE_FILE")
+if CAPTURE_FILE:
+    app.add_middleware(
+        CaptureMiddleware,
+        path=CAPTURE_FILE,
+        salt=os.getenv("CAPTURE_SALT") or uuid.uuid4().hex,
+        max_bytes=int(os.getenv("CAPTURE_MAX_MB", "100")) * 1024 * 1024,
+        backups=int(os.getenv("CAPTURE_BACKUPS", "5")),
+        sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "1")),
+        # Probes and streams aren't traffic worth replaying
+        exclude_paths=("/api/metrics", "/api/health", "/api/ready", "/api/gold/stream", "/api/admin/profile")
+    )
+
 # MongoDB connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "gold_vault_db")
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(MONGO_URL, event_listeners=[MongoCommandListener(), query_shapes])
 db = client[DB_NAME]
 
 # Collections
@@ -47,6 +258,13 @@ portfolio_collection = db.portfolio
 vouchers_collection = db.vouchers
 jewelry_collection = db.jewelry
 stores_collection = db.stores  # New collection
+alerts_collection = db.price_alerts
+recurring_plans_collection = db.recurring_plans
+scheduler_locks_collection = db.scheduler_locks
+stock_shards_collection = db.stock_shards
+reservations_collection = db.reservations
+sync_tombstones_collection = db.sync_tombstones
+migrations_collection = db.migrations
 
 # Pydantic Models
 class User(BaseModel):
@@ -70,6 +288,7 @@ class GoldPrice(BaseModel):
     price_22k: float
     price_18k: float
     currency: str = "QAR"
+    source: Optional[str] = None
 
 class OrderItem(BaseModel):
     item_id: str
@@ -86,7 +305,9 @@ class Order(BaseModel):
     total_amount: float
     status: str = "pending"  # pending, processing, shipped, delivered
     created_at: datetime
+    updated_at: Optional[datetime] = None
     tracking_info: Optional[str] = None
+    plan_id: Optional[str] = None  # set on orders placed by a recurring plan
 
 class Portfolio(BaseModel):
     user_id: str
@@ -98,12 +319,17 @@ class Portfolio(BaseModel):
 class Voucher(BaseModel):
     voucher_id: str
     user_id: str
+    code: Optional[str] = None  # redemption code, unique
+    batch_id: Optional[str] = None  # set for bulk issued vouchers
     amount: float
-    recipient_name: str
-    recipient_phone: str
+    recipient_name: Optional[str] = None
+    recipient_phone: Optional[str] = None
     status: str = "pending"  # pending, sent, redeemed
     created_at: datetime
     redeemed_at: Optional[datetime] = None
+    redeemed_by: Optional[str] = None
+    redeemed_grams: Optional[float] = None
+    updated_at: Optional[datetime] = None
 
 class JewelryItem(BaseModel):
     item_id: str
@@ -119,6 +345,41 @@ class JewelryItem(BaseModel):
     category: str  # necklace, ring, bracelet, earrings
     image_url: Optional[str] = None  # Changed from base64 to URL
     in_stock: bool = True
+    stock: Optional[int] = None  # None: not tracked, 0 when counted in stock_shards
+    rating: Optional[float] = None
+
+class PriceAlert(BaseModel):
+    alert_id: str
+    user_id: str
+    karat: int  # 24, 22 or 18
+    direction: str  # above, below
+    threshold: float  # QAR per gram
+    status: str = "active"  # active, triggered
+    created_at: datetime
+    triggered_at: Optional[datetime] = None
+    triggered_price: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
+class RecurringPlan(BaseModel):
+    plan_id: str
+    user_id: str
+    amount: float  # QAR per run
+    interval: str  # daily, weekly, monthly
+    status: str = "active"
+    next_run_at: datetime
+    last_run_at: Optional[datetime] = None
+    runs: int = 0
+    created_at: datetime
+
+class Reservation(BaseModel):
+    reservation_id: str
+    user_id: str
+    items: List[dict]  # {"item_id", "quantity"}
+    allocations: List[dict]  # stock taken, per item and shard
+    status: str = "held"  # held, committed, released, expired
+    expires_at: datetime
+    created_at: datetime
+    order_id: Optional[str] = None
 
 class Store(BaseModel):
     store_id: str
@@ -127,13 +388,24 @@ class Store(BaseModel):
     description: str
     description_ar: str
     logo_url: Optional[str] = None
-    rating: float = 4.5
+    rating: float = 4.5  # average product rating once products are rated
     total_products: int = 0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    categories: List[str] = []
     location: Optional[str] = None
+    geo: Optional[dict] = None  # GeoJSON point, 2dsphere indexed
     phone: Optional[str] = None
     is_verified: bool = True
 
+# Precompiled serializers for the list endpoints
+GOLD_PRICES_ADAPTER = TypeAdapter(List[GoldPrice])
+ORDERS_ADAPTER = TypeAdapter(List[Order])
+JEWELRY_ADAPTER = TypeAdapter(List[JewelryItem])
+STORES_ADAPTER = TypeAdapter(List[Store])
+
 # Auth Helper Functions
+@traced("auth")
 async def get_current_user(request: Request) -> Optional[User]:
     # Get session token from cookie or Authorization header
     session_token = request.cookies.get("session_token")
@@ -146,22 +418,37 @@ async def get_current_user(request: Request) -> Optional[User]:
     if not session_token:
         return None
     
-    # Find session in database
-    session = await sessions_collection.find_one(
-        {"session_token": session_token},
-        {"_id": 0}
-    )
-    
-    if not session:
+    if SESSION_CACHE_TTL:
+        entry = await session_cache.get_or_refresh(
+            session_token,
+            SESSION_CACHE_TTL,
+            lambda: load_session(session_token)
+        )
+    else:
+        entry = await load_session(session_token)
+    if not entry:
         return None
     
     # Check if session is expired (normalize timezone)
-    expires_at = session["expires_at"]
+    expires_at = entry["session"]["expires_at"]
     if expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     
     if expires_at <= datetime.now(timezone.utc):
         await sessions_collection.delete_one({"session_token": session_token})
+        await session_cache.delete(session_token)
+        return None
+    
+    return User(**entry["user"])
+
+async def load_session(session_token: str) -> Optional[dict]:
+    # Find session in database
+    session = await sessions_collection.find_one(
+        {"session_token": session_token},
+        {"_id": 0}
+    )
+    
+    if not session:
         return None
     
     # Get user data
@@ -170,10 +457,10 @@ async def get_current_user(request: Request) -> Optional[User]:
         {"_id": 0}
     )
     
-    if user_doc:
-        return User(**user_doc)
+    if not user_doc:
+        return None
     
-    return None
+    return {"session": session, "user": user_doc}
 
 async def require_auth(request: Request) -> User:
     user = await get_current_user(request)
@@ -181,6 +468,42 @@ async def require_auth(request: Request) -> User:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
+async def require_admin(request: Request) -> User:
+    user = await require_auth(request)
+    if user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def ensure_user_indexes():
+    """
+    Without the unique email index concurrent first logins create duplicate
+    users, so failing to build it fails startup (/api/ready stays 503)
+    instead of being logged and skipped. Users already duplicated are
+    listed; they have to be merged by hand as orders and portfolios hang
+    off their user_id.
+    """
+    try:
+        # Unique email: concurrent first logins upsert one user
+        await ensure_unique_index(users_collection, "email")
+    except OperationFailure as e:
+        if e.code == 11000:
+            duplicates = await users_collection.aggregate([
+                {"$group": {"_id": "$email", "users": {"$sum": 1}}},
+                {"$match": {"users": {"$gt": 1}}},
+                {"$sort": {"users": -1}},
+                {"$limit": 10}
+            ]).to_list(10)
+            listed = ", ".join(f"{d['_id']} ({d['users']} users)" for d in duplicates)
+            print(f"User index error: duplicate emails block the unique email index: {listed}; merge them and restart")
+        raise
+    
+    try:
+        await users_collection.create_index("user_id", unique=True)
+        await sessions_collection.create_index("session_token")
+        await portfolio_collection.create_index("user_id", unique=True)
+    except Exception as e:
+        print(f"User index error: {str(e)}")
+
 # Auth Endpoints
 @app.post("/api/auth/session")
 async def exchange_session(request: Request, response: Response):
@@ -192,9 +515,9 @@ async def exchange_session(request: Request, response: Response):
             raise HTTPException(status_code=400, detail="session_id required")
         
         # Exchange session_id for user data from Emergent Auth
-        async with httpx.AsyncClient() as http_client:
+        async with upstream_client() as http_client:
             auth_response = await http_client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+                AUTH_SESSION_URL,
                 headers={"X-Session-ID": session_id}
             )
             
@@ -203,46 +526,19 @@ async def exchange_session(request: Request, response: Response):
             
             user_data = auth_response.json()
         
-        # Check if user exists
-        existing_user = await users_collection.find_one(
-            {"email": user_data["email"]},
-            {"_id": 0}
+        # Find or create the user and open the session in two round trips
+        user_doc, session = await login(
+            users_collection,
+            portfolio_collection,
+            sessions_collection,
+            user_data,
+            datetime.now(timezone.utc)
         )
-        
-        if not existing_user:
-            # Create new user
-            user_id = f"user_{uuid.uuid4().hex[:12]}"
-            new_user = {
-                "user_id": user_id,
-                "email": user_data["email"],
-                "name": user_data["name"],
-                "picture": user_data.get("picture"),
-                "gold_balance": 0.0,
-                "created_at": datetime.now(timezone.utc)
-            }
-            await users_collection.insert_one(new_user)
-            
-            # Create portfolio
-            await portfolio_collection.insert_one({
-                "user_id": user_id,
-                "gold_holdings": 0.0,
-                "total_invested": 0.0,
-                "current_value": 0.0,
-                "updated_at": datetime.now(timezone.utc)
-            })
-            
-            user = User(**new_user)
-        else:
-            user = User(**existing_user)
-        
-        # Create session
-        session_token = user_data["session_token"]
-        await sessions_collection.insert_one({
-            "user_id": user.user_id,
-            "session_token": session_token,
-            "expires_at": datetime.now(timezone.utc) + timedelta(days=7),
-            "created_at": datetime.now(timezone.utc)
-        })
+        user = User(**user_doc)
+        session_token = session["session_token"]
+        # The next request's auth check needn't go to Mongo
+        if SESSION_CACHE_TTL:
+            await session_cache.set(session_token, {"session": session, "user": user_doc}, SESSION_CACHE_TTL)
         
         # Set cookie
         response.set_cookie(
@@ -277,36 +573,69 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
         await sessions_collection.delete_one({"session_token": session_token})
+        await session_cache.delete(session_token)
     
     response.delete_cookie("session_token", path="/")
     return {"message": "Logged out successfully"}
 
 # Gold Price Endpoints
+def gold_price_age(price: dict) -> float:
+    timestamp = price["timestamp"]
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - timestamp).total_seconds()
+
+def is_live_price(price: dict) -> bool:
+    # Neither the fallback prices nor a stale snapshot served for lack of time
+    return price.get("source") != "fallback" and not price.get("stale")
+
+def degraded_gold_price() -> dict:
+    # Last real price this worker saw, marked stale, else typical prices
+    if last_gold_price is not None:
+        return {**last_gold_price, "stale": True}
+    
+    # Return mock data if API fails or any exception occurs (in QAR)
+    return {
+        "timestamp": datetime.now(timezone.utc),
+        "price_24k": 236.6,  # Fallback based on typical gold prices
+        "price_22k": 216.9,
+        "price_18k": 177.6,
+        "currency": "QAR",
+        "source": "fallback"
+    }
+
 @app.get("/api/gold/prices/current")
 async def get_current_gold_price():
+    # Shared across workers: one of them refreshes, degraded prices are
+    # never cached
+    try:
+        return await gold_price_cache.get_or_refresh(
+            "current",
+            lambda price: GOLD_PRICE_MAX_AGE - gold_price_age(price),
+            fetch_current_gold_price,
+            cacheable=is_live_price
+        )
+    except Exception as e:
+        # Out of budget waiting on another worker's refresh
+        print(f"Gold price cache error: {str(e)}")
+        return degraded_gold_price()
+
+async def fetch_current_gold_price():
     try:
-        # Try to get from cache (last 1 minute)
+        # Try to get from the database (last 1 minute)
         cached_price = await gold_prices_collection.find_one(
             {},
             {"_id": 0},
             sort=[("timestamp", -1)]
         )
         
-        if cached_price:
-            timestamp = cached_price["timestamp"]
-            if timestamp.tzinfo is None:
-                timestamp = timestamp.replace(tzinfo=timezone.utc)
-            
-            # If less than 1 minute old, return cached
-            if datetime.now(timezone.utc) - timestamp < timedelta(minutes=1):
-                return cached_price
+        # If less than 1 minute old, return cached
+        if cached_price and gold_price_age(cached_price) < GOLD_PRICE_MAX_AGE:
+            return cached_price
         
         # Fetch from FreeGoldAPI (completely free, no API key needed)
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(
-                "https://freegoldapi.com/data/latest.json",
-                timeout=10.0
-            )
+        async with upstream_client() as http_client:
+            response = await http_client.get(GOLD_PRICE_URL)
             
             if response.status_code == 200:
                 data = response.json()
@@ -319,8 +648,8 @@ async def get_current_gold_price():
                 
                 price_per_gram_usd = price_per_oz_usd / 31.1035  # Convert to grams
                 
-                # Convert to QAR (1 USD = 3.64 QAR)
-                USD_TO_QAR = 3.64
+                # Convert to QAR at the cached FX rate (refreshed by the price poller)
+                USD_TO_QAR = fx_table.rate("QAR")
                 price_per_gram_qar = price_per_gram_usd * USD_TO_QAR
                 
                 # Calculate prices for different karats
@@ -338,22 +667,16 @@ async def get_current_gold_price():
                 }
                 
                 await gold_prices_collection.insert_one(new_price)
-                return {k: v for k, v in new_price.items() if k != "_id"}
+                new_price = {k: v for k, v in new_price.items() if k != "_id"}
+                publish_price_tick(new_price)
+                return new_price
             else:
                 raise Exception(f"API returned status {response.status_code}")
     
     except Exception as e:
         print(f"Gold price fetch error: {str(e)}")
     
-    # Return mock data if API fails or any exception occurs (in QAR)
-    return {
-        "timestamp": datetime.now(timezone.utc),
-        "price_24k": 236.6,  # Fallback based on typical gold prices
-        "price_22k": 216.9,
-        "price_18k": 177.6,
-        "currency": "QAR",
-        "source": "fallback"
-    }
+    return degraded_gold_price()
 
 @app.get("/api/gold/qar")
 async def get_live_gold_price_qar():
@@ -362,91 +685,83 @@ async def get_live_gold_price_qar():
     Uses free APIs without authentication:
     - FreeGoldAPI.com for gold prices (XAU/USD)
     - open.er-api.com for USD to QAR conversion
-    Implements 60-second caching to reduce API calls.
+    Implements 60-second caching (shared by all workers) to reduce API calls.
     """
     try:
-        # Check cache (60 seconds)
-        if gold_qar_cache["data"] and gold_qar_cache["timestamp"]:
-            cache_age = (datetime.now(timezone.utc) - gold_qar_cache["timestamp"]).total_seconds()
-            if cache_age < 60:
-                return gold_qar_cache["data"]
-        
-        async with httpx.AsyncClient() as http_client:
-            # Get gold price in USD from FreeGoldAPI
-            gold_response = await http_client.get(
-                "https://freegoldapi.com/data/latest.json",
-                timeout=10.0
-            )
-            
-            if gold_response.status_code != 200:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"FreeGoldAPI returned status {gold_response.status_code}"
-                )
-            
-            gold_data = gold_response.json()
-            
-            # Get the latest gold price
-            if not gold_data or len(gold_data) == 0:
-                raise HTTPException(
-                    status_code=502,
-                    detail="No gold price data received from FreeGoldAPI"
-                )
-            
-            latest_gold = gold_data[-1]  # Most recent entry
-            ounce_usd = float(latest_gold.get("price", 0))
-            
-            if ounce_usd == 0:
-                raise HTTPException(
-                    status_code=502,
-                    detail="Invalid gold price received from FreeGoldAPI"
-                )
-            
-            # Get USD to QAR exchange rate from Open Exchange Rates API (free, no key needed)
-            exchange_response = await http_client.get(
-                "https://open.er-api.com/v6/latest/USD",
-                timeout=10.0
-            )
-            
-            if exchange_response.status_code != 200:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Exchange Rate API returned status {exchange_response.status_code}"
-                )
-            
-            exchange_data = exchange_response.json()
-            usd_to_qar = float(exchange_data.get("rates", {}).get("QAR", 3.64))
-            
-            # Calculate prices
-            ounce_qar = ounce_usd * usd_to_qar
-            gram_qar = ounce_qar / 31.1034768
-            
-            # Prepare response
-            response_data = {
-                "source": "FreeGoldAPI + OpenExchangeRates",
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "ounceUSD": round(ounce_usd, 2),
-                "usdToQar": round(usd_to_qar, 4),
-                "ounceQAR": round(ounce_qar, 2),
-                "gramQAR": round(gram_qar, 2),
-                "goldDate": latest_gold.get("date", "N/A")
-            }
-            
-            # Update cache
-            gold_qar_cache["data"] = response_data
-            gold_qar_cache["timestamp"] = datetime.now(timezone.utc)
-            
-            return response_data
-    
-    except HTTPException:
-        raise
+        return await gold_qar_cache.get_or_refresh("latest", GOLD_QAR_TTL, fetch_gold_price_qar)
     except Exception as e:
+        # Upstream down or out of budget: the last good answer, marked stale
+        stale = await gold_qar_cache.get("last_good")
+        if stale is not None:
+            print(f"Serving stale gold price in QAR: {str(e)}")
+            return {**stale, "stale": True}
+        if isinstance(e, HTTPException):
+            raise
         print(f"Error fetching live gold price in QAR: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch live gold prices: {str(e)}"
         )
 
+async def fetch_gold_price_qar():
+    async with upstream_client() as http_client:
+        # Get gold price in USD from FreeGoldAPI
+        gold_response = await http_client.get(GOLD_PRICE_URL)
+        
+        if gold_response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"FreeGoldAPI returned status {gold_response.status_code}"
+            )
+        
+        gold_data = gold_response.json()
+        
+        # Get the latest gold price
+        if not gold_data or len(gold_data) == 0:
+            raise HTTPException(
+                status_code=502,
+                detail="No gold price data received from FreeGoldAPI"
+            )
+        
+        latest_gold = gold_data[-1]  # Most recent entry
+        ounce_usd = float(latest_gold.get("price", 0))
+        
+        if ounce_usd == 0:
+            raise HTTPException(
+                status_code=502,
+                detail="Invalid gold price received from FreeGoldAPI"
+            )
+        
+        # Get USD to QAR exchange rate from Open Exchange Rates API (free, no key needed)
+        exchange_response = await http_client.get(FX_RATES_URL)
+        
+        if exchange_response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Exchange Rate API returned status {exchange_response.status_code}"
+            )
+        
+        exchange_data = exchange_response.json()
+        usd_to_qar = float(exchange_data.get("rates", {}).get("QAR", 3.64))
+        
+        # Calculate prices
+        ounce_qar = ounce_usd * usd_to_qar
+        gram_qar = ounce_qar / 31.1034768
+        
+        # Prepare response
+        response_data = {
+            "source": "FreeGoldAPI + OpenExchangeRates",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "ounceUSD": round(ounce_usd, 2),
+            "usdToQar": round(usd_to_qar, 4),
+            "ounceQAR": round(ounce_qar, 2),
+            "gramQAR": round(gram_qar, 2),
+            "goldDate": latest_gold.get("date", "N/A")
+        }
+        
+        await gold_qar_cache.set("last_good", response_data, GOLD_QAR_STALE_TTL)
+        return response_data
+
 
 @app.get("/api/gold/prices/historical")
 async def get_historical_prices(days: int = 7):
@@ -456,28 +771,94 @@ async def get_historical_prices(days: int = 7):
             {"timestamp": {"$gte": start_date}},
             {"_id": 0}
         ).sort("timestamp", 1).to_list(1000)
-        
-        return prices
     except Exception as e:
         print(f"Historical prices error: {str(e)}")
         return []
+    
+    # Outside the try: a document the model rejects is a server error,
+    # not an empty history
+    return model_response(GOLD_PRICES_ADAPTER, prices)
+
+@app.get("/api/gold/prices/matrix")
+async def get_price_matrix(currency: Optional[str] = None, unit: Optional[str] = None, karat: Optional[str] = None):
+    """
+    Latest price for every currency, unit (gram, ounce, tola) and karat
+    (24/22/21/18/14), served from memory. `currency`, `unit` and `karat`
+    take comma-separated lists, e.g. ?currency=SAR,AED&unit=gram&karat=21.
+    503 until a live price has been seen: the matrix is never built from
+    the fallback prices.
+    """
+    record_cache("price_matrix", price_matrix_cache["data"] is not None)
+    if price_matrix_cache["data"] is None:
+        # No tick since startup yet
+        price = await get_current_gold_price()
+        if not is_live_price(price):
+            raise HTTPException(status_code=503, detail="Live gold price unavailable, try again shortly")
+        update_price_matrix(price)
+    
+    try:
+        matrix = filter_matrix(price_matrix_cache["data"], currency, unit, karat)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return FastJSONResponse(matrix)
+
+PRICE_EXPORT_COLUMNS = ["timestamp", "price_24k", "price_22k", "price_18k", "currency", "source"]
+
+@app.get("/api/gold/prices/export")
+async def export_gold_prices(format: str = "ndjson", start: Optional[str] = None, end: Optional[str] = None):
+    """Full price history as NDJSON or CSV, optionally limited to [start, end)."""
+    # Rarely used; imported on first use to keep worker start-up lean
+    from exports import export_response, parse_date_range
+    
+    cursor = gold_prices_collection.find(
+        parse_date_range(start, end, "timestamp"),
+        {"_id": 0}
+    ).sort("timestamp", 1)
+    
+    return export_response(cursor, format, "gold-prices", PRICE_EXPORT_COLUMNS)
 
 # Order Endpoints
 @app.post("/api/orders")
 async def create_order(order_data: dict, request: Request):
     user = await require_auth(request)
     
+    allocations = []
+    reservation = None
     try:
         order_id = f"order_{uuid.uuid4().hex[:12]}"
         items = [OrderItem(**item) for item in order_data.get("items", [])]
         
+        # Jewelry stock comes from the cart's reservation, or is taken now
+        reservation_id = order_data.get("reservation_id")
+        if reservation_id:
+            reservation = await commit_reservation(reservation_id, user.user_id, order_id)
+            # The reservation only covers what it holds: the order's
+            # jewelry must be exactly that
+            if item_quantities(reservation["items"]) != item_quantities(
+                item.model_dump() for item in items if item.item_type == "jewelry"
+            ):
+                raise HTTPException(status_code=409, detail="Order jewelry doesn't match the reservation")
+        else:
+            allocations = await reserve_items(
+                jewelry_collection,
+                stock_shards_collection,
+                [
+                    {"item_id": item.item_id, "quantity": item.quantity}
+                    for item in items
+                    if item.item_type == "jewelry"
+                ]
+            )
+        
+        now = datetime.now(timezone.utc)
         order = {
             "order_id": order_id,
             "user_id": user.user_id,
             "items": [item.model_dump() for item in items],
             "total_amount": order_data.get("total_amount", 0),
             "status": "pending",
-            "created_at": datetime.now(timezone.utc),
+            "created_at": now,
+            "updated_at": now,
             "tracking_info": None
         }
         
@@ -497,14 +878,28 @@ async def create_order(order_data: dict, request: Request):
                         "gold_holdings": total_gold_grams,
                         "total_invested": order_data.get("total_amount", 0)
                     },
-                    "$set": {"updated_at": datetime.now(timezone.utc)}
-                }
+                    "$set": {"updated_at": datetime.now(timezone.utc)},
+                    "$setOnInsert": {"current_value": 0.0}
+                },
+                upsert=True
             )
         
         return {k: v for k, v in order.items() if k != "_id"}
     
+    except HTTPException:
+        if reservation:
+            await reopen_reservation(reservation["reservation_id"], order_id)
+        raise
+    except OutOfStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Create order error: {str(e)}")
+        if allocations:
+            await release_allocations(jewelry_collection, stock_shards_collection, allocations)
+        if reservation:
+            await reopen_reservation(reservation["reservation_id"], order_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/orders")
@@ -516,11 +911,57 @@ async def get_user_orders(request: Request):
             {"user_id": user.user_id},
             {"_id": 0}
         ).sort("created_at", -1).to_list(100)
-        
-        return orders
     except Exception as e:
         print(f"Get orders error: {str(e)}")
         return []
+    
+    return model_response(ORDERS_ADAPTER, orders)
+
+ORDER_EXPORT_COLUMNS = [
+    "order_id", "user_id", "created_at", "status", "total_amount",
+    "item_id", "item_type", "name", "quantity", "price_per_unit", "total"
+]
+
+def order_export_rows(order: dict):
+    # One CSV row per order line, order fields repeated on each
+    header = {key: value for key, value in order.items() if key != "items"}
+    for item in order.get("items") or [{}]:
+        yield {**header, **item}
+
+@app.get("/api/orders/export")
+async def export_orders(
+    request: Request,
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """
+    Stream orders as NDJSON or CSV (one row per order line), oldest first,
+    optionally limited to [start, end). Admins export every user's orders,
+    or one user's with `user_id`; everyone else gets their own.
+    """
+    from exports import export_response, parse_date_range
+    
+    user = await require_auth(request)
+    
+    filter_query = parse_date_range(start, end, "created_at")
+    if user.email.lower() in ADMIN_EMAILS:
+        if user_id:
+            filter_query["user_id"] = user_id
+    else:
+        filter_query["user_id"] = user.user_id
+    
+    cursor = orders_collection.find(filter_query, {"_id": 0}).sort("created_at", 1)
+    return export_response(cursor, format, "orders", ORDER_EXPORT_COLUMNS, order_export_rows)
+
+async def ensure_export_indexes():
+    try:
+        await orders_collection.create_index([("user_id", 1), ("created_at", -1)])
+        await orders_collection.create_index("created_at")
+        await gold_prices_collection.create_index("timestamp")
+    except Exception as e:
+        print(f"Export index error: {str(e)}")
 
 @app.get("/api/orders/{order_id}")
 async def get_order(order_id: str, request: Request):
@@ -537,46 +978,57 @@ async def get_order(order_id: str, request: Request):
     return order
 
 # Portfolio Endpoints
-@app.get("/api/portfolio")
-async def get_portfolio(request: Request):
-    user = await require_auth(request)
-    
+async def load_portfolio(user_id: str) -> dict:
     portfolio = await portfolio_collection.find_one(
-        {"user_id": user.user_id},
+        {"user_id": user_id},
         {"_id": 0}
     )
     
     if not portfolio:
-        # Create new portfolio if doesn't exist
-        portfolio = {
-            "user_id": user.user_id,
-            "gold_holdings": 0.0,
-            "total_invested": 0.0,
-            "current_value": 0.0,
-            "updated_at": datetime.now(timezone.utc)
-        }
-        await portfolio_collection.insert_one(portfolio)
+        # Create new portfolio if doesn't exist; an upsert, so concurrent
+        # first reads end up with the same one
+        portfolio = await portfolio_collection.find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": new_portfolio_fields(datetime.now(timezone.utc))},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
     
-    # Calculate current value based on latest gold price
-    current_price_data = await get_current_gold_price()
+    return portfolio
+
+async def value_portfolio(portfolio: dict, current_price_data: Optional[dict]) -> dict:
+    # Calculate current value based on the given gold price snapshot
     if current_price_data and "price_24k" in current_price_data:
         current_value = portfolio["gold_holdings"] * current_price_data["price_24k"]
     else:
         current_value = portfolio.get("current_value", 0.0)
     
-    # Update current value
-    await portfolio_collection.update_one(
-        {"user_id": user.user_id},
-        {"$set": {"current_value": current_value, "updated_at": datetime.now(timezone.utc)}}
-    )
+    # Store the new valuation, but leave updated_at alone: it moves with
+    # holdings and invested amounts, which is what /api/sync clients track
+    # (they value the portfolio at the current price themselves)
+    if current_value != portfolio.get("current_value"):
+        await portfolio_collection.update_one(
+            {"user_id": portfolio["user_id"]},
+            {"$set": {"current_value": current_value}}
+        )
     
     portfolio["current_value"] = current_value
     return {k: v for k, v in portfolio.items() if k != "_id"}
 
+@app.get("/api/portfolio")
+async def get_portfolio(request: Request):
+    user = await require_auth(request)
+    
+    portfolio = await load_portfolio(user.user_id)
+    current_price_data = await get_current_gold_price()
+    return await value_portfolio(portfolio, current_price_data)
+
 # Jewelry Endpoints
 @app.get("/api/jewelry")
-async def get_jewelry():
-    jewelry_items = await jewelry_collection.find({}, {"_id": 0}).to_list(100)
+async def get_jewelry(fields: Optional[str] = None, lang: Optional[str] = None):
+    projection = build_projection(JewelryItem, fields, lang)
+    jewelry_items = await jewelry_collection.find({}, projection or {"_id": 0}).to_list(100)
     
     # If empty, seed with sample data
     if not jewelry_items:
@@ -601,30 +1053,150 @@ async def get_jewelry():
             ], 1)
         ]
         await jewelry_collection.insert_many(sample_items)
-        jewelry_items = sample_items
+        jewelry_items = apply_projection(
+            [{k: v for k, v in item.items() if k != "_id"} for item in sample_items],
+            projection
+        )
     
-    return jewelry_items
+    return FastJSONResponse(jewelry_items)
 
 # Voucher Endpoints
+MAX_BULK_VOUCHERS = 10000
+
+async def ensure_voucher_indexes():
+    try:
+        # Sparse: vouchers issued before codes existed have none
+        await vouchers_collection.create_index("code", unique=True, sparse=True)
+        await vouchers_collection.create_index([("user_id", 1), ("created_at", -1)])
+    except Exception as e:
+        print(f"Voucher index error: {str(e)}")
+
 @app.post("/api/vouchers")
 async def create_voucher(voucher_data: dict, request: Request):
     user = await require_auth(request)
     
-    voucher_id = f"voucher_{uuid.uuid4().hex[:12]}"
-    voucher = {
-        "voucher_id": voucher_id,
-        "user_id": user.user_id,
-        "amount": voucher_data.get("amount", 0),
-        "recipient_name": voucher_data.get("recipient_name"),
-        "recipient_phone": voucher_data.get("recipient_phone"),
-        "status": "pending",
-        "created_at": datetime.now(timezone.utc),
-        "redeemed_at": None
-    }
+    if not valid_amount(voucher_data.get("amount")):
+        raise HTTPException(
+            status_code=400,
+            detail=f"amount must be a positive QAR value up to {MAX_VOUCHER_AMOUNT}"
+        )
+    
+    voucher = new_voucher(
+        user.user_id,
+        voucher_data["amount"],
+        voucher_data.get("recipient_name"),
+        voucher_data.get("recipient_phone"),
+        datetime.now(timezone.utc)
+    )
     
-    await vouchers_collection.insert_one(voucher)
+    await issue_vouchers(vouchers_collection, [voucher])
     return {k: v for k, v in voucher.items() if k != "_id"}
 
+@app.post("/api/vouchers/bulk")
+async def create_vouchers_bulk(bulk_data: dict, request: Request):
+    """
+    Corporate gifting: issue up to MAX_BULK_VOUCHERS vouchers in one call,
+    either one per entry of `recipients` or `count` anonymous vouchers of
+    `amount` QAR each. Returns the generated codes. Admins only: the
+    vouchers redeem for gold and the batch isn't paid for here.
+    """
+    user = await require_admin(request)
+    
+    default_amount = bulk_data.get("amount", 0)
+    recipients = bulk_data.get("recipients")
+    if recipients is None:
+        recipients = [{} for _ in range(int(bulk_data.get("count", 0)))]
+    
+    if not recipients:
+        raise HTTPException(status_code=400, detail="recipients or count required")
+    if len(recipients) > MAX_BULK_VOUCHERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_VOUCHERS} vouchers per call"
+        )
+    
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    now = datetime.now(timezone.utc)
+    vouchers = [
+        new_voucher(
+            user.user_id,
+            recipient.get("amount", default_amount),
+            recipient.get("recipient_name"),
+            recipient.get("recipient_phone"),
+            now,
+            batch_id=batch_id
+        )
+        for recipient in recipients
+    ]
+    if not all(valid_amount(voucher["amount"]) for voucher in vouchers):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Every voucher needs a positive amount up to {MAX_VOUCHER_AMOUNT} QAR"
+        )
+    
+    try:
+        await issue_vouchers(vouchers_collection, vouchers)
+    except Exception as e:
+        print(f"Bulk voucher error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return FastJSONResponse({
+        "batch_id": batch_id,
+        "issued": len(vouchers),
+        "vouchers": [
+            {
+                "voucher_id": voucher["voucher_id"],
+                "code": voucher["code"],
+                "amount": voucher["amount"],
+                "recipient_name": voucher["recipient_name"],
+                "recipient_phone": voucher["recipient_phone"]
+            }
+            for voucher in vouchers
+        ]
+    })
+
+@app.post("/api/vouchers/redeem")
+async def redeem_voucher_code(redeem_data: dict, request: Request):
+    """Redeem a voucher code into the caller's portfolio as 24k grams."""
+    user = await require_auth(request)
+    
+    code = (redeem_data.get("code") or "").strip().upper()
+    if not code:
+        raise HTTPException(status_code=400, detail="code required")
+    
+    # Grams are credited at this price for good: never at the fallback or
+    # a stale snapshot
+    current_price_data = await get_current_gold_price()
+    if not is_live_price(current_price_data):
+        raise HTTPException(status_code=503, detail="Live gold price unavailable, try again shortly")
+    price_24k = current_price_data["price_24k"]
+    
+    voucher = await redeem_voucher(
+        vouchers_collection,
+        code,
+        user.user_id,
+        price_24k,
+        datetime.now(timezone.utc)
+    )
+    
+    if not voucher:
+        exists = await vouchers_collection.find_one({"code": code}, {"_id": 0, "status": 1})
+        if not exists:
+            raise HTTPException(status_code=404, detail="Voucher not found")
+        raise HTTPException(status_code=409, detail="Voucher already redeemed")
+    
+    await portfolio_collection.update_one(
+        {"user_id": user.user_id},
+        {
+            "$inc": {"gold_holdings": voucher["redeemed_grams"]},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+            "$setOnInsert": {"total_invested": 0.0, "current_value": 0.0}
+        },
+        upsert=True
+    )
+    
+    return voucher
+
 @app.get("/api/vouchers")
 async def get_user_vouchers(request: Request):
     user = await require_auth(request)
@@ -634,16 +1206,82 @@ async def get_user_vouchers(request: Request):
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
-    return vouchers
+    return FastJSONResponse(vouchers)
 
 # Stores Endpoints
-@app.get("/api/stores")
-async def get_stores():
-    """Get all jewelry stores"""
-    stores = await stores_collection.find({}, {"_id": 0}).to_list(100)
+SEED_STORE_COORDINATES = {
+    "store_1": (25.2854, 51.5310),
+    "store_2": (25.3705, 51.5509),
+    "store_3": (25.3594, 51.5264),
+    "store_4": (25.2867, 51.5333),
+}
+MAX_NEARBY_RADIUS_M = 100000
+store_grid = {"snapshot": None, "index": None}
+# Every store, for the grid fallback (the home snapshot stops at 100)
+STORE_GRID_TTL = 300
+store_grid_cache = Cache(cache_backend, "store_grid")
+
+# Materialized product aggregates on store documents
+STORE_SORT_FIELDS = ("rating", "total_products", "min_price", "max_price")
+STORE_AGGREGATES_REBUILD_INTERVAL = int(os.getenv("STORE_AGGREGATES_REBUILD_INTERVAL", "3600"))
+store_aggregates_task = None
+
+async def ensure_store_geo_index():
+    try:
+        # Seed stores created before they carried coordinates
+        for store_id, (lat, lng) in SEED_STORE_COORDINATES.items():
+            await stores_collection.update_one(
+                {"store_id": store_id, "geo": {"$exists": False}},
+                {"$set": {"geo": geo_point(lat, lng)}}
+            )
+        await stores_collection.create_index([("geo", "2dsphere")])
+        await stores_collection.create_index("store_id")
+    except Exception as e:
+        print(f"Store geo index error: {str(e)}")
+
+async def rebuild_store_aggregates_periodically():
+    while True:
+        try:
+            rebuilt = await rebuild_store_aggregates(stores_collection, jewelry_collection)
+            print(f"Rebuilt product aggregates for {rebuilt} stores")
+        except Exception as e:
+            print(f"Store aggregates rebuild error: {str(e)}")
+        await asyncio.sleep(STORE_AGGREGATES_REBUILD_INTERVAL)
+
+async def start_store_aggregates():
+    global store_aggregates_task
+    try:
+        for field in STORE_SORT_FIELDS + ("categories",):
+            await stores_collection.create_index(field)
+        await jewelry_collection.create_index("store_id")
+    except Exception as e:
+        print(f"Store aggregates index error: {str(e)}")
+    store_aggregates_task = asyncio.create_task(rebuild_store_aggregates_periodically())
+
+async def stop_store_aggregates():
+    if store_aggregates_task:
+        store_aggregates_task.cancel()
+
+def store_projection(projection: Optional[dict]) -> dict:
+    # The running sums behind the aggregates stay server-side
+    if projection is None:
+        return {"_id": 0, "stats": 0}
+    if any(flag for name, flag in projection.items() if name != "_id"):
+        return projection
+    return {**projection, "stats": 0}
+
+async def load_stores(
+    projection: Optional[dict] = None,
+    filter_query: Optional[dict] = None,
+    sort: Optional[list] = None
+):
+    cursor = stores_collection.find(filter_query or {}, store_projection(projection))
+    if sort:
+        cursor = cursor.sort(sort)
+    stores = await cursor.to_list(100)
     
     # If empty, seed with sample data
-    if not stores:
+    if not stores and not filter_query:
         sample_stores = [
             {
                 "store_id": "store_1",
@@ -654,6 +1292,7 @@ async def get_stores():
                 "rating": 4.8,
                 "total_products": 45,
                 "location": "Doha, Qatar",
+                "geo": geo_point(*SEED_STORE_COORDINATES["store_1"]),
                 "phone": "+974 4444 5555",
                 "is_verified": True
             },
@@ -666,6 +1305,7 @@ async def get_stores():
                 "rating": 4.7,
                 "total_products": 38,
                 "location": "The Pearl, Doha",
+                "geo": geo_point(*SEED_STORE_COORDINATES["store_2"]),
                 "phone": "+974 4444 6666",
                 "is_verified": True
             },
@@ -678,6 +1318,7 @@ async def get_stores():
                 "rating": 4.9,
                 "total_products": 52,
                 "location": "Katara, Doha",
+                "geo": geo_point(*SEED_STORE_COORDINATES["store_3"]),
                 "phone": "+974 4444 7777",
                 "is_verified": True
             },
@@ -690,21 +1331,166 @@ async def get_stores():
                 "rating": 4.5,
                 "total_products": 68,
                 "location": "Souq Waqif, Doha",
+                "geo": geo_point(*SEED_STORE_COORDINATES["store_4"]),
                 "phone": "+974 4444 8888",
                 "is_verified": True
             }
         ]
         await stores_collection.insert_many(sample_stores)
-        stores = sample_stores
+        # insert_many adds ObjectIds to the dicts in place
+        stores = apply_projection(
+            [{k: v for k, v in store.items() if k != "_id"} for store in sample_stores],
+            projection
+        )
     
     return stores
 
+@app.get("/api/stores")
+async def get_stores(
+    fields: Optional[str] = None,
+    lang: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    """
+    Get all jewelry stores. Sorting and filtering use the product
+    aggregates materialized on each store document.
+    """
+    projection = build_projection(Store, fields, lang)
+    
+    if sort is not None and sort not in STORE_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of: {', '.join(STORE_SORT_FIELDS)}"
+        )
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    
+    filter_query = {}
+    if category:
+        filter_query["categories"] = category
+    if min_rating is not None:
+        filter_query["rating"] = {"$gte": min_rating}
+    if max_price is not None:
+        # Stores with at least one product at or under max_price
+        filter_query["min_price"] = {"$lte": max_price}
+    sort_spec = [(sort, -1 if order == "desc" else 1)] if sort else None
+    
+    stores = await load_stores(projection, filter_query, sort_spec)
+    if projection:
+        return FastJSONResponse(stores)
+    return model_response(STORES_ADAPTER, stores)
+
+@app.post("/api/admin/stores/aggregates/rebuild")
+async def rebuild_store_aggregates_now(request: Request):
+    await require_admin(request)
+    
+    rebuilt = await rebuild_store_aggregates(stores_collection, jewelry_collection)
+    return {"rebuilt": rebuilt}
+
+@app.post("/api/admin/stores/{store_id}/products/import")
+async def import_store_products(store_id: str, request: Request, format: Optional[str] = None):
+    """
+    Bulk-load a store's catalog from the raw request body, NDJSON (one
+    JewelryItem per line) or CSV with a header row. Rows are upserted on
+    item_id within the store (item_ids of other stores are rejected); the
+    response lists the rows that were rejected and why.
+    """
+    from product_import import IMPORT_FORMATS, import_products
+    
+    await require_admin(request)
+    
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    
+    store = await stores_collection.find_one({"store_id": store_id}, {"_id": 0})
+    if not store:
+        raise HTTPException(status_code=404, detail="Store not found")
+    
+    report = await import_products(
+        jewelry_collection,
+        request.stream(),
+        JewelryItem,
+        format,
+        scope={"store_id": store_id},
+        defaults={"store_name": store.get("name_ar") or store["name"]}
+    )
+    
+    if report.inserted or report.updated:
+        try:
+            await rebuild_store_aggregates(stores_collection, jewelry_collection, [store_id])
+        except Exception as e:
+            print(f"Store aggregates rebuild error: {str(e)}")
+    
+    return report.to_dict()
+
+async def load_all_stores() -> list:
+    return await stores_collection.find({}, store_projection(None)).to_list(None)
+
+async def nearby_stores_from_snapshot(lat: float, lng: float, radius: float, offset: int, limit: int):
+    # Fallback: grid index over a cached snapshot of all stores, rebuilt
+    # when the snapshot is refreshed
+    stores = await store_grid_cache.get_or_refresh("all", STORE_GRID_TTL, load_all_stores)
+    if store_grid["snapshot"] is not stores:
+        store_grid["index"] = GeoGridIndex(stores)
+        store_grid["snapshot"] = stores
+    
+    matches = store_grid["index"].nearby(lat, lng, radius, limit=offset + limit)
+    return [
+        {**store, "distance_m": round(distance, 1)}
+        for distance, store in matches[offset:]
+    ]
+
+@app.get("/api/stores/nearby")
+async def get_nearby_stores(
+    lat: float,
+    lng: float,
+    radius: float = 10000,
+    offset: int = 0,
+    limit: int = 20
+):
+    """Stores within `radius` meters of (lat, lng), nearest first."""
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise HTTPException(status_code=400, detail="lat/lng out of range")
+    if not 0 < radius <= MAX_NEARBY_RADIUS_M:
+        raise HTTPException(status_code=400, detail=f"radius must be between 0 and {MAX_NEARBY_RADIUS_M} meters")
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), 100)
+    
+    try:
+        stores = await stores_collection.aggregate([
+            {
+                "$geoNear": {
+                    "near": geo_point(lat, lng),
+                    "distanceField": "distance_m",
+                    "maxDistance": radius,
+                    "spherical": True
+                }
+            },
+            {"$skip": offset},
+            {"$limit": limit},
+            {"$project": store_projection(None)}
+        ]).to_list(limit)
+        for store in stores:
+            store["distance_m"] = round(store["distance_m"], 1)
+    except Exception as e:
+        print(f"Nearby stores geo query error: {str(e)}")
+        stores = await nearby_stores_from_snapshot(lat, lng, radius, offset, limit)
+    
+    return FastJSONResponse(stores)
+
 @app.get("/api/stores/{store_id}")
 async def get_store(store_id: str):
     """Get specific store details"""
     store = await stores_collection.find_one(
         {"store_id": store_id},
-        {"_id": 0}
+        store_projection(None)
     )
     
     if not store:
@@ -713,8 +1499,10 @@ async def get_store(store_id: str):
     return store
 
 @app.get("/api/stores/{store_id}/products")
-async def get_store_products(store_id: str):
+async def get_store_products(store_id: str, fields: Optional[str] = None, lang: Optional[str] = None):
     """Get all products from a specific store"""
+    projection = build_projection(JewelryItem, fields, lang)
+    
     # Check if store exists
     store = await stores_collection.find_one(
         {"store_id": store_id},
@@ -726,7 +1514,7 @@ async def get_store_products(store_id: str):
     # Get products
     products = await jewelry_collection.find(
         {"store_id": store_id},
-        {"_id": 0}
+        projection or {"_id": 0}
     ).to_list(100)
     
     # If empty, seed with sample products
@@ -768,20 +1556,885 @@ async def get_store_products(store_id: str):
                     "category": category,
                     "image_url": jewelry_images[category],
                     "in_stock": True,
+                    "stock": 10,
                     "rating": round(4.3 + (i * 0.2), 1)
                 }
                 sample_products.append(product)
         
         await jewelry_collection.insert_many(sample_products)
-        products = sample_products
+        try:
+            await apply_product_inserts(stores_collection, sample_products)
+        except Exception as e:
+            # The periodic rebuild corrects the aggregate
+            print(f"Store aggregates update error: {str(e)}")
+        products = apply_projection(
+            [{k: v for k, v in product.items() if k != "_id"} for product in sample_products],
+            projection
+        )
     
-    return products
+    if projection:
+        return FastJSONResponse(products)
+    return model_response(JEWELRY_ADAPTER, products)
+
+# Home Bundle Endpoint
+async def get_cached_section(section: str, loader):
+    return await home_cache[section].get_or_refresh("data", HOME_SECTION_TTL[section], loader)
+
+async def get_featured_products():
+    return await jewelry_collection.find(
+        {"in_stock": True},
+        {"_id": 0}
+    ).sort("rating", -1).to_list(FEATURED_PRODUCTS_LIMIT)
+
+@app.get("/api/home")
+async def get_home(request: Request, lang: Optional[str] = None):
+    """
+    Everything the home screen renders in one round trip.
+    Sections are gathered concurrently; a failing section is returned as
+    null instead of failing the whole bundle. The portfolio section is only
+    filled in for authenticated requests. `lang` trims the cached catalog
+    sections to one language.
+    """
+    stores_projection = build_projection(Store, lang=lang)
+    product_projection = build_projection(JewelryItem, lang=lang)
+    
+    async def load_user_portfolio():
+        user = await get_current_user(request)
+        if not user:
+            return None
+        return await load_portfolio(user.user_id)
+    
+    price, stores, featured_products, portfolio = await asyncio.gather(
+        get_current_gold_price(),
+        get_cached_section("stores", load_stores),
+        get_cached_section("featured_products", get_featured_products),
+        load_user_portfolio(),
+        return_exceptions=True
+    )
+    
+    sections = {
+        "price": price,
+        "stores": stores,
+        "featured_products": featured_products,
+        "portfolio": portfolio
+    }
+    for name, value in sections.items():
+        if isinstance(value, Exception):
+            print(f"Home bundle {name} error: {str(value)}")
+            sections[name] = None
+    
+    if sections["stores"] is not None:
+        sections["stores"] = apply_projection(sections["stores"], stores_projection)
+    if sections["featured_products"] is not None:
+        sections["featured_products"] = apply_projection(sections["featured_products"], product_projection)
+    
+    # Portfolio valuation needs the price snapshot gathered above
+    if sections["portfolio"] is not None:
+        try:
+            sections["portfolio"] = await value_portfolio(sections["portfolio"], sections["price"])
+        except Exception as e:
+            print(f"Home bundle portfolio error: {str(e)}")
+            sections["portfolio"] = None
+    
+    return FastJSONResponse(sections)
+
+# Live Price Stream
+price_poller_task = None
+last_published_prices = None
+# Last real (non-fallback) price and when it was seen, for degraded
+# responses and /api/ready
+last_gold_price = None
+last_price_tick_at = None
+
+def update_price_matrix(price: dict):
+    # Live prices only (see is_live_price): the matrix is cached until the
+    # next tick and carries no marker of its own
+    price_matrix_cache["data"] = build_matrix(
+        price["price_24k"],
+        fx_table.rates,
+        price["timestamp"],
+        fx_table.source
+    )
+    price_matrix_cache["timestamp"] = datetime.now(timezone.utc)
+
+def publish_price_tick(price: dict):
+    global last_published_prices, last_gold_price, last_price_tick_at
+    update_price_matrix(price)
+    last_gold_price = price
+    last_price_tick_at = datetime.now(timezone.utc)
+    prices = (price["price_24k"], price["price_22k"], price["price_18k"])
+    if prices == last_published_prices:
+        return
+    if last_published_prices is not None:
+        evaluate_price_alerts(last_published_prices, prices)
+    last_published_prices = prices
+    # Encoded once, shared by every subscriber
+    price_hub.publish(dumps(price))
+
+async def poll_gold_price():
+    while True:
+        try:
+            await fx_table.refresh_if_stale()
+            price = await get_current_gold_price()
+            # Fallback and stale snapshots are not real ticks
+            if is_live_price(price):
+                await refresh_price_alerts()
+                publish_price_tick(price)
+                await run_recurring_purchases(price)
+        except Exception as e:
+            print(f"Gold price poller error: {str(e)}")
+        await asyncio.sleep(PRICE_POLL_INTERVAL)
+
+async def start_price_poller():
+    global price_poller_task
+    price_poller_task = asyncio.create_task(poll_gold_price())
+
+async def stop_price_poller():
+    if price_poller_task:
+        price_poller_task.cancel()
+
+async def close_cache_backend():
+    # Drops held refresh locks and the Redis connection
+    await cache_backend.close()
+
+@app.get("/api/gold/stream")
+async def stream_gold_prices(request: Request):
+    """
+    Server-Sent Events stream of gold price ticks. The latest snapshot is
+    sent on connect; clients too slow to keep up are disconnected.
+    """
+    async def events():
+        subscription = price_hub.subscribe()
+        try:
+            while True:
+                try:
+                    message = await subscription.get(timeout=PRICE_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield b"event: price\ndata: " + message + b"\n\n"
+        finally:
+            price_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/gold/stream/ws")
+async def stream_gold_prices_ws(websocket: WebSocket):
+    """WebSocket variant of /api/gold/stream, one JSON text frame per tick."""
+    await websocket.accept()
+    subscription = price_hub.subscribe()
+    disconnected = False
+    
+    async def watch_disconnect():
+        # Clients only listen; wake the sender as soon as they go away
+        nonlocal disconnected
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        disconnected = True
+        subscription.drop()
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        while True:
+            message = await subscription.get()
+            if message is None:
+                if not disconnected:
+                    # Slow consumer: ask the client to reconnect
+                    await websocket.close(code=1013)
+                break
+            await websocket.send_text(message.decode("utf-8"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        price_hub.unsubscribe(subscription)
+
+# Price Alert Endpoints
+# Every worker evaluates ticks against its own index; an alert is only
+# delivered by the worker whose active -> triggered flip succeeds
+alert_index = AlertIndex()
+alert_notifier = AlertNotifier()
+alert_trigger_tasks = set()
+# When the index last caught up with alerts created or removed elsewhere
+alerts_refreshed_at = None
+
+def evaluate_price_alerts(previous: tuple, current: tuple):
+    fired = []
+    for karat, before, after in zip(ALERT_KARATS, previous, current):
+        for alert in alert_index.crossed(karat, before, after):
+            fired.append((alert, after))
+    
+    if fired:
+        # Referenced until done, or the task could be collected mid-claim
+        task = asyncio.create_task(trigger_price_alerts(fired))
+        alert_trigger_tasks.add(task)
+        task.add_done_callback(alert_trigger_tasks.discard)
+
+async def trigger_price_alerts(fired: list):
+    claimed = set()
+    try:
+        now = datetime.now(timezone.utc)
+        claim = uuid.uuid4().hex
+        # One update per distinct price (at most one per karat)
+        by_price = {}
+        for alert, price in fired:
+            by_price.setdefault(price, []).append(alert["alert_id"])
+        for price, alert_ids in by_price.items():
+            await alerts_collection.update_many(
+                {"alert_id": {"$in": alert_ids}, "status": "active"},
+                {"$set": {
+                    "status": "triggered",
+                    "triggered_at": now,
+                    "triggered_price": price,
+                    "triggered_by": claim,
+                    "updated_at": now
+                }}
+            )
+        # Alerts another worker triggered first, or that were deleted
+        # meanwhile, aren't ours to deliver
+        claimed = await alerts_collection.distinct(
+            "alert_id",
+            {"alert_id": {"$in": [alert["alert_id"] for alert, _ in fired]}, "triggered_by": claim}
+        )
+        claimed = set(claimed)
+        for alert, price in fired:
+            if alert["alert_id"] in claimed:
+                alert_notifier.notify(alert, price)
+    except Exception as e:
+        # crossed() already took them out of the index and they are still
+        # active in Mongo, where refresh won't see a change: put back the
+        # ones not known to be claimed so the next crossing retries them
+        unclaimed = [alert for alert, _ in fired if alert["alert_id"] not in claimed]
+        for alert in unclaimed:
+            alert_index.add(alert)
+        print(f"Trigger price alerts error: {str(e)}, {len(unclaimed)} alerts back in the index")
+
+async def refresh_price_alerts():
+    """
+    Catch the index up with alerts created, triggered or deleted through
+    other workers since the last refresh (all active alerts the first time).
+    """
+    global alerts_refreshed_at
+    try:
+        now = datetime.now(timezone.utc)
+        if alerts_refreshed_at is None:
+            changed = alerts_collection.find({"status": "active"}, {"_id": 0})
+        else:
+            since = alerts_refreshed_at - SYNC_OVERLAP
+            changed = alerts_collection.find({"updated_at": {"$gte": since}}, {"_id": 0})
+            async for deleted in sync_tombstones_collection.find(
+                {"updated_at": {"$gte": since}, "collection": "alerts"},
+                {"_id": 0, "id": 1}
+            ):
+                alert_index.remove(deleted["id"])
+        async for alert in changed:
+            if alert["status"] == "active":
+                alert_index.add(alert)
+            else:
+                alert_index.remove(alert["alert_id"])
+        alerts_refreshed_at = now
+    except Exception as e:
+        print(f"Refresh price alerts error: {str(e)}")
+
+async def load_price_alerts():
+    try:
+        await alerts_collection.create_index("alert_id", unique=True)
+        await alerts_collection.create_index("status")
+        await alerts_collection.create_index([("user_id", 1), ("created_at", -1)])
+        await alerts_collection.create_index("updated_at")
+    except Exception as e:
+        print(f"Load price alerts error: {str(e)}")
+    
+    await refresh_price_alerts()
+    alert_notifier.start()
+
+async def stop_alert_notifier():
+    alert_notifier.stop()
+
+@app.post("/api/alerts")
+async def create_price_alert(alert_data: dict, request: Request):
+    user = await require_auth(request)
+    
+    karat = alert_data.get("karat")
+    direction = alert_data.get("direction")
+    try:
+        threshold = float(alert_data.get("threshold"))
+    except (TypeError, ValueError):
+        threshold = 0
+    
+    if karat not in ALERT_KARATS:
+        raise HTTPException(status_code=400, detail="karat must be one of: 24, 22, 18")
+    if direction not in ALERT_DIRECTIONS:
+        raise HTTPException(status_code=400, detail="direction must be 'above' or 'below'")
+    if threshold <= 0:
+        raise HTTPException(status_code=400, detail="threshold must be a positive QAR price")
+    
+    now = datetime.now(timezone.utc)
+    alert = {
+        "alert_id": f"alert_{uuid.uuid4().hex[:12]}",
+        "user_id": user.user_id,
+        "karat": karat,
+        "direction": direction,
+        "threshold": threshold,
+        "status": "active",
+        "created_at": now,
+        "triggered_at": None,
+        "triggered_price": None,
+        "updated_at": now
+    }
+    
+    await alerts_collection.insert_one(alert)
+    alert = {k: v for k, v in alert.items() if k != "_id"}
+    alert_index.add(alert)
+    return alert
+
+@app.get("/api/alerts")
+async def get_price_alerts(request: Request):
+    user = await require_auth(request)
+    
+    alerts = await alerts_collection.find(
+        {"user_id": user.user_id},
+        {"_id": 0}
+    ).sort("created_at", -1).to_list(100)
+    
+    return FastJSONResponse(alerts)
+
+@app.delete("/api/alerts/{alert_id}")
+async def delete_price_alert(alert_id: str, request: Request):
+    user = await require_auth(request)
+    
+    result = await alerts_collection.delete_one({"alert_id": alert_id, "user_id": user.user_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    alert_index.remove(alert_id)
+    await sync_tombstones_collection.insert_one(
+        tombstone("alerts", alert_id, user.user_id, datetime.now(timezone.utc))
+    )
+    return {"message": "Alert deleted"}
+
+# Inventory Endpoints
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "15"))
+RESERVATION_SWEEP_INTERVAL = 60
+reservation_sweeper_task = None
+
+async def commit_reservation(reservation_id: str, user_id: str, order_id: str):
+    reservation = await reservations_collection.find_one_and_update(
+        {
+            "reservation_id": reservation_id,
+            "user_id": user_id,
+            "status": "held",
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        },
+        {"$set": {"status": "committed", "order_id": order_id}},
+        projection={"_id": 0}
+    )
+    if not reservation:
+        raise HTTPException(status_code=409, detail="Reservation expired or not found")
+    return reservation
+
+async def reopen_reservation(reservation_id: str, order_id: str):
+    # Undo commit_reservation for an order that wasn't placed; the stock
+    # stays held for the cart (or the sweeper releases it once expired)
+    await reservations_collection.update_one(
+        {"reservation_id": reservation_id, "status": "committed", "order_id": order_id},
+        {"$set": {"status": "held", "order_id": None}}
+    )
+
+def item_quantities(items) -> dict:
+    quantities = {}
+    for item in items:
+        quantities[item["item_id"]] = quantities.get(item["item_id"], 0) + float(item["quantity"])
+    return quantities
+
+async def ensure_unique_index(collection, field: str):
+    try:
+        await collection.create_index(field, unique=True)
+    except OperationFailure as e:
+        # IndexOptionsConflict / IndexKeySpecsConflict: an older
+        # non-unique index on the field is in the way
+        if e.code not in (85, 86):
+            raise
+        await collection.drop_index(f"{field}_1")
+        await collection.create_index(field, unique=True)
+
+async def release_reservation(filter_query: dict, status: str) -> bool:
+    # The status flip is the guard: only one caller gets to give stock back
+    reservation = await reservations_collection.find_one_and_update(
+        {**filter_query, "status": "held"},
+        {"$set": {"status": status}},
+        projection={"_id": 0, "allocations": 1}
+    )
+    if not reservation:
+        return False
+    await release_allocations(jewelry_collection, stock_shards_collection, reservation["allocations"])
+    return True
+
+async def sweep_expired_reservations():
+    while True:
+        try:
+            now = datetime.now(timezone.utc)
+            expired = await reservations_collection.find(
+                {"status": "held", "expires_at": {"$lte": now}},
+                {"_id": 0, "reservation_id": 1}
+            ).to_list(1000)
+            for reservation in expired:
+                await release_reservation({"reservation_id": reservation["reservation_id"]}, "expired")
+        except Exception as e:
+            print(f"Reservation sweep error: {str(e)}")
+        await asyncio.sleep(RESERVATION_SWEEP_INTERVAL)
+
+async def start_reservation_sweeper():
+    global reservation_sweeper_task
+    try:
+        await reservations_collection.create_index("reservation_id", unique=True)
+        await reservations_collection.create_index([("status", 1), ("expires_at", 1)])
+        await stock_shards_collection.create_index([("item_id", 1), ("shard", 1)], unique=True)
+        # Stock, orders and imports all address items by item_id alone
+        await ensure_unique_index(jewelry_collection, "item_id")
+    except Exception as e:
+        print(f"Inventory index error: {str(e)}")
+    reservation_sweeper_task = asyncio.create_task(sweep_expired_reservations())
+
+async def stop_reservation_sweeper():
+    if reservation_sweeper_task:
+        reservation_sweeper_task.cancel()
+
+@app.post("/api/reservations")
+async def create_reservation(reservation_data: dict, request: Request):
+    """Hold stock for a cart; released automatically when it expires."""
+    user = await require_auth(request)
+    
+    items = reservation_data.get("items", [])
+    if not items or any("item_id" not in item or "quantity" not in item for item in items):
+        raise HTTPException(status_code=400, detail="items with item_id and quantity required")
+    
+    try:
+        allocations = await reserve_items(jewelry_collection, stock_shards_collection, items)
+    except OutOfStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    now = datetime.now(timezone.utc)
+    reservation = {
+        "reservation_id": f"reservation_{uuid.uuid4().hex[:12]}",
+        "user_id": user.user_id,
+        "items": [{"item_id": item["item_id"], "quantity": item["quantity"]} for item in items],
+        "allocations": allocations,
+        "status": "held",
+        "expires_at": now + timedelta(minutes=RESERVATION_TTL_MINUTES),
+        "created_at": now,
+        "order_id": None
+    }
+    
+    try:
+        await reservations_collection.insert_one(reservation)
+    except Exception as e:
+        await release_allocations(jewelry_collection, stock_shards_collection, allocations)
+        print(f"Create reservation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {k: v for k, v in reservation.items() if k not in ("_id", "allocations")}
+
+@app.delete("/api/reservations/{reservation_id}")
+async def cancel_reservation(reservation_id: str, request: Request):
+    user = await require_auth(request)
+    
+    released = await release_reservation(
+        {"reservation_id": reservation_id, "user_id": user.user_id},
+        "released"
+    )
+    if not released:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    
+    return {"message": "Reservation released"}
+
+@app.put("/api/admin/inventory/{item_id}")
+async def update_item_stock(item_id: str, stock_data: dict, request: Request):
+    """
+    Set an item's stock count. `shards` > 1 spreads the count over that
+    many counter documents for items expected to sell under heavy
+    contention (promotions); 0 or 1 keeps a single counter.
+    """
+    await require_admin(request)
+    
+    stock = stock_data.get("stock")
+    shards = stock_data.get("shards", 0)
+    if not isinstance(stock, int) or stock < 0:
+        raise HTTPException(status_code=400, detail="stock must be a non-negative integer")
+    if not isinstance(shards, int) or not 0 <= shards <= 64:
+        raise HTTPException(status_code=400, detail="shards must be an integer between 0 and 64")
+    
+    result = await set_item_stock(jewelry_collection, stock_shards_collection, item_id, stock, shards)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    return {"item_id": item_id, "stock": stock, "shards": shards}
+
+# Recurring Purchase Endpoints
+WORKER_ID = f"worker_{uuid.uuid4().hex[:12]}"
+RECURRING_LEASE_SECONDS = 300
+
+async def acquire_scheduler_lease(name: str, seconds: int) -> bool:
+    # Only one worker executes plans per tick; the lease expires on its own
+    # if that worker dies mid-run
+    now = datetime.now(timezone.utc)
+    try:
+        await scheduler_locks_collection.find_one_and_update(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def release_scheduler_lease(name: str):
+    await scheduler_locks_collection.update_one(
+        {"_id": name, "owner": WORKER_ID},
+        {"$set": {"expires_at": datetime.now(timezone.utc)}}
+    )
+
+async def run_recurring_purchases(price: dict):
+    try:
+        if not await acquire_scheduler_lease("recurring_purchases", RECURRING_LEASE_SECONDS):
+            return
+        try:
+            executed = await execute_due_plans(
+                recurring_plans_collection,
+                orders_collection,
+                portfolio_collection,
+                price["price_24k"],
+                datetime.now(timezone.utc)
+            )
+            if executed:
+                print(f"Executed {executed} recurring purchases at {price['price_24k']} QAR/g")
+        finally:
+            await release_scheduler_lease("recurring_purchases")
+    except Exception as e:
+        print(f"Recurring purchases error: {str(e)}")
+
+async def ensure_recurring_plan_indexes():
+    try:
+        await recurring_plans_collection.create_index("plan_id", unique=True)
+        await recurring_plans_collection.create_index([("status", 1), ("next_run_at", 1)])
+        await recurring_plans_collection.create_index("user_id")
+        # Recurring order ids are per plan run; this makes a repeated run
+        # fail to insert instead of buying twice
+        await orders_collection.create_index("order_id", unique=True)
+    except Exception as e:
+        print(f"Recurring plan index error: {str(e)}")
+
+@app.post("/api/recurring")
+async def create_recurring_plan(plan_data: dict, request: Request):
+    user = await require_auth(request)
+    
+    interval = plan_data.get("interval")
+    try:
+        amount = float(plan_data.get("amount"))
+    except (TypeError, ValueError):
+        amount = 0
+    
+    if interval not in PLAN_INTERVALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"interval must be one of: {', '.join(PLAN_INTERVALS)}"
+        )
+    if amount <= 0:
+        raise HTTPException(status_code=400, detail="amount must be a positive QAR amount")
+    
+    plan = new_plan(user.user_id, amount, interval, datetime.now(timezone.utc))
+    await recurring_plans_collection.insert_one(plan)
+    return {k: v for k, v in plan.items() if k != "_id"}
+
+@app.get("/api/recurring")
+async def get_recurring_plans(request: Request):
+    user = await require_auth(request)
+    
+    plans = await recurring_plans_collection.find(
+        {"user_id": user.user_id},
+        {"_id": 0}
+    ).to_list(100)
+    
+    return FastJSONResponse(plans)
+
+@app.delete("/api/recurring/{plan_id}")
+async def cancel_recurring_plan(plan_id: str, request: Request):
+    user = await require_auth(request)
+    
+    result = await recurring_plans_collection.update_one(
+        {"plan_id": plan_id, "user_id": user.user_id},
+        {"$set": {"status": "cancelled"}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    
+    return {"message": "Plan cancelled"}
+
+# Delta Sync Endpoints
+SYNC_COLLECTIONS = {
+    "orders": orders_collection,
+    "vouchers": vouchers_collection,
+    "alerts": alerts_collection
+}
+
+async def run_migration(name: str, migrate):
+    # One-off data fixes: run until one succeeds, then never again. Two
+    # workers starting together may both run one, so they must be idempotent
+    if await migrations_collection.find_one({"_id": name}):
+        return
+    await migrate()
+    try:
+        await migrations_collection.insert_one({"_id": name, "applied_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        pass
+
+async def ensure_sync_indexes():
+    try:
+        for name, collection in SYNC_COLLECTIONS.items():
+            await run_migration(f"backfill_updated_at_{name}", lambda: backfill_updated_at(collection))
+            await collection.create_index([("user_id", 1), ("updated_at", 1)])
+        await sync_tombstones_collection.create_index([("user_id", 1), ("updated_at", 1)])
+        await sync_tombstones_collection.create_index(
+            "updated_at",
+            expireAfterSeconds=int(TOMBSTONE_RETENTION.total_seconds())
+        )
+    except Exception as e:
+        print(f"Sync index error: {str(e)}")
+
+@app.get("/api/sync")
+async def sync_changes(request: Request, since: Optional[int] = None):
+    """
+    Orders, vouchers, alerts and portfolio changed since the `version` a
+    client got from its previous sync, plus tombstones for deleted
+    documents. Without `since`, or with one older than the tombstone
+    retention, everything is returned with `full: true` and the client
+    should replace its copy.
+    """
+    user = await require_auth(request)
+    
+    now = datetime.now(timezone.utc)
+    if since is not None and since < 0:
+        raise HTTPException(status_code=400, detail="since must be a version from a previous sync")
+    full = since is None or from_version(since) < now - TOMBSTONE_RETENTION
+    lower = None if full else from_version(since) - SYNC_OVERLAP
+    
+    names = list(SYNC_COLLECTIONS)
+    collections = list(SYNC_COLLECTIONS.values())
+    if not full:
+        names.append("deleted")
+        collections.append(sync_tombstones_collection)
+    changes = await asyncio.gather(*(
+        changes_since(collection, user.user_id, lower)
+        for collection in collections
+    ))
+    
+    portfolio_filter = {"user_id": user.user_id}
+    if lower is not None:
+        portfolio_filter["updated_at"] = {"$gte": lower}
+    portfolio = await portfolio_collection.find_one(portfolio_filter, {"_id": 0})
+    
+    response = {"version": to_version(now), "full": full, "portfolio": portfolio}
+    for name, docs in zip(names, changes):
+        response[name] = docs
+    if full:
+        response["deleted"] = []
+    return FastJSONResponse(response)
+
+# Metrics
+event_loop_monitor_task = None
+
+async def start_event_loop_monitor():
+    global event_loop_monitor_task
+    event_loop_monitor_task = asyncio.create_task(monitor_event_loop_lag())
+
+async def stop_event_loop_monitor():
+    if event_loop_monitor_task:
+        event_loop_monitor_task.cancel()
+
+@app.get("/api/metrics")
+async def get_metrics(request: Request):
+    """
+    Prometheus text exposition: route latency and status counts, Mongo
+    command timings, upstream call timings and errors, cache hit ratios
+    and event loop lag. Set METRICS_TOKEN to require it as a bearer token.
+    """
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# Query plan sampling: every query shape seen is explained in the
+# background and COLLSCANs / in-memory sorts are logged and exported
+QUERY_PLAN_SAMPLE_INTERVAL = float(os.getenv("QUERY_PLAN_SAMPLE_INTERVAL", "300"))
+query_plan_task = None
+
+async def sample_query_plans_periodically():
+    while True:
+        await asyncio.sleep(QUERY_PLAN_SAMPLE_INTERVAL)
+        try:
+            await query_shapes.sample(client)
+        except Exception as e:
+            print(f"Query plan sampling error: {str(e)}")
+
+async def start_query_plan_sampler():
+    global query_plan_task
+    if QUERY_PLAN_SAMPLE_INTERVAL > 0:
+        query_plan_task = asyncio.create_task(sample_query_plans_periodically())
+
+async def stop_query_plan_sampler():
+    if query_plan_task:
+        query_plan_task.cancel()
+
+@app.get("/api/admin/query-plans")
+async def get_query_plans(request: Request, flagged: bool = False, explain_now: bool = False):
+    """
+    Query shapes issued since start with their call count and latest
+    sampled plan, flagged ones first. `explain_now` samples the due shapes
+    before answering instead of waiting for the next round.
+    """
+    await require_admin(request)
+    
+    if explain_now:
+        await query_shapes.sample(client)
+    
+    return FastJSONResponse(query_shapes.report(flagged_only=flagged))
+
+# Tracing and profiling
+@app.get("/api/admin/traces/slow")
+async def get_slow_traces(request: Request, limit: int = 20):
+    """Most recent requests over SLOW_REQUEST_MS with their spans, newest first."""
+    await require_admin(request)
+    
+    return list(reversed(slow_traces))[:max(limit, 0)]
+
+@app.post("/api/admin/profile")
+async def profile_event_loop(request: Request, seconds: float = 10, interval_ms: float = 5):
+    """
+    Sample the event loop's stack for `seconds` while it keeps serving
+    traffic, and return the profile in folded stack format: render with
+    flamegraph.pl or drop it into speedscope.app.
+    """
+    await require_admin(request)
+    
+    if not 0 < seconds <= 60:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 60")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    
+    # The sampler runs in a worker thread, looking at this (the loop's) thread
+    folded = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds, interval_ms / 1000)
+    if folded is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    return Response(content=folded, media_type="text/plain; charset=utf-8")
 
 # Health check
+async def wait_for_mongo():
+    delay = 0.5
+    while True:
+        try:
+            await db.command("ping")
+            return
+        except Exception as e:
+            print(f"MongoDB ping error: {str(e)}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 10)
+
+async def warm_up():
+    # Fill what the first requests would otherwise pay for: the FX table,
+    # the price snapshot (and the matrix built from it), the catalog
+    # sections and a few pooled Mongo connections
+    await fx_table.refresh_if_stale()
+    results = await asyncio.gather(
+        get_current_gold_price(),
+        get_cached_section("stores", load_stores),
+        get_cached_section("featured_products", get_featured_products),
+        *(db.command("ping") for _ in range(MONGO_WARM_CONNECTIONS)),
+        return_exceptions=True
+    )
+    price = results[0]
+    if isinstance(price, dict) and is_live_price(price):
+        publish_price_tick(price)
+
+async def prepare():
+    started = datetime.now(timezone.utc)
+    await wait_for_mongo()
+    # Each step reports its own errors; index builds run side by side.
+    # The unique user indexes are the exception: serving without them
+    # lets duplicate accounts in, so their failure keeps the pod unready
+    try:
+        await ensure_user_indexes()
+    except Exception as e:
+        readiness["error"] = f"user indexes: {str(e)}"
+        print(f"Startup failed, not ready: {readiness['error']}")
+        return
+    await asyncio.gather(
+        ensure_export_indexes(),
+        ensure_voucher_indexes(),
+        ensure_store_geo_index(),
+        ensure_recurring_plan_indexes(),
+        ensure_sync_indexes(),
+        load_price_alerts(),
+        start_reservation_sweeper(),
+        start_store_aggregates()
+    )
+    try:
+        await warm_up()
+    except Exception as e:
+        print(f"Warm-up error: {str(e)}")
+    await start_price_poller()
+    await start_query_plan_sampler()
+    
+    readiness["ready"] = True
+    readiness["since"] = datetime.now(timezone.utc)
+    print(f"Ready after {(readiness['since'] - started).total_seconds():.2f}s")
+
 @app.get("/api/health")
 async def health_check():
+    """Liveness: the process is serving. See /api/ready for dependencies."""
     return {"status": "ok", "timestamp": datetime.now(timezone.utc)}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once startup finished and Mongo answers a ping now,
+    else 503. The price snapshot's freshness is reported but doesn't fail
+    the probe; an upstream outage hits every pod alike and the fallback
+    price keeps serving.
+    """
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_PING_TIMEOUT)
+        mongo = "ok"
+    except Exception as e:
+        mongo = f"error: {str(e)}"
+    
+    price_fresh = last_price_tick_at is not None and (
+        datetime.now(timezone.utc) - last_price_tick_at
+    ).total_seconds() < 3 * PRICE_POLL_INTERVAL + GOLD_PRICE_MAX_AGE
+    
+    ready = readiness["ready"] and mongo == "ok"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "startup": "done" if readiness["ready"] else "failed" if readiness["error"] else "in_progress",
+            "mongo": mongo,
+            "price": "fresh" if price_fresh else "stale",
+            "ready_since": readiness["since"].isoformat() if readiness["since"] else None,
+            "error": readiness["error"]
+        }
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
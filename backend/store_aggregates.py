@@ -0,0 +1,128 @@
+from collections import Counter, defaultdict
+from typing import Iterable, List
+
+from pymongo import UpdateOne
+
+# Fields on the store document derived from its products; `stats` holds
+# the running sums they are computed from
+AGGREGATE_FIELDS = ("total_products", "rating", "min_price", "max_price", "categories")
+
+
+def _add(path: str, amount):
+    return {"$add": [{"$ifNull": [path, 0]}, amount]}
+
+
+# Second pipeline stage shared by both paths: recompute the derived fields
+_DERIVE_STAGE = {"$set": {
+    "total_products": "$stats.product_count",
+    "rating": {
+        "$cond": [
+            {"$gt": ["$stats.rating_count", 0]},
+            {"$round": [{"$divide": ["$stats.rating_sum", "$stats.rating_count"]}, 2]},
+            "$rating"
+        ]
+    },
+    "min_price": "$stats.min_price",
+    "max_price": "$stats.max_price",
+    "categories": {
+        "$map": {
+            "input": {
+                "$filter": {
+                    "input": {"$objectToArray": {"$ifNull": ["$stats.category_counts", {}]}},
+                    "cond": {"$gt": ["$$this.v", 0]}
+                }
+            },
+            "in": "$$this.k"
+        }
+    }
+}}
+
+
+def insert_delta(products: List[dict]) -> list:
+    """
+    Update pipeline folding newly inserted products of one store into its
+    aggregate, in one atomic write and without reading the catalog.
+    """
+    ratings = [p["rating"] for p in products if p.get("rating") is not None]
+    prices = [p["price"] for p in products if p.get("price") is not None]
+    categories = Counter(p["category"] for p in products if p.get("category"))
+
+    stats = {
+        "stats.product_count": _add("$stats.product_count", len(products)),
+        "stats.rating_sum": _add("$stats.rating_sum", sum(ratings)),
+        "stats.rating_count": _add("$stats.rating_count", len(ratings)),
+    }
+    for category, count in categories.items():
+        path = f"stats.category_counts.{category}"
+        stats[path] = _add(f"${path}", count)
+    if prices:
+        stats["stats.min_price"] = {"$min": ["$stats.min_price", min(prices)]}
+        stats["stats.max_price"] = {"$max": ["$stats.max_price", max(prices)]}
+
+    return [{"$set": stats}, _DERIVE_STAGE]
+
+
+async def apply_product_inserts(stores_collection, products: Iterable[dict]):
+    """Incremental path: call after inserting new jewelry documents."""
+    by_store = defaultdict(list)
+    for product in products:
+        by_store[product["store_id"]].append(product)
+
+    if by_store:
+        await stores_collection.bulk_write([
+            UpdateOne({"store_id": store_id}, insert_delta(store_products))
+            for store_id, store_products in by_store.items()
+        ], ordered=False)
+
+
+async def rebuild_store_aggregates(stores_collection, jewelry_collection, store_ids: List[str] = None) -> int:
+    """
+    Batch path: recompute aggregates from the jewelry collection, for every
+    store or only `store_ids`. Fixes anything the incremental path can't
+    express (deletes, price edits, upserted imports).
+    """
+    match = {"store_id": {"$in": store_ids}} if store_ids else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"store_id": "$store_id", "category": "$category"},
+            "count": {"$sum": 1},
+            "rating_sum": {"$sum": {"$ifNull": ["$rating", 0]}},
+            "rating_count": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$rating", None]}, None]}, 0, 1]}},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"}
+        }}
+    ]
+
+    stats = defaultdict(lambda: {
+        "product_count": 0,
+        "rating_sum": 0,
+        "rating_count": 0,
+        "min_price": None,
+        "max_price": None,
+        "category_counts": {}
+    })
+    async for group in jewelry_collection.aggregate(pipeline):
+        store = stats[group["_id"]["store_id"]]
+        store["product_count"] += group["count"]
+        store["rating_sum"] += group["rating_sum"]
+        store["rating_count"] += group["rating_count"]
+        for bound, pick in (("min_price", min), ("max_price", max)):
+            if group[bound] is not None:
+                current = store[bound]
+                store[bound] = group[bound] if current is None else pick(current, group[bound])
+        if group["_id"]["category"]:
+            store["category_counts"][group["_id"]["category"]] = group["count"]
+
+    target_ids = store_ids
+    if target_ids is None:
+        target_ids = [store["store_id"] async for store in stores_collection.find({}, {"_id": 0, "store_id": 1})]
+
+    updates = [
+        # Stores without products get the zeroed defaults
+        UpdateOne({"store_id": store_id}, [{"$set": {"stats": stats[store_id]}}, _DERIVE_STAGE])
+        for store_id in target_ids
+    ]
+    if updates:
+        await stores_collection.bulk_write(updates, ordered=False)
+    return len(updates)
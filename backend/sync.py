@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+# Versions are `updated_at` in epoch milliseconds. Each sync re-reads this
+# much history before the client's version, so a write stamped just before
+# a sync but committed just after it is picked up on the next one; clients
+# apply documents by id, so the repeats are harmless
+SYNC_OVERLAP = timedelta(seconds=5)
+# Tombstones are kept this long; clients older than that resync in full
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+def to_version(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def from_version(version: int) -> datetime:
+    return datetime.fromtimestamp(version / 1000, tz=timezone.utc)
+
+
+def tombstone(collection: str, doc_id: str, user_id: str, now: datetime) -> dict:
+    """Record of a deleted document, for clients that still hold it."""
+    return {
+        "collection": collection,
+        "id": doc_id,
+        "user_id": user_id,
+        "updated_at": now
+    }
+
+
+async def changes_since(collection, user_id: str, since: Optional[datetime]) -> List[dict]:
+    """
+    A user's documents with `updated_at` >= `since` (all of them for None),
+    oldest change first, served from the (user_id, updated_at) index.
+    """
+    filter_query = {"user_id": user_id}
+    if since is not None:
+        filter_query["updated_at"] = {"$gte": since}
+    return await collection.find(filter_query, {"_id": 0}).sort("updated_at", 1).to_list(None)
+
+
+async def backfill_updated_at(collection):
+    # Documents written before they carried updated_at
+    await collection.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": "$created_at"}}]
+    )
@@ -0,0 +1,197 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+SLOW_TRACES_KEPT = 100
+# Spans kept one by one per trace; past this, spans are merged by name
+# into a count and total so a request's trace stays bounded
+MAX_SPANS_PER_TRACE = 200
+MAX_PROFILE_SECONDS = 60
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+# Most recent slow requests, newest last
+slow_traces = deque(maxlen=SLOW_TRACES_KEPT)
+
+
+class Trace:
+    """Spans recorded while serving one request; offsets are from its start."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = None
+        # (name, start offset, duration); appended to from Motor's executor
+        # threads too, list.append is atomic
+        self.spans = []
+        # name -> [count, total duration] of the spans past MAX_SPANS_PER_TRACE
+        self.merged = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float):
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append((name, start - self.started, duration))
+            return
+        with self._lock:
+            merged = self.merged.setdefault(name, [0, 0.0])
+            merged[0] += 1
+            merged[1] += duration
+
+    def breakdown(self) -> dict:
+        # Time per span kind ("mongo find orders" -> "mongo"). Spans nest,
+        # auth includes its own Mongo lookups
+        by_kind = Counter()
+        for name, _, duration in self.spans:
+            by_kind[name.split(" ", 1)[0]] += duration
+        for name, (_, duration) in self.merged.items():
+            by_kind[name.split(" ", 1)[0]] += duration
+        return {kind: round(seconds * 1000, 2) for kind, seconds in by_kind.most_common()}
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 2),
+            "breakdown_ms": self.breakdown(),
+            "spans": [
+                {"name": name, "offset_ms": round(offset * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+                for name, offset, duration in sorted(self.spans, key=lambda span: span[1])
+            ],
+            "merged_spans": [
+                {"name": name, "count": count, "duration_ms": round(duration * 1000, 2)}
+                for name, (count, duration) in self.merged.items()
+            ],
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+
+
+@contextmanager
+def span(name: str):
+    """Time a block as a span of the current request (no-op outside one)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, started, time.perf_counter() - started)
+
+
+def traced(name: str):
+    """Decorator recording each call of a coroutine function as a span."""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name: str, duration: float):
+    """A span that just finished, timed elsewhere (driver events)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - duration, duration)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware giving each HTTP request a Trace. Requests slower
+    than `slow_ms` are logged with their span breakdown and kept for
+    /api/admin/traces/slow. Paths starting with `exclude_paths` or ending
+    with `exclude_suffixes` (streams, exports: long by design) aren't
+    traced.
+    """
+
+    def __init__(
+        self,
+        app,
+        slow_ms: float = 500.0,
+        exclude_paths: Iterable[str] = (),
+        exclude_suffixes: Iterable[str] = ()
+    ):
+        self.app = app
+        self.slow_seconds = slow_ms / 1000
+        self.exclude_paths = tuple(exclude_paths)
+        self.exclude_suffixes = tuple(exclude_suffixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.exclude_paths)
+            or scope["path"].endswith(self.exclude_suffixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace.started
+            if trace.duration >= self.slow_seconds:
+                self.log_slow(trace)
+
+    def log_slow(self, trace: Trace):
+        slow_traces.append(trace.to_dict())
+        lines = [f"Slow request: {trace.method} {trace.path} {trace.status} {trace.duration * 1000:.1f}ms"]
+        for name, offset, duration in sorted(trace.spans, key=lambda span: span[1]):
+            lines.append(f"  +{offset * 1000:7.1f}ms {duration * 1000:7.1f}ms  {name}")
+        for name, (count, duration) in trace.merged.items():
+            lines.append(f"  {count:>6} more {duration * 1000:7.1f}ms  {name}")
+        print("\n".join(lines))
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> Optional[str]:
+    """
+    Statistical profile of one thread (the event loop's): sample its stack
+    every `interval` for `seconds` and return it in the folded format
+    (`root;caller;callee count` per line) read by flamegraph.pl and
+    speedscope. Blocks, run it off the loop. Returns None when a profile
+    is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        stacks = Counter()
+        deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,105 @@
+import math
+import secrets
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+# No 0/O or 1/I, codes are read out and typed in by hand
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_GROUPS = 3
+CODE_GROUP_LENGTH = 4
+
+ISSUE_CHUNK_SIZE = 1000
+# Vouchers redeem for gold: no single voucher is worth more than this (QAR)
+MAX_VOUCHER_AMOUNT = 50000
+REDEEMABLE_STATUSES = ["pending", "sent"]
+
+
+def generate_code() -> str:
+    groups = [
+        "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_GROUP_LENGTH))
+        for _ in range(CODE_GROUPS)
+    ]
+    return "-".join(groups)
+
+
+def valid_amount(amount) -> bool:
+    """A voucher amount is a positive number of QAR up to MAX_VOUCHER_AMOUNT."""
+    return (
+        isinstance(amount, (int, float))
+        and not isinstance(amount, bool)
+        and math.isfinite(amount)
+        and 0 < amount <= MAX_VOUCHER_AMOUNT
+    )
+
+
+def new_voucher(
+    user_id: str,
+    amount: float,
+    recipient_name: Optional[str],
+    recipient_phone: Optional[str],
+    now: datetime,
+    batch_id: Optional[str] = None
+) -> dict:
+    voucher = {
+        "voucher_id": f"voucher_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "code": generate_code(),
+        "amount": amount,
+        "recipient_name": recipient_name,
+        "recipient_phone": recipient_phone,
+        "status": "pending",
+        "created_at": now,
+        "redeemed_at": None,
+        "updated_at": now
+    }
+    if batch_id:
+        voucher["batch_id"] = batch_id
+    return voucher
+
+
+async def issue_vouchers(vouchers_collection, vouchers: List[dict], chunk_size: int = ISSUE_CHUNK_SIZE):
+    """
+    insert_many in fixed-size unordered chunks. The rare code collision
+    (unique index on `code`) is retried with a fresh code.
+    """
+    for start in range(0, len(vouchers), chunk_size):
+        pending = vouchers[start:start + chunk_size]
+        while pending:
+            try:
+                await vouchers_collection.insert_many(pending, ordered=False)
+                pending = []
+            except BulkWriteError as e:
+                errors = e.details["writeErrors"]
+                if any(error["code"] != 11000 for error in errors):
+                    raise
+                retry = [pending[error["index"]] for error in errors]
+                for voucher in retry:
+                    voucher.pop("_id", None)
+                    voucher["code"] = generate_code()
+                pending = retry
+
+
+async def redeem_voucher(vouchers_collection, code: str, user_id: str, price_24k: float, now: datetime):
+    """
+    Atomically flip a redeemable voucher to redeemed, converting its amount
+    to 24k grams at `price_24k` in the same update. Only one of any number
+    of concurrent attempts on the same code gets the document back; the
+    others get None.
+    """
+    return await vouchers_collection.find_one_and_update(
+        {"code": code, "status": {"$in": REDEEMABLE_STATUSES}},
+        [{"$set": {
+            "status": "redeemed",
+            "redeemed_at": now,
+            "redeemed_by": {"$literal": user_id},
+            "redeemed_price": price_24k,
+            "redeemed_grams": {"$divide": ["$amount", price_24k]},
+            "updated_at": now
+        }}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import mongomock.collection
+import mongomock_motor
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+import server
+
+
+def _find_and_modify_by_id(find_and_modify):
+    # mongomock re-reads the updated document with the original filter
+    # when the projection drops _id, so compare-and-set updates that change
+    # a filtered field ("status") come back as None. Only that case is
+    # redirected, to the matched document's _id
+    def find_and_modify_by_id(self, query, projection=None, update=None, upsert=False, sort=None, *args, **kwargs):
+        if isinstance(projection, dict) and projection.get("_id", 1) == 0:
+            match = self.find_one(query, projection={"_id": 1}, sort=sort)
+            if match is not None:
+                query = {"_id": match["_id"]}
+        return find_and_modify(self, query, projection, update, upsert, sort, *args, **kwargs)
+    return find_and_modify_by_id
+
+
+def _to_list_up_to(to_list):
+    # mongomock-motor returns the whole result whatever the length; Motor
+    # stops at `length`, and the handlers' caps are part of what's tested
+    async def to_list_up_to(self, length=None, *args, **kwargs):
+        docs = await to_list(self)
+        return docs if length is None else docs[:length]
+    return to_list_up_to
+
+
+# The classes defining to_list: patching one that inherits it would
+# leave the wrapper behind when the patch is undone
+_CURSORS = {
+    next(base for base in cursor.__mro__ if "to_list" in vars(base))
+    for cursor in (mongomock_motor.AsyncCursor, mongomock_motor.AsyncCommandCursor, mongomock_motor.AsyncLatentCommandCursor)
+}
+
+# server's Motor collections, captured before any test swaps them
+_COLLECTIONS = {
+    name: value.name
+    for name, value in vars(server).items()
+    if isinstance(value, AsyncIOMotorCollection)
+}
+_COLLECTION_DICTS = {
+    name: {key: collection.name for key, collection in value.items()}
+    for name, value in vars(server).items()
+    if isinstance(value, dict) and value and all(isinstance(v, AsyncIOMotorCollection) for v in value.values())
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database behind every server collection."""
+    collection = mongomock.collection.Collection
+    monkeypatch.setattr(collection, "_find_and_modify", _find_and_modify_by_id(collection._find_and_modify))
+    for cursor in _CURSORS:
+        monkeypatch.setattr(cursor, "to_list", _to_list_up_to(cursor.to_list))
+
+    mock_db = AsyncMongoMockClient()[f"test_{uuid.uuid4().hex[:8]}"]
+    for name, collection_name in _COLLECTIONS.items():
+        monkeypatch.setattr(server, name, mock_db[collection_name])
+    for name, collections in _COLLECTION_DICTS.items():
+        monkeypatch.setattr(server, name, {key: mock_db[value] for key, value in collections.items()})
+    monkeypatch.setattr(server, "db", mock_db)
+    monkeypatch.setattr(server, "alert_index", server.AlertIndex())
+    server.cache_backend._entries.clear()
+    return mock_db
+
+
+@pytest.fixture
+def client(db):
+    # Without the context manager the lifespan (Mongo ping, pollers) doesn't run
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def live_price(monkeypatch):
+    price = {
+        "price_24k": 250.0,
+        "price_22k": 229.17,
+        "price_18k": 187.5,
+        "currency": "QAR",
+        "timestamp": datetime.now(timezone.utc),
+        "source": "test"
+    }
+
+    async def get_current_gold_price():
+        return dict(price)
+
+    monkeypatch.setattr(server, "get_current_gold_price", get_current_gold_price)
+    return price
+
+
+def run(coroutine):
+    """Run a Motor-style call on the in-memory database from a test."""
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def sign_in(db):
+    """Create a user with a session; returns the request headers for it."""
+
+    def sign_in(email: str = None) -> dict:
+        email = email or f"user_{uuid.uuid4().hex[:8]}@test.local"
+        user_id = f"user_{uuid.uuid4().hex[:12]}"
+        token = f"token_{uuid.uuid4().hex}"
+        now = datetime.now(timezone.utc)
+        run(db.users.insert_one({
+            "user_id": user_id,
+            "email": email,
+            "name": email.split("@")[0],
+            "picture": None,
+            "gold_balance": 0.0,
+            "created_at": now
+        }))
+        run(db.user_sessions.insert_one({
+            "user_id": user_id,
+            "session_token": token,
+            "expires_at": now + timedelta(days=7),
+            "created_at": now
+        }))
+        return {"Authorization": f"Bearer {token}"}
+
+    return sign_in
@@ -0,0 +1,60 @@
+import asyncio
+
+from admission import ConcurrencyLimit, TokenBucket, client_key
+
+
+def scope(peer: str, forwarded: str = None) -> dict:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "client": (peer, 50000), "headers": headers}
+
+
+def test_clients_behind_a_trusted_proxy_are_told_apart():
+    proxies = frozenset({"10.0.0.1", "10.0.0.2"})
+
+    assert client_key(scope("10.0.0.1", "203.0.113.7"), proxies) == "203.0.113.7"
+    # Hops appended by our own proxies are skipped, a spoofed first hop isn't taken
+    assert client_key(scope("10.0.0.1", "198.51.100.1, 203.0.113.7, 10.0.0.2"), proxies) == "203.0.113.7"
+    assert client_key(scope("10.0.0.1"), proxies) == "10.0.0.1"
+
+
+def test_forwarded_for_is_ignored_from_other_peers():
+    assert client_key(scope("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+    assert client_key(scope("203.0.113.7", "198.51.100.1"), frozenset({"10.0.0.1"})) == "203.0.113.7"
+
+
+def test_token_bucket_allows_the_burst_then_waits():
+    buckets = TokenBucket(rate=10, burst=3)
+
+    assert [buckets.take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0 < buckets.take("a") <= 0.1
+    assert buckets.take("b") == 0.0
+
+
+def test_token_bucket_forgets_the_least_recent_client():
+    buckets = TokenBucket(rate=1, burst=1, max_clients=2)
+    buckets.take("a")
+    buckets.take("b")
+    buckets.take("c")
+
+    assert buckets.take("a") == 0.0
+
+
+def test_concurrency_limit_queues_then_sheds():
+    async def scenario():
+        limit = ConcurrencyLimit(limit=1, max_wait=0.05)
+        assert await limit.acquire()
+
+        waiting = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0)
+        assert limit.queued == 1
+        limit.release()
+        assert await waiting
+        assert limit.active == 1
+
+        # Nobody releases: the next request gives up after max_wait
+        assert not await limit.acquire()
+        assert limit.queued == 0
+        limit.release()
+        assert limit.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import server
+from alerts import AlertIndex
+
+from .conftest import run
+
+
+def alert(alert_id: str, direction: str, threshold: float, karat: int = 24) -> dict:
+    return {
+        "alert_id": alert_id,
+        "user_id": "user_a",
+        "karat": karat,
+        "direction": direction,
+        "threshold": threshold,
+        "status": "active",
+        "updated_at": datetime.now(timezone.utc)
+    }
+
+
+def test_crossed_pops_only_the_alerts_between_two_prices():
+    index = AlertIndex()
+    for a in (alert("up_250", "above", 250), alert("up_260", "above", 260), alert("up_300", "above", 300),
+              alert("down_240", "below", 240), alert("up_22k", "above", 250, karat=22)):
+        index.add(a)
+
+    # "above X" fires when previous < X <= current
+    assert [a["alert_id"] for a in index.crossed(24, 250, 260)] == ["up_260"]
+    assert index.crossed(24, 250, 250) == []
+    assert [a["alert_id"] for a in index.crossed(24, 240, 260)] == ["up_250"]
+    # "below X" fires when current <= X < previous
+    assert index.crossed(24, 260, 241) == []
+    assert [a["alert_id"] for a in index.crossed(24, 260, 240)] == ["down_240"]
+    # Fired alerts are gone, other karats and thresholds untouched
+    assert sorted(index.alerts) == ["up_22k", "up_300"]
+
+
+def test_removed_alerts_never_fire():
+    index = AlertIndex()
+    index.add(alert("up_250", "above", 250))
+    index.add(alert("up_250", "above", 250))
+    index.remove("up_250")
+
+    assert len(index) == 0
+    assert index.crossed(24, 200, 300) == []
+
+
+def test_alerts_whose_claim_fails_go_back_in_the_index(db, monkeypatch):
+    a = alert("up_250", "above", 250)
+    run(db.alerts.insert_one(dict(a)))
+    server.alert_index.add(a)
+    fired = [(fired_alert, 260.0) for fired_alert in server.alert_index.crossed(24, 240, 260)]
+    assert len(server.alert_index) == 0
+
+    async def unavailable(*args, **kwargs):
+        raise Exception("not primary")
+
+    monkeypatch.setattr(server.alerts_collection, "update_many", unavailable)
+    run(server.trigger_price_alerts(fired))
+
+    assert [a["alert_id"] for a in server.alert_index.crossed(24, 240, 260)] == ["up_250"]
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+from pricing import FxTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "benchmarks"))
+
+from load_test import percentile, summarize
+from stub_upstreams import FX_RATES, stub_app, stub_env
+
+
+def test_nearest_rank_percentiles():
+    values = [i / 1000 for i in range(1, 101)]
+
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 99) == 0.0
+    assert summarize(values, 2, 10.0) == {
+        "requests": 100, "errors": 2, "rps": 10.0,
+        "p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0
+    }
+
+
+def test_stub_upstreams_answer_in_the_shapes_the_backend_reads():
+    env = stub_env("http://stub")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=stub_app())
+        async with httpx.AsyncClient(transport=transport) as client:
+            table = FxTable(env["FX_RATES_URL"])
+            table.apply(await table.fetch(client))
+            gold = (await client.get(env["GOLD_PRICE_URL"])).json()
+            session = await client.get(env["AUTH_SESSION_URL"], headers={"X-Session-ID": "load_1"})
+        return table, gold, session.json()
+
+    table, gold, session = asyncio.run(scenario())
+    assert table.rates == FX_RATES and table.source == "OpenExchangeRates"
+    assert 1985 <= gold[0]["price"] <= 2015
+    assert session["email"] == "load_1@loadtest.local"
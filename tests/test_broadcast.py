@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from broadcast import BroadcastHub
+
+
+def test_subscribers_get_the_latest_then_every_tick():
+    async def scenario():
+        hub = BroadcastHub(queue_size=4)
+        hub.publish(b"tick 1")
+        subscription = hub.subscribe()
+        hub.publish(b"tick 2")
+        return [await subscription.get(timeout=1) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [b"tick 1", b"tick 2"]
+
+
+def test_a_slow_subscriber_is_dropped_without_blocking_others():
+    async def scenario():
+        hub = BroadcastHub(queue_size=2)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for i in range(3):
+            hub.publish(f"tick {i}".encode())
+            if i < 2:
+                await fast.get(timeout=1)
+
+        assert slow.dropped and not fast.dropped
+        assert await slow.get(timeout=1) is None
+        assert await fast.get(timeout=1) == b"tick 2"
+        assert hub.stats() == {"subscribers": 1, "published": 3, "dropped": 1}
+
+    asyncio.run(scenario())
+
+
+def test_get_times_out_without_ticks():
+    async def scenario():
+        subscription = BroadcastHub().subscribe()
+        with pytest.raises(asyncio.TimeoutError):
+            await subscription.get(timeout=0.01)
+
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from cache import Cache, LocalCache, SharedMemoryCache
+from pricing import FxTable
+
+
+@pytest.fixture(params=["local", "shm"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalCache()
+    return SharedMemoryCache(str(tmp_path / "cache"))
+
+
+def test_values_round_trip_until_they_expire(backend):
+    value = {"price": 250.5, "at": datetime(2026, 1, 1, tzinfo=timezone.utc), "codes": ["A", "B"]}
+
+    async def scenario():
+        await backend.set("price", value, 60)
+        await backend.set("brief", 1, 0.01)
+        assert await backend.get("price") == value
+        await asyncio.sleep(0.02)
+        assert await backend.get("brief") is None
+        await backend.delete("price")
+        assert await backend.get("price") is None
+
+    asyncio.run(scenario())
+
+
+def test_shm_workers_share_snapshots_and_locks(tmp_path):
+    directory = str(tmp_path / "cache")
+    first, second = SharedMemoryCache(directory), SharedMemoryCache(directory)
+
+    async def scenario():
+        await first.set("rates", {"QAR": 3.64}, 60)
+        assert await second.get("rates") == {"QAR": 3.64}
+
+        assert await first.acquire("rates", 15)
+        assert not await second.acquire("rates", 15)
+        await first.release("rates")
+        assert await second.acquire("rates", 15)
+        await second.release("rates")
+
+    asyncio.run(scenario())
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert not [name for name in os.listdir(directory) if name.endswith(".lock")]
+
+
+def test_concurrent_misses_share_one_refresh(backend):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": len(calls)}
+
+    async def scenario():
+        # Two workers' caches on the shared backend; the local backend is
+        # one worker's own
+        workers = 2 if isinstance(backend, SharedMemoryCache) else 1
+        caches = [Cache(backend, "section") for _ in range(workers)]
+        return await asyncio.gather(*(cache.get_or_refresh("key", 60, loader) for cache in caches * 3))
+
+    assert set(map(str, asyncio.run(scenario()))) == {str({"value": 1})}
+    assert len(calls) == 1
+
+
+def test_fx_rates_fetched_once_across_workers(monkeypatch):
+    backend = LocalCache()
+    fetches = []
+
+    async def fetch_upstream(self):
+        fetches.append(1)
+        return {"rates": {"QAR": 3.65}, "source": "OpenExchangeRates", "fetched_at": time.time() - 600}
+
+    monkeypatch.setattr(FxTable, "_fetch_upstream", fetch_upstream)
+    workers = [FxTable(cache=Cache(backend, "fx_rates"), ttl=3600) for _ in range(4)]
+
+    async def scenario():
+        for table in workers:
+            await table.refresh_if_stale()
+
+    asyncio.run(scenario())
+    assert len(fetches) == 1
+    assert {table.rate("QAR") for table in workers} == {3.65}
+    assert not any(table.stale() for table in workers)
+    # Stale when the shared snapshot is, not a full ttl after each worker read it
+    assert time.monotonic() - workers[-1].fetched_at >= 600
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+from capture import CaptureMiddleware, sanitize_query, session_token
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "benchmarks"))
+
+from replay import load_capture
+
+
+def test_secrets_never_reach_the_capture():
+    assert sanitize_query(b"session_id=abc&days=7&Token=x") == "session_id=REDACTED&days=7&Token=REDACTED"
+
+
+def test_session_token_from_cookie_or_bearer():
+    assert session_token({"headers": [(b"cookie", b"theme=dark; session_token=abc")]}) == "abc"
+    assert session_token({"headers": [(b"authorization", b"Bearer xyz")]}) == "xyz"
+    assert session_token({"headers": [(b"authorization", b"Basic xyz")]}) is None
+
+
+def test_captured_requests_replay_in_arrival_order(tmp_path):
+    path = str(tmp_path / "traffic.ndjson")
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def send(message):
+        pass
+
+    middleware = CaptureMiddleware(app, path, salt="salt", exclude_paths=("/api/metrics",))
+    requests = [
+        ("GET", "/api/orders", b"token=secret", [(b"authorization", b"Bearer user_a")]),
+        ("POST", "/api/orders", b"", [(b"authorization", b"Bearer user_a")]),
+        ("GET", "/api/metrics", b"", []),
+        ("GET", "/api/stores", b"", [])
+    ]
+    for method, request_path, query, headers in requests:
+        scope = {"type": "http", "method": method, "path": request_path, "query_string": query, "headers": headers}
+        asyncio.run(middleware(scope, None, send))
+
+    # The writer thread flushes in the background
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if os.path.exists(path) and len(open(path).read().splitlines()) == 3:
+            break
+        time.sleep(0.01)
+
+    records = load_capture([path], include_writes=False)
+    assert [(record["method"], record["path"]) for record in records] == [("GET", "/api/orders"), ("GET", "/api/stores")]
+    assert records[0]["query"] == "token=REDACTED"
+    assert records[0]["identity"] == middleware.identity({"headers": [(b"authorization", b"Bearer user_a")]})
+    assert records[1]["identity"] is None
+    assert "user_a" not in open(path).read()
+    assert len(load_capture([path], include_writes=True)) == 3
+    assert json.loads(open(path).readline())["status"] == 200
@@ -0,0 +1,63 @@
+import asyncio
+
+from deadlines import MAX_BUDGET_MS, DeadlineMiddleware, deadline, expired, remaining
+
+BUDGETS = {"/api/gold/": 2000, "/api/gold/stream": None}
+
+
+def budget(path: str, header: str = None):
+    middleware = DeadlineMiddleware(None, default_ms=5000, budgets_ms=BUDGETS)
+    headers = [(b"x-request-budget-ms", header.encode())] if header else []
+    return middleware.budget_ms({"type": "http", "path": path, "headers": headers})
+
+
+def test_longest_matching_prefix_sets_the_budget():
+    assert budget("/api/orders") == 5000
+    assert budget("/api/gold/prices/current") == 2000
+    assert budget("/api/gold/stream") is None
+
+
+def test_clients_may_ask_for_a_budget_within_the_cap():
+    assert budget("/api/orders", "250") == 250
+    assert budget("/api/orders", "999999") == MAX_BUDGET_MS
+    assert budget("/api/orders", "soon") == 5000
+    assert budget("/api/orders", "0") == 5000
+    # Streams stay unbounded whatever the header says
+    assert budget("/api/gold/stream", "250") is None
+
+
+def test_nested_budgets_only_shrink():
+    assert remaining() is None
+    with deadline(10):
+        with deadline(60):
+            assert remaining() <= 10
+        with deadline(0.001):
+            assert 0 < remaining() <= 0.001
+    assert remaining() is None
+
+
+def test_the_request_sees_its_budget():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(remaining())
+        await asyncio.sleep(0.02)
+        seen.append(expired())
+
+    async def scenario():
+        await DeadlineMiddleware(app, default_ms=10)({"type": "http", "path": "/api/orders", "headers": []}, None, None)
+
+    asyncio.run(scenario())
+    assert 0 < seen[0] <= 0.01
+    assert seen[1] is True
+    assert remaining() is None
+
+
+def test_nothing_bounds_websockets():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(remaining())
+
+    asyncio.run(DeadlineMiddleware(app, default_ms=10)({"type": "websocket", "path": "/api/gold/stream/ws"}, None, None))
+    assert seen == [None]
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from exports import EXPORT_CHUNK_BYTES
+
+from .conftest import run
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_price_history_streams_as_ndjson_within_the_range(client, db):
+    run(db.gold_prices.insert_many([
+        {"timestamp": START + timedelta(minutes=i), "price_24k": 250.0 + i, "price_22k": 229.0,
+         "price_18k": 187.5, "currency": "QAR", "source": "test"}
+        for i in range(3000)
+    ]))
+
+    response = client.get("/api/gold/prices/export", params={
+        "start": (START + timedelta(minutes=100)).isoformat(), "end": "2026-01-01T02:00:00Z"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["price_24k"] for row in rows] == [250.0 + i for i in range(100, 120)]
+    assert rows[0]["timestamp"].startswith("2026-01-01T01:40:00")
+
+    # Past one output chunk, every row still arrives exactly once
+    everything = client.get("/api/gold/prices/export").text
+    assert len(everything) > EXPORT_CHUNK_BYTES
+    assert len(everything.splitlines()) == 3000
+
+
+def test_orders_export_as_csv_one_row_per_line(client, db, sign_in):
+    headers = sign_in()
+    token = headers["Authorization"].split(" ", 1)[1]
+    user_id = run(db.user_sessions.find_one({"session_token": token}))["user_id"]
+    line = {"item_type": "gold_bar", "name": "Bar", "quantity": 1.0, "price_per_unit": 250.0, "total": 250.0}
+    run(db.orders.insert_many([
+        {"order_id": "order_a", "user_id": user_id, "created_at": START, "status": "pending", "total_amount": 500.0,
+         "items": [{"item_id": "bar_1", **line}, {"item_id": "bar_2", **line}]},
+        {"order_id": "order_other", "user_id": "someone_else", "created_at": START, "status": "pending",
+         "total_amount": 250.0, "items": [{"item_id": "bar_3", **line}]}
+    ]))
+
+    response = client.get("/api/orders/export", params={"format": "csv"}, headers=headers)
+    assert response.status_code == 200
+    assert 'filename="orders.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["order_id"], row["item_id"]) for row in rows] == [("order_a", "bar_1"), ("order_a", "bar_2")]
+
+
+@pytest.mark.parametrize("params", [{"format": "xml"}, {"start": "yesterday"}])
+def test_bad_export_parameters(client, db, params):
+    assert client.get("/api/gold/prices/export", params=params).status_code == 400
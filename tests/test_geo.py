@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from geo import GeoGridIndex, geo_point, haversine_m
+
+
+def store(i: int, lat: float, lng: float) -> dict:
+    return {"store_id": f"store_{i}", "geo": geo_point(lat, lng)}
+
+
+def test_haversine_matches_known_distances():
+    # One degree of latitude, and Doha to Dubai
+    assert haversine_m(25.0, 51.5, 26.0, 51.5) == pytest.approx(111195, rel=1e-3)
+    assert haversine_m(25.2854, 51.5310, 25.2048, 55.2708) == pytest.approx(376000, rel=0.01)
+
+
+def test_nearby_agrees_with_a_full_scan():
+    rng = random.Random(7)
+    stores = [store(i, 25.0 + rng.uniform(-0.5, 0.5), 51.5 + rng.uniform(-0.5, 0.5)) for i in range(2000)]
+    index = GeoGridIndex(stores + [{"store_id": "no_location"}])
+    assert index.size == 2000
+
+    for radius in (500, 5000, 40000, 200000):
+        lat, lng = 25.1, 51.4
+        expected = sorted(
+            (haversine_m(lat, lng, s["geo"]["coordinates"][1], s["geo"]["coordinates"][0]), s["store_id"])
+            for s in stores
+        )
+        expected = [store_id for distance, store_id in expected if distance <= radius]
+        assert [doc["store_id"] for _, doc in index.nearby(lat, lng, radius)] == expected
+
+
+def test_nearby_is_nearest_first_and_limited():
+    index = GeoGridIndex([store(i, 25.0 + i * 0.001, 51.5) for i in range(50)])
+
+    matches = index.nearby(25.0102, 51.5, 1000, limit=3)
+    assert [doc["store_id"] for _, doc in matches] == ["store_10", "store_11", "store_9"]
+    assert [distance for distance, _ in matches] == sorted(distance for distance, _ in matches)
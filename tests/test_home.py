@@ -0,0 +1,21 @@
+from .conftest import run
+
+
+def test_home_bundle_in_one_language(client, db, live_price):
+    run(db.stores.insert_one({
+        "store_id": "store_1", "name": "Souq Gold", "name_ar": "ذهب السوق",
+        "description": "Gold", "description_ar": "ذهب", "stats": {"products": 3}
+    }))
+
+    response = client.get("/api/home", params={"lang": "en"})
+    assert response.status_code == 200
+    home = response.json()
+    assert home["price"]["price_24k"] == live_price["price_24k"]
+    assert home["stores"] == [{"store_id": "store_1", "name": "Souq Gold", "description": "Gold"}]
+    assert home["featured_products"] == []
+    # Anonymous: no portfolio section
+    assert home["portfolio"] is None
+
+
+def test_home_bundle_rejects_unknown_languages(client, live_price):
+    assert client.get("/api/home", params={"lang": "fr"}).status_code == 400
@@ -0,0 +1,71 @@
+from .conftest import run
+
+
+def jewelry_line(item_id: str, quantity: int) -> dict:
+    return {
+        "item_id": item_id,
+        "item_type": "jewelry",
+        "name": item_id,
+        "quantity": quantity,
+        "price_per_unit": 1000.0,
+        "total": 1000.0 * quantity
+    }
+
+
+def add_item(db, item_id: str, stock: int):
+    run(db.jewelry.insert_one({"item_id": item_id, "name": item_id, "stock": stock, "in_stock": stock > 0}))
+
+
+def stock(db, item_id: str) -> int:
+    return run(db.jewelry.find_one({"item_id": item_id}))["stock"]
+
+
+def test_orders_never_oversell(client, db, sign_in):
+    add_item(db, "ring", 2)
+    headers = sign_in()
+
+    statuses = [
+        client.post("/api/orders", json={"items": [jewelry_line("ring", 1)]}, headers=headers).status_code
+        for _ in range(3)
+    ]
+
+    assert statuses == [200, 200, 409]
+    assert stock(db, "ring") == 0
+
+
+def test_reserved_order_must_match_reservation(client, db, sign_in):
+    add_item(db, "ring", 1)
+    add_item(db, "necklace", 5)
+    headers = sign_in()
+    reservation = client.post(
+        "/api/reservations", json={"items": [{"item_id": "ring", "quantity": 1}]}, headers=headers
+    ).json()
+
+    # Reserve one cheap item, then try to order other stock under it
+    response = client.post("/api/orders", json={
+        "reservation_id": reservation["reservation_id"],
+        "items": [jewelry_line("ring", 1), jewelry_line("necklace", 3)]
+    }, headers=headers)
+    assert response.status_code == 409
+    assert stock(db, "necklace") == 5
+    # The rejected order leaves the reservation usable
+    assert run(db.reservations.find_one({"reservation_id": reservation["reservation_id"]}))["status"] == "held"
+
+    response = client.post("/api/orders", json={
+        "reservation_id": reservation["reservation_id"],
+        "items": [jewelry_line("ring", 1)]
+    }, headers=headers)
+    assert response.status_code == 200
+    assert stock(db, "ring") == 0
+
+
+def test_reservation_commits_once(client, db, sign_in):
+    add_item(db, "ring", 1)
+    headers = sign_in()
+    reservation = client.post(
+        "/api/reservations", json={"items": [{"item_id": "ring", "quantity": 1}]}, headers=headers
+    ).json()
+    order = {"reservation_id": reservation["reservation_id"], "items": [jewelry_line("ring", 1)]}
+
+    assert client.post("/api/orders", json=order, headers=headers).status_code == 200
+    assert client.post("/api/orders", json=order, headers=headers).status_code == 409
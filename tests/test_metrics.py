@@ -0,0 +1,35 @@
+import server
+from metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "/api/orders")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/api/orders",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/api/orders",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/api/orders",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/api/orders"} 4' in lines
+    assert 'latency_seconds_sum{route="/api/orders"} 3.65' in lines
+
+
+def test_label_values_are_escaped():
+    errors = Counter("errors_total", "Errors", ("reason",))
+    errors.inc('bad "quote"\n')
+    errors.inc('bad "quote"\n', amount=2)
+
+    assert errors.render()[-1] == 'errors_total{reason="bad \\"quote\\"\\n"} 3.0'
+
+
+def test_requests_are_labelled_by_route_template(client, db, monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape")
+    client.get("/api/stores/store_missing")
+
+    assert client.get("/api/metrics").status_code == 401
+    body = client.get("/api/metrics", headers={"Authorization": "Bearer scrape"}).text
+    assert 'http_requests_total{method="GET",route="/api/stores/{store_id}",status="404"}' in body
+    assert "store_missing" not in body
@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+import json
+
+import msgpack
+
+from negotiation import NegotiationMiddleware, accepts_msgpack, choose_encoding
+
+PAYLOAD = {"prices": [{"karat": karat, "price": 250.0 * karat / 24} for karat in range(1, 100)]}
+
+
+def respond(content_type: str, body: bytes, more_body: bool = False):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())
+        ]})
+        await send({"type": "http.response.body", "body": body, "more_body": more_body})
+    return app
+
+
+def call(app, **request_headers) -> tuple:
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in request_headers.items()]
+    }
+    asyncio.run(NegotiationMiddleware(app, minimum_size=1024)(scope, receive, send))
+    start, body = messages[0], messages[1]
+    return {name.decode(): value.decode() for name, value in start["headers"]}, body["body"]
+
+
+def test_header_parsing_honours_q_zero():
+    assert accepts_msgpack("application/json, application/msgpack;q=0.9")
+    assert not accepts_msgpack("application/msgpack;q=0")
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+
+
+def test_json_transcoded_to_msgpack_and_compressed():
+    body = json.dumps(PAYLOAD).encode()
+    headers, content = call(respond("application/json", body), accept="application/msgpack", accept_encoding="gzip")
+
+    assert headers["content-type"] == "application/msgpack"
+    assert headers["content-encoding"] == "gzip"
+    assert headers["content-length"] == str(len(content))
+    assert "Accept-Encoding" in headers["vary"]
+    assert msgpack.unpackb(gzip.decompress(content)) == PAYLOAD
+
+
+def test_small_bodies_are_not_compressed():
+    headers, content = call(respond("application/json", b'{"ok": true}'), accept_encoding="gzip")
+
+    assert "content-encoding" not in headers
+    assert content == b'{"ok": true}'
+
+
+def test_streams_and_other_types_pass_through():
+    csv = b"a,b\n" * 1000
+    headers, content = call(respond("text/csv", csv), accept="application/msgpack", accept_encoding="gzip")
+    assert (headers["content-type"], content) == ("text/csv", csv)
+
+    chunk = json.dumps(PAYLOAD).encode()
+    headers, content = call(respond("application/json", chunk, more_body=True), accept_encoding="gzip")
+    assert "content-encoding" not in headers
+    assert content == chunk
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from .conftest import run
+
+
+def order(user_id: str, **fields) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "order_id": "order_plan_a_20260101000000",
+        "user_id": user_id,
+        "items": [{
+            "item_id": "gold_24k",
+            "item_type": "gold_bar",
+            "name": "24K Gold (recurring)",
+            "quantity": 2.0,
+            "price_per_unit": 250.0,
+            "total": 500.0
+        }],
+        "total_amount": 500.0,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now,
+        "tracking_info": None,
+        **fields
+    }
+
+
+def user_id(db, headers) -> str:
+    token = headers["Authorization"].split(" ", 1)[1]
+    return run(db.user_sessions.find_one({"session_token": token}))["user_id"]
+
+
+def test_recurring_orders_list_with_their_plan(client, db, sign_in):
+    headers = sign_in()
+    run(db.orders.insert_one(order(user_id(db, headers), plan_id="plan_a")))
+
+    response = client.get("/api/orders", headers=headers)
+    assert response.status_code == 200
+    assert [o["plan_id"] for o in response.json()] == ["plan_a"]
+
+
+def test_an_invalid_order_is_an_error_not_an_empty_history(client, db, sign_in):
+    headers = sign_in()
+    run(db.orders.insert_one(order(user_id(db, headers), total_amount="a lot")))
+
+    with pytest.raises(ValidationError):
+        client.get("/api/orders", headers=headers)
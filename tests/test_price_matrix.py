@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from pricing import DEFAULT_FX_RATES, build_matrix, filter_matrix
+
+
+@pytest.fixture
+def empty_matrix(monkeypatch):
+    monkeypatch.setitem(server.price_matrix_cache, "data", None)
+    monkeypatch.setitem(server.price_matrix_cache, "timestamp", None)
+
+
+def test_no_matrix_from_fallback_prices(client, live_price, empty_matrix):
+    live_price["source"] = "fallback"
+
+    assert client.get("/api/gold/prices/matrix").status_code == 503
+    assert server.price_matrix_cache["data"] is None
+
+
+def test_matrix_from_a_live_price(client, live_price, empty_matrix):
+    response = client.get("/api/gold/prices/matrix", params={"currency": "qar", "unit": "gram", "karat": "24"})
+
+    assert response.status_code == 200
+    assert response.json()["prices"] == {"QAR": {"gram": {"24": 250.0}}}
+
+
+def test_matrix_cells_follow_karat_unit_and_currency():
+    matrix = build_matrix(364.0, DEFAULT_FX_RATES, datetime.now(timezone.utc), "default")
+
+    assert matrix["prices"]["QAR"]["gram"]["24"] == 364.0
+    assert matrix["prices"]["QAR"]["gram"]["18"] == 273.0
+    assert matrix["prices"]["USD"]["gram"]["24"] == 100.0
+    assert matrix["prices"]["KWD"]["gram"]["24"] == 30.7
+    assert matrix["prices"]["USD"]["ounce"]["24"] == round(100.0 * 31.1034768, 2)
+
+
+def test_filter_matrix_slices_and_rejects_unknown_values():
+    matrix = build_matrix(364.0, DEFAULT_FX_RATES, datetime.now(timezone.utc), "default")
+
+    assert filter_matrix(matrix, None, None, None) is matrix
+    sliced = filter_matrix(matrix, "sar,aed", "tola", "21,18")
+    assert list(sliced["prices"]) == ["SAR", "AED"]
+    assert list(sliced["rates"]) == ["SAR", "AED"]
+    assert sliced["prices"]["SAR"] == {"tola": {"21": matrix["prices"]["SAR"]["tola"]["21"], "18": matrix["prices"]["SAR"]["tola"]["18"]}}
+    for bad in ({"currency": "XYZ"}, {"unit": "kilo"}, {"karat": "twenty"}, {"karat": "20"}):
+        with pytest.raises(ValueError):
+            filter_matrix(matrix, bad.get("currency"), bad.get("unit"), bad.get("karat"))
@@ -0,0 +1,58 @@
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from product_import import import_products
+
+from .conftest import run
+
+
+async def chunks(*lines: str):
+    yield "".join(line + "\n" for line in lines).encode()
+
+
+def row(item_id: str, price: float) -> str:
+    return (
+        f'{{"item_id": "{item_id}", "name": "Ring", "name_ar": "Ring", "description": "", '
+        f'"description_ar": "", "price": {price}, "weight_grams": 5.0, "karat": 22, "category": "ring"}}'
+    )
+
+
+def test_import_never_takes_over_another_stores_item():
+    jewelry = AsyncMongoMockClient()["import_test"].jewelry
+    run(jewelry.create_index("item_id", unique=True))
+
+    async def import_into(store_id: str, *lines: str):
+        return await import_products(
+            jewelry, chunks(*lines), server.JewelryItem, scope={"store_id": store_id}, defaults={"store_name": store_id}
+        )
+
+    run(import_into("store_1", row("ring_1", 100)))
+    report = run(import_into("store_2", row("ring_1", 1), row("ring_2", 200)))
+
+    assert report.inserted == 1
+    assert report.failed == 1
+    assert report.errors[0]["row"] == 1
+    item = run(jewelry.find_one({"item_id": "ring_1"}))
+    assert (item["store_id"], item["price"]) == ("store_1", 100)
+
+    report = run(import_into("store_1", row("ring_1", 150)))
+    assert (report.updated, report.failed) == (1, 0)
+
+
+def test_every_row_is_accounted_for():
+    jewelry = AsyncMongoMockClient()["import_test"].jewelry
+    missing_id = row("ring_1", 100).replace('"item_id": "ring_1", ', "")
+    report = run(import_products(
+        jewelry,
+        chunks(missing_id, missing_id, row("ring_1", 100), row("ring_1", 120), missing_id),
+        server.JewelryItem,
+        scope={"store_id": "store_1"},
+        defaults={"store_name": "store_1"}
+    ))
+
+    assert report.rows == report.inserted + report.updated + report.failed == 5
+    assert report.inserted == 1
+    errors = {error["row"]: error["error"] for error in report.errors}
+    assert errors[3] == "item_id: superseded by row 4"
+    assert sorted(errors) == [1, 2, 3, 5]
+    assert run(jewelry.find_one({"item_id": "ring_1"}))["price"] == 120
@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+from projections import apply_projection, build_projection
+
+from .conftest import run
+
+STORE = {
+    "store_id": "store_1", "name": "Souq Gold", "name_ar": "ذهب السوق",
+    "description": "Gold", "description_ar": "ذهب", "rating": 4.8
+}
+
+
+def test_full_documents_unless_asked_otherwise():
+    assert build_projection(server.Store) is None
+    assert apply_projection([STORE], None) == [STORE]
+
+
+def test_fields_pick_model_fields_only():
+    projection = build_projection(server.Store, fields="store_id, rating")
+    assert projection == {"_id": 0, "store_id": 1, "rating": 1}
+    assert apply_projection([STORE], projection) == [{"store_id": "store_1", "rating": 4.8}]
+
+    with pytest.raises(HTTPException) as error:
+        build_projection(server.Store, fields="store_id,stats")
+    assert error.value.status_code == 400
+
+
+def test_one_language_drops_the_other():
+    projection = build_projection(server.Store, lang="ar")
+    assert apply_projection([STORE], projection) == [
+        {"store_id": "store_1", "name_ar": "ذهب السوق", "description_ar": "ذهب", "rating": 4.8}
+    ]
+    # Fields of the other language are dropped from fields= too
+    assert build_projection(server.Store, fields="store_id,name", lang="ar") == {"_id": 0, "store_id": 1}
+    with pytest.raises(HTTPException):
+        build_projection(server.Store, fields="name", lang="ar")
+
+
+def test_list_endpoint_serves_the_projection(client, db):
+    run(db.stores.insert_one({**STORE, "stats": {"products": 1}}))
+
+    response = client.get("/api/stores", params={"fields": "store_id,name"})
+    assert response.status_code == 200
+    assert response.json() == [{"store_id": "store_1", "name": "Souq Gold"}]
@@ -0,0 +1,41 @@
+from query_plans import analyze_explain, shape_key
+
+
+def test_queries_differing_only_in_values_share_a_shape():
+    first = shape_key("find", {"find": "orders", "filter": {"user_id": "user_a", "status": {"$in": ["a", "b"]}},
+                               "sort": {"created_at": -1}})
+    second = shape_key("find", {"find": "orders", "filter": {"user_id": "user_b", "status": {"$in": ["c"]}},
+                                "sort": {"created_at": -1}})
+
+    assert first == second
+    assert first == 'find orders filter={"user_id":"?","status":{"$in":"?"}} sort={"created_at":-1}'
+    assert shape_key("find", {"find": "orders", "filter": {"order_id": "x"}}) != first
+
+
+def test_aggregate_shape_keeps_match_and_sort_only():
+    key = shape_key("aggregate", {"aggregate": "jewelry", "pipeline": [
+        {"$match": {"store_id": "store_1"}}, {"$group": {"_id": "$store_id"}}, {"$sort": {"count": -1}}
+    ]})
+
+    assert key == 'aggregate jewelry pipeline=[{"$match":{"store_id":"?"}},{"$group":"..."},{"$sort":{"count":-1}}]'
+
+
+def test_collection_scans_and_in_memory_sorts_are_flagged():
+    explain = {
+        "queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}},
+        "executionStats": {"nReturned": 5, "totalDocsExamined": 5000, "totalKeysExamined": 0, "executionTimeMillis": 12}
+    }
+
+    analysis = analyze_explain(explain)
+    assert analysis["stages"] == ["SORT", "COLLSCAN"]
+    assert analysis["flags"] == ["collscan", "in_memory_sort", "examined_ratio"]
+    assert analysis["examined_ratio"] == 1000.0
+
+
+def test_an_index_scan_is_clean():
+    explain = {
+        "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+        "executionStats": {"nReturned": 50, "totalDocsExamined": 50, "totalKeysExamined": 50}
+    }
+
+    assert analyze_explain(explain)["flags"] == []
@@ -0,0 +1,38 @@
+import asyncio
+
+import server
+from admission import AdmissionMiddleware
+
+
+def test_ready_only_after_startup(client, monkeypatch):
+    monkeypatch.setattr(server, "readiness", {"ready": False, "since": None, "error": None})
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["startup"] == "in_progress"
+
+    monkeypatch.setitem(server.readiness, "ready", True)
+    monkeypatch.setitem(server.readiness, "since", server.datetime.now(server.timezone.utc))
+    response = client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json()["mongo"] == "ok"
+
+
+def test_probes_are_admitted_when_the_pod_is_saturated():
+    statuses = {}
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    middleware = AdmissionMiddleware(
+        app, limits={"read": 0}, max_queue_ms=0, exempt_paths=("/api/ready",)
+    )
+
+    for path in ("/api/ready", "/api/orders"):
+        async def send(message, path=path):
+            if message["type"] == "http.response.start":
+                statuses[path] = message["status"]
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("10.0.0.1", 1)}
+        asyncio.run(middleware(scope, None, send))
+
+    assert statuses == {"/api/ready": 200, "/api/orders": 503}
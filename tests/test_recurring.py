@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+from .conftest import run
+from recurring import _execute_chunk, execute_due_plans
+
+
+def start_plan(client, headers, amount=500.0):
+    plan = client.post("/api/recurring", json={"amount": amount, "interval": "daily"}, headers=headers).json()
+    run(server.ensure_recurring_plan_indexes())
+    return plan
+
+
+def execute(now, price_24k=250.0):
+    return execute_due_plans(
+        server.recurring_plans_collection,
+        server.orders_collection,
+        server.portfolio_collection,
+        price_24k,
+        now
+    )
+
+
+def test_a_plan_run_executes_once(client, sign_in):
+    headers = sign_in()
+    plan = start_plan(client, headers)
+    now = datetime.now(timezone.utc) + timedelta(seconds=1)
+
+    async def two_workers():
+        return await asyncio.gather(execute(now), execute(now))
+
+    assert sum(run(two_workers())) == 1
+    assert run(execute(now)) == 0
+
+    orders = run(server.orders_collection.find({"plan_id": plan["plan_id"]}).to_list(None))
+    portfolio = run(server.portfolio_collection.find_one({"user_id": plan["user_id"]}))
+    assert len(orders) == 1
+    assert portfolio["gold_holdings"] == 2.0
+    assert portfolio["total_invested"] == 500.0
+
+
+def test_a_retried_run_does_not_credit_twice(client, sign_in):
+    headers = sign_in()
+    plan = start_plan(client, headers)
+    now = datetime.now(timezone.utc) + timedelta(seconds=1)
+    assert run(execute(now)) == 1
+
+    # The run's plan write is lost (restored backup, failover): the same
+    # run comes due again
+    run(server.recurring_plans_collection.update_one(
+        {"plan_id": plan["plan_id"]},
+        {"$set": {"next_run_at": plan["next_run_at"]}}
+    ))
+    run(execute(now))
+
+    orders = run(server.orders_collection.find({"plan_id": plan["plan_id"]}).to_list(None))
+    portfolio = run(server.portfolio_collection.find_one({"user_id": plan["user_id"]}))
+    assert len(orders) == 1
+    assert portfolio["gold_holdings"] == 2.0
+
+
+def test_a_plan_cancelled_after_being_read_does_not_buy(client, sign_in):
+    headers = sign_in()
+    plan = start_plan(client, headers)
+    now = datetime.now(timezone.utc) + timedelta(seconds=1)
+    due = run(server.recurring_plans_collection.find({"status": "active"}, {"_id": 0}).to_list(None))
+
+    assert client.delete(f"/api/recurring/{plan['plan_id']}", headers=headers).status_code == 200
+    executed = run(_execute_chunk(
+        due, 250.0, now,
+        server.orders_collection, server.portfolio_collection, server.recurring_plans_collection,
+        "run_a"
+    ))
+
+    assert executed == 0
+    assert run(server.orders_collection.count_documents({"plan_id": plan["plan_id"]})) == 0
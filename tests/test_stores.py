@@ -0,0 +1,38 @@
+import server
+
+from .conftest import run
+
+
+def add_stores(db, count: int):
+    run(db.stores.insert_many([
+        {
+            "store_id": f"store_{i}",
+            "name": f"Store {i}",
+            # A line of stores ~110 m apart
+            "latitude": 25.0 + i * 0.001,
+            "longitude": 51.5,
+            "geo": {"type": "Point", "coordinates": [51.5, 25.0 + i * 0.001]},
+            "stats": {"products": 3}
+        }
+        for i in range(count)
+    ]))
+
+
+def test_nearby_fallback_sees_every_store(client, db):
+    # The in-memory database has no $geoNear, so this exercises the grid fallback
+    add_stores(db, 300)
+
+    response = client.get("/api/stores/nearby", params={"lat": 25.25, "lng": 51.5, "radius": 1000, "limit": 100})
+    assert response.status_code == 200
+    ids = {store["store_id"] for store in response.json()}
+    assert "store_250" in ids
+    assert all("stats" not in store for store in response.json())
+
+
+def test_store_details_keep_stats_server_side(client, db):
+    add_stores(db, 1)
+
+    response = client.get("/api/stores/store_0")
+    assert response.status_code == 200
+    assert response.json()["store_id"] == "store_0"
+    assert "stats" not in response.json()
@@ -0,0 +1,34 @@
+import time
+
+from sync import SYNC_OVERLAP
+
+
+def test_delta_sync_tracks_changes_and_deletions(client, sign_in, live_price):
+    headers = sign_in()
+    alert = client.post("/api/alerts", json={"karat": 24, "direction": "above", "threshold": 300}, headers=headers).json()
+
+    first = client.get("/api/sync", headers=headers).json()
+    assert first["full"] is True
+    assert [a["alert_id"] for a in first["alerts"]] == [alert["alert_id"]]
+
+    assert client.delete(f"/api/alerts/{alert['alert_id']}", headers=headers).status_code == 200
+    delta = client.get("/api/sync", params={"since": first["version"]}, headers=headers).json()
+
+    assert delta["full"] is False
+    assert delta["alerts"] == []
+    assert [(d["collection"], d["id"]) for d in delta["deleted"]] == [("alerts", alert["alert_id"])]
+
+
+def test_reading_the_portfolio_is_not_a_change(client, sign_in, live_price):
+    headers = sign_in()
+    client.get("/api/portfolio", headers=headers)
+    # A version whose overlap window starts now: later writes show up
+    time.sleep(0.01)
+    version = int((time.time() + SYNC_OVERLAP.total_seconds()) * 1000)
+
+    client.get("/api/portfolio", headers=headers)
+    live_price["price_24k"] += 10
+    client.get("/api/portfolio", headers=headers)
+
+    delta = client.get("/api/sync", params={"since": version}, headers=headers).json()
+    assert delta["portfolio"] is None
@@ -0,0 +1,43 @@
+import asyncio
+
+import tracing
+from tracing import MAX_SPANS_PER_TRACE, Trace, TracingMiddleware, span
+
+
+def test_spans_past_the_cap_merge_by_name():
+    trace = Trace("GET", "/api/orders/export")
+    for _ in range(MAX_SPANS_PER_TRACE + 500):
+        trace.add("serialize", trace.started, 0.001)
+    trace.duration = 1.0
+
+    summary = trace.to_dict()
+    assert len(summary["spans"]) == MAX_SPANS_PER_TRACE
+    assert summary["merged_spans"] == [{"name": "serialize", "count": 500, "duration_ms": 500.0}]
+    assert summary["breakdown_ms"]["serialize"] == (MAX_SPANS_PER_TRACE + 500) * 1.0
+
+
+def request(middleware, path):
+    async def send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request"}
+
+    asyncio.run(middleware({"type": "http", "method": "GET", "path": path}, receive, send))
+
+
+def test_streams_and_exports_are_not_slow_requests(monkeypatch):
+    monkeypatch.setattr(tracing, "slow_traces", [])
+    logged = []
+
+    async def app(scope, receive, send):
+        with span("mongo find"):
+            pass
+        await send({"type": "http.response.start", "status": 200})
+
+    middleware = TracingMiddleware(app, slow_ms=0, exclude_paths=("/api/gold/stream",), exclude_suffixes=("/export",))
+    monkeypatch.setattr(middleware, "log_slow", logged.append)
+    for path in ("/api/gold/stream", "/api/gold/stream/ws", "/api/orders/export", "/api/orders"):
+        request(middleware, path)
+
+    assert [trace.path for trace in logged] == ["/api/orders"]
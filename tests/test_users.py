@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import server
+from login import login
+
+from .conftest import run
+
+
+def test_duplicate_emails_keep_the_pod_unready(client, db, monkeypatch, capsys):
+    async def mongo_up():
+        pass
+
+    monkeypatch.setattr(server, "wait_for_mongo", mongo_up)
+    monkeypatch.setattr(server, "readiness", {"ready": False, "since": None, "error": None})
+    run(db.users.insert_many([
+        {"user_id": "user_a", "email": "twice@test.local"},
+        {"user_id": "user_b", "email": "twice@test.local"}
+    ]))
+
+    with pytest.raises(OperationFailure):
+        run(server.ensure_user_indexes())
+    assert "twice@test.local (2 users)" in capsys.readouterr().out
+
+    run(server.prepare())
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["startup"] == "failed"
+
+
+def test_login_creates_the_user_once(db):
+    run(db.users.create_index("email", unique=True))
+    now = datetime.now(timezone.utc)
+
+    async def log_in(token: str):
+        identity = {"email": "new@test.local", "name": "New", "picture": None, "session_token": token}
+        return await login(db.users, db.portfolio, db.user_sessions, identity, now)
+
+    first_user, first_session = run(log_in("token_1"))
+    second_user, second_session = run(log_in("token_2"))
+
+    assert first_user["user_id"] == second_user["user_id"]
+    assert "_id" not in first_user and "_id" not in first_session
+    assert run(db.users.count_documents({})) == 1
+    assert run(db.portfolio.count_documents({"user_id": first_user["user_id"]})) == 1
+    assert run(db.user_sessions.count_documents({"user_id": first_user["user_id"]})) == 2
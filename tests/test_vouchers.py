@@ -0,0 +1,48 @@
+import pytest
+
+import server
+from vouchers import MAX_VOUCHER_AMOUNT
+
+
+def test_voucher_redeems_once(client, sign_in, live_price):
+    voucher = client.post("/api/vouchers", json={"amount": 500}, headers=sign_in()).json()
+    first, second = sign_in(), sign_in()
+
+    response = client.post("/api/vouchers/redeem", json={"code": voucher["code"]}, headers=first)
+    assert response.status_code == 200
+    assert response.json()["redeemed_grams"] == pytest.approx(500 / live_price["price_24k"], abs=1e-4)
+
+    for headers in (first, second):
+        response = client.post("/api/vouchers/redeem", json={"code": voucher["code"]}, headers=headers)
+        assert response.status_code == 409
+
+    assert client.get("/api/portfolio", headers=second).json()["gold_holdings"] == 0
+
+
+@pytest.fixture
+def admin(monkeypatch, sign_in):
+    monkeypatch.setattr(server, "ADMIN_EMAILS", {"admin@test.local"})
+    return sign_in("admin@test.local")
+
+
+@pytest.mark.parametrize("amount", [-100, 0, "100", None, True, MAX_VOUCHER_AMOUNT + 1])
+def test_voucher_amount_must_be_positive_and_capped(client, admin, amount):
+    assert client.post("/api/vouchers", json={"amount": amount}, headers=admin).status_code == 400
+    assert client.post("/api/vouchers/bulk", json={"amount": amount, "count": 2}, headers=admin).status_code == 400
+
+
+def test_bulk_issuance_is_for_admins(client, sign_in, admin):
+    bulk = {"amount": MAX_VOUCHER_AMOUNT, "count": 2}
+    assert client.post("/api/vouchers/bulk", json=bulk, headers=sign_in()).status_code == 403
+
+    response = client.post("/api/vouchers/bulk", json=bulk, headers=admin)
+    assert response.status_code == 200
+    assert response.json()["issued"] == 2
+
+
+def test_no_redemption_without_live_price(client, sign_in, live_price):
+    voucher = client.post("/api/vouchers", json={"amount": 500}, headers=sign_in()).json()
+    live_price["source"] = "fallback"
+
+    response = client.post("/api/vouchers/redeem", json={"code": voucher["code"]}, headers=sign_in())
+    assert response.status_code == 503